@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from json import JSONDecodeError
+from urllib.parse import urljoin
+
+import requests
+from distutils import util
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying, anything else is a final answer from Houston
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HoustonNotifier(object):
+    """
+    Sends notifications to Houston from background threads, so API requests never wait on Houston's round trip.
+    Notifications go through a bounded queue and a pooled keep-alive session, and are retried with backoff when
+    Houston is unavailable. With `settings.HOUSTON_BULK_STATUSES` the notifications waiting for the same endpoint
+    are sent as a single request.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            logging.debug("Creating the HoustonNotifier singleton", extra={})
+            cls._instance = super(HoustonNotifier, cls).__new__(cls)
+            cls._instance._init_instance()
+        return cls._instance
+
+    def _init_instance(self):
+        self.workers = int(settings.HOUSTON_WORKERS)
+        self.max_retries = int(settings.HOUSTON_MAX_RETRIES)
+        self.timeout = (float(settings.HOUSTON_CONNECT_TIMEOUT), float(settings.HOUSTON_READ_TIMEOUT))
+        self.bulk_statuses = util.strtobool(str(settings.HOUSTON_BULK_STATUSES))
+        self.max_bulk_size = int(settings.HOUSTON_MAX_BULK_SIZE)
+        self.queue = queue.Queue(maxsize=int(settings.HOUSTON_QUEUE_SIZE))
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.workers))
+        self.session.headers["Authorization"] = f"Token {settings.HOUSTON_TOKEN}"
+        self.session.verify = settings.ROOT_CERT
+        self._lock = threading.Lock()
+        self._worker_pid = None
+
+    def notify(self, endpoint, data):
+        """
+        Queues a notification for Houston and returns right away. If the queue is full the notification is dropped.
+        :param endpoint: The Houston endpoint, relative to `settings.HOUSTON_URL`.
+        :param data: The JSON body of the notification.
+        """
+        self._ensure_workers()
+        try:
+            self.queue.put_nowait((endpoint, data))
+        except queue.Full:
+            logging.warning("Houston notification queue is full, dropping notification",
+                            extra={"endpoint": endpoint, "batch_id": data.get("batch", "")})
+
+    def notify_many(self, endpoint, payloads):
+        """
+        Queues several notifications for the same endpoint as one entry of the queue, e.g. the statuses of a bulk
+        request, so they can not crowd out the notifications of other requests. If the queue is full they are dropped.
+        :param endpoint: The Houston endpoint, relative to `settings.HOUSTON_URL`.
+        :param payloads: A list of JSON bodies of notifications.
+        """
+        self._ensure_workers()
+        try:
+            self.queue.put_nowait((endpoint, list(payloads)))
+        except queue.Full:
+            logging.warning("Houston notification queue is full, dropping notifications",
+                            extra={"endpoint": endpoint, "notifications": len(payloads)})
+
+    def _ensure_workers(self):
+        # The threads have to be (re)started in the process that uses them, e.g. after gunicorn forked a worker
+        if self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._run, args=())
+                thread.daemon = True
+                thread.start()
+            self._worker_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            notifications = [self.queue.get()]
+            if self.bulk_statuses:
+                # Coalesce whatever else is waiting already
+                while len(notifications) < self.max_bulk_size:
+                    try:
+                        notifications.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            try:
+                self.send(notifications)
+            except Exception as e:
+                logging.warning("Houston request failed", extra={"exception": e})
+
+    def send(self, notifications):
+        """
+        Sends a list of (endpoint, data) notifications to Houston, `data` is a JSON body or a list of them. If bulk
+        statuses are enabled the bodies are sent in one request per endpoint and `settings.HOUSTON_MAX_BULK_SIZE`
+        bodies, and one request per body otherwise.
+        """
+        if not self.bulk_statuses:
+            for endpoint, data in notifications:
+                for payload in data if isinstance(data, list) else [data]:
+                    self._post(endpoint, payload)
+            return
+        payloads_by_endpoint = {}
+        for endpoint, data in notifications:
+            payloads_by_endpoint.setdefault(endpoint, []).extend(data if isinstance(data, list) else [data])
+        for endpoint, payloads in payloads_by_endpoint.items():
+            for start in range(0, len(payloads), self.max_bulk_size):
+                chunk = payloads[start:start + self.max_bulk_size]
+                self._post(endpoint, chunk[0] if len(chunk) == 1 else chunk)
+
+    def _post(self, endpoint, data):
+        url = urljoin(settings.HOUSTON_URL, endpoint)
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff with jitter, so a recovering Houston is not hit by every worker at once
+                time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1))
+            try:
+                response = self.session.post(url, json=data, timeout=self.timeout)
+            except requests.RequestException as e:
+                logging.warning("Houston request failed", extra={"exception": e, "endpoint": endpoint, "attempt": attempt})
+                continue
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+        if response is None:
+            return
+        self._log_response(endpoint, data, response)
+
+    def _log_response(self, endpoint, data, response):
+        if response.status_code == 201:
+            for item in data if isinstance(data, list) else [data]:
+                prefixed_data = {}
+                for key, value in item.items():
+                    prefixed_data["houston_" + key] = value
+                logging.info(
+                    "Houston notified",
+                    extra={
+                        "status_code": response.status_code,
+                        "endpoint": endpoint,
+                        "data": prefixed_data,
+                        "batch_id": item["batch"] if "batch" in item else "",
+                    },
+                )
+        else:
+            try:
+                data = json.loads(response.content)
+                logging.error(
+                    "Houston request failed",
+                    extra={
+                        "endpoint": endpoint,
+                        "status_code": response.status_code,
+                        "error": str(data["batch"]) if isinstance(data, dict) and "batch" in data else data
+                    }
+                )
+            except JSONDecodeError as e:
+                logging.error(
+                    "Could not parse json request",
+                    extra={
+                        'data': response.content,
+                        'exception': e
+                    }
+                )
+
+
+def notify(endpoint, data):
+    """
+    Queues a notification for Houston, see `HoustonNotifier`. Skipped when Houston is not configured.
+    """
+    if not getattr(settings, "HOUSTON_URL", None) or not getattr(settings, "HOUSTON_TOKEN", None):
+        logging.warning("Houston notification was skipped")
+        return
+    HoustonNotifier().notify(endpoint, data)
+
+
+def notify_many(endpoint, payloads):
+    """
+    Queues several notifications for the same endpoint, see `HoustonNotifier.notify_many`. Skipped when Houston is not
+    configured.
+    """
+    if not getattr(settings, "HOUSTON_URL", None) or not getattr(settings, "HOUSTON_TOKEN", None):
+        logging.warning("Houston notification was skipped")
+        return
+    HoustonNotifier().notify_many(endpoint, payloads)
@@ -0,0 +1,40 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+
+from api.models import Batch_Job
+
+
+class Command(BaseCommand):
+    help = "Recomputes Batch_Job.batch_count from the batches relation for every job where it is out of date."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="The number of batch jobs updated per query.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        stale_jobs = Batch_Job.objects.annotate(num_batches=Count('batches')).exclude(
+            batch_count=F('num_batches')).values_list('id', 'num_batches')
+
+        updated = 0
+        chunk = []
+        for job_id, num_batches in stale_jobs.iterator(chunk_size=chunk_size):
+            chunk.append(Batch_Job(id=job_id, batch_count=num_batches))
+            if len(chunk) >= chunk_size:
+                updated += self._update(chunk)
+                chunk = []
+        if chunk:
+            updated += self._update(chunk)
+
+        logging.info("Backfilled batch counts", extra={"updated_batch_jobs": updated})
+        self.stdout.write("Updated batch_count of {0} batch job(s)".format(updated))
+
+    def _update(self, batch_jobs):
+        Batch_Job.objects.bulk_update(batch_jobs, ['batch_count'])
+        return len(batch_jobs)
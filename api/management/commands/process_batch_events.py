@@ -0,0 +1,49 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hydra.jobmanager import batchevents, metrics
+
+
+class Command(BaseCommand):
+    help = "Drains the batch event outbox and fans the queued batches out to their jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=int(settings.BATCH_EVENT_BATCH_SIZE),
+            help="The maximum number of events handled in one scheduling pass.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=float(settings.BATCH_EVENT_POLL_INTERVAL),
+            help="Seconds to wait before polling again when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue once and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        poll_interval = options["poll_interval"]
+        logging.info("Starting batch event worker", extra={"batch_size": batch_size, "poll_interval": poll_interval})
+        # The jobs created and failed while fanning batches out are counted in this process
+        metrics_port = int(settings.BATCH_EVENTS_METRICS_PORT)
+        if metrics_port:
+            metrics.serve(metrics_port)
+        while True:
+            try:
+                processed = batchevents.process_pending_events(limit=batch_size)
+            except Exception as e:
+                logging.error("Failed to process batch events", extra={"exception": e})
+                processed = 0
+            if options["once"] and processed < batch_size:
+                return
+            if processed == 0:
+                time.sleep(poll_interval)
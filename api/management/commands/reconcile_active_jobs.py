@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from hydra.jobmanager.jobmanager import JobManager
+
+
+class Command(BaseCommand):
+    help = "Brings scheduled, created and running jobs in line with their jobs on k8s."
+
+    def handle(self, *args, **options):
+        counts = JobManager().reconcile_active_jobs()
+        self.stdout.write("Moved batch jobs: " + ", ".join("{0} to {1}".format(count, state) for state, count in counts.items()))
@@ -0,0 +1,43 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from api.management.commands import schedule_pending_jobs
+from hydra.jobmanager import locks, metrics
+from hydra.jobmanager.jobmanager import JobManager
+
+
+class Command(schedule_pending_jobs.Command):
+    help = ("Watches the k8s jobs and schedules pending jobs. Every replica can run this, the replica that holds the "
+            "controller lock does the work and the others stand by until it goes away.")
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            "--retry-interval",
+            type=float,
+            default=float(settings.CONTROLLER_LEADER_RETRY_INTERVAL),
+            help="Seconds between tries to take the controller lock while another replica holds it.",
+        )
+
+    def handle(self, *args, **options):
+        self.leader_lock = locks.LeaderLock(locks.CONTROLLER_LOCK)
+        logging.info("Waiting for the controller lock")
+        while not self.leader_lock.acquire():
+            time.sleep(options["retry_interval"])
+        logging.info("Took the controller lock, starting the Hydra controller")
+        # The job lifecycle metrics of the watcher and the totals stored in the database are only kept in this process
+        metrics_port = int(settings.CONTROLLER_METRICS_PORT)
+        if metrics_port:
+            metrics.serve(metrics_port, database_totals=True)
+        JobManager().job_scheduler.jobwatcher.start()
+        super(Command, self).handle(*args, **options)
+        self.leader_lock.release()
+
+    def should_continue(self):
+        # Another replica may take over once the lock is lost, so stop right away instead of running twice
+        if not self.leader_lock.is_held():
+            raise CommandError("Lost the controller lock, stopping the Hydra controller")
+        return True
@@ -0,0 +1,63 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from hydra.jobmanager import metrics
+from hydra.jobmanager.jobmanager import JobManager
+
+
+class Command(BaseCommand):
+    help = ("Starts jobs that are waiting for a free slot on the cluster in the order of the scheduling policy, and "
+            "periodically reconciles the in-flight jobs with k8s and refreshes the metrics of the database totals.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=float(settings.JOB_SCHEDULE_POLL_INTERVAL),
+            help="Seconds to wait between scheduling passes.",
+        )
+        parser.add_argument(
+            "--reconcile-interval",
+            type=float,
+            default=float(settings.K8S_RECONCILE_INTERVAL),
+            help="Seconds between reconciliations of the in-flight jobs with k8s, 0 turns them off.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run a single scheduling pass and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options["poll_interval"]
+        reconcile_interval = options["reconcile_interval"]
+        job_manager = JobManager()
+        logging.info("Starting pending job scheduler",
+                     extra={"poll_interval": poll_interval, "reconcile_interval": reconcile_interval})
+        last_reconciled = None
+        while self.should_continue():
+            if reconcile_interval > 0 and (last_reconciled is None or time.monotonic() - last_reconciled >= reconcile_interval):
+                last_reconciled = time.monotonic()
+                try:
+                    job_manager.reconcile_active_jobs()
+                except Exception as e:
+                    logging.error("Failed to reconcile active jobs", extra={"exception": e})
+                try:
+                    metrics.update_database_totals()
+                except Exception as e:
+                    logging.error("Failed to update the database totals", extra={"exception": e})
+            try:
+                job_manager.schedule_pending()
+            except Exception as e:
+                logging.error("Failed to schedule pending jobs", extra={"exception": e})
+            if options["once"]:
+                return
+            close_old_connections()
+            time.sleep(poll_interval)
+
+    def should_continue(self):
+        return True
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from hydra.jobmanager import policies, simulator
+
+
+class Command(BaseCommand):
+    help = "Compares scheduling policies on a synthetic workload, without touching the database or the cluster."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--policy",
+            action="append",
+            help="A policy to simulate, can be given more than once. All built-in policies by default.",
+        )
+        parser.add_argument(
+            "--workload",
+            help="A JSON file with the workload, see hydra.jobmanager.simulator.DEFAULT_WORKLOAD for the format.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random arrivals and runtimes.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the full results as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        workload = None
+        if options["workload"]:
+            with open(options["workload"]) as workload_file:
+                workload = json.load(workload_file)
+        results = [simulator.simulate(policies.get_policy(name), workload, seed=options["seed"])
+                   for name in options["policy"] or list(policies.POLICIES)]
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write("{0}: {1} of {2} jobs finished, {3:.0%} utilization".format(
+                result["policy"], result["finished"], result["arrived"], result["utilization"]))
+            rows = [("all", result["wait"])] + sorted(result["wait_by_namespace"].items()) + sorted(
+                result["wait_by_job_spec"].items())
+            for name, wait in rows:
+                self.stdout.write("  {0:<20} jobs={1:<6} wait mean={2} p50={3} p95={4} max={5}".format(
+                    name, wait["jobs"], *(self._seconds(wait[key]) for key in ("mean", "p50", "p95", "max"))))
+
+    @staticmethod
+    def _seconds(value):
+        return "-" if value is None else "{0:.0f}s".format(value)
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_add_device_id_whitelisted_devices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Batch_Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time the event was queued.')),
+                ('processed_at', models.DateTimeField(default=None, help_text='Time the event was handled, null while it is pending.', null=True)),
+                ('tries', models.PositiveSmallIntegerField(default=0, help_text='The number of times handling the event has been attempted')),
+                ('batch', models.ForeignKey(help_text='The batch which was saved.', on_delete=django.db.models.deletion.CASCADE, to='api.batch')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='batch_event',
+            index=models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['created_at'], name='batch_event_pending_idx'),
+        ),
+    ]
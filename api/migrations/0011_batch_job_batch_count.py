@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_batch_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch_job',
+            name='batch_count',
+            field=models.PositiveIntegerField(default=0, help_text='The number of batches in the job, kept in line with `batches` on every add/remove.'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def flags_to_state(apps, schema_editor):
+    Batch_Job = apps.get_model('api', 'Batch_Job')
+    scheduled_jobs = Batch_Job.objects.filter(scheduled=True)
+    # Each update overrides the previous one for the jobs it matches, so the
+    # most specific flag combination wins
+    scheduled_jobs.update(state='scheduled')
+    scheduled_jobs.filter(created_on_k8s=True).update(state='created')
+    scheduled_jobs.filter(started=True).update(state='running')
+    scheduled_jobs.filter(finished=False, succeeded=False, tries__gt=5).update(state='failed')
+    scheduled_jobs.filter(finished=True, succeeded=False).update(state='failed')
+    scheduled_jobs.filter(succeeded=True).update(state='succeeded')
+
+
+def state_to_flags(apps, schema_editor):
+    Batch_Job = apps.get_model('api', 'Batch_Job')
+    Batch_Job.objects.exclude(state='queued').update(scheduled=True)
+    Batch_Job.objects.filter(state__in=['created', 'running', 'succeeded', 'failed']).update(created_on_k8s=True)
+    Batch_Job.objects.filter(state__in=['running', 'succeeded', 'failed']).update(started=True)
+    Batch_Job.objects.filter(state__in=['succeeded', 'failed']).update(finished=True)
+    Batch_Job.objects.filter(state='succeeded').update(succeeded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_batch_job_batch_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch_job',
+            name='state',
+            field=models.CharField(choices=[('queued', 'Queued'), ('scheduled', 'Scheduled'), ('created', 'Created on k8s'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', help_text='The lifecycle state of the job.', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='batch_job',
+            name='state_changed_at',
+            field=models.DateTimeField(default=None, help_text='The time of the last state transition, should be in UTC time.', null=True),
+        ),
+        migrations.RunPython(flags_to_state, state_to_flags),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_batch_job_state'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='batch_job',
+            name='created_on_k8s',
+        ),
+        migrations.RemoveField(
+            model_name='batch_job',
+            name='finished',
+        ),
+        migrations.RemoveField(
+            model_name='batch_job',
+            name='scheduled',
+        ),
+        migrations.RemoveField(
+            model_name='batch_job',
+            name='started',
+        ),
+        migrations.RemoveField(
+            model_name='batch_job',
+            name='succeeded',
+        ),
+        migrations.AddIndex(
+            model_name='batch_job',
+            index=models.Index(fields=['job_spec', 'state'], name='batch_job_spec_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='batch_job',
+            index=models.Index(fields=['state', 'state_changed_at'], name='batch_job_state_changed_idx'),
+        ),
+    ]
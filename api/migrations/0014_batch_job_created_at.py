@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_remove_batch_job_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch_job',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, help_text='Time the job was created, i.e. when its first batch arrived.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_batch_job_created_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='batch',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, help_text='Time batch information was first sent to this server.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_batch_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job_spec',
+            name='max_active_jobs',
+            field=models.PositiveIntegerField(blank=True, default=None, help_text='Optional cap on the number of jobs of this job spec that can be active at the same time', null=True),
+        ),
+        migrations.AddField(
+            model_name='job_spec',
+            name='weight',
+            field=models.PositiveSmallIntegerField(default=1, help_text='The share of the cluster this job spec gets under the weighted fair scheduling policy'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_job_spec_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job_spec',
+            name='max_wait',
+            field=models.DurationField(blank=True, default=None, help_text='Optional time after which a job is started below the data threshold, counted from its first batch', null=True),
+        ),
+    ]
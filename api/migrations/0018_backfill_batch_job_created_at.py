@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def created_at_from_batches(apps, schema_editor):
+    Batch = apps.get_model('api', 'Batch')
+    Batch_Job = apps.get_model('api', 'Batch_Job')
+    # Jobs from before 0014 have no created_at, their oldest batch tells when they started waiting. Jobs without
+    # batches never linger, so they are left empty.
+    oldest_batch = Batch.objects.filter(batch_job=OuterRef('pk')).order_by('created_at').values('created_at')[:1]
+    Batch_Job.objects.filter(created_at__isnull=True).update(created_at=Subquery(oldest_batch))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_job_spec_max_wait'),
+    ]
+
+    operations = [
+        migrations.RunPython(created_at_from_batches, migrations.RunPython.noop),
+    ]
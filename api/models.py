@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 import uuid
 
 
@@ -14,6 +14,7 @@ class Batch(models.Model):
         help_text="The id of the device which recorded the device")
     created_at = models.DateTimeField(
         auto_now_add=True,
+        db_index=True,
         help_text="Time batch information was first sent to this server.")
     updated_at = models.DateTimeField(
         null=True,
@@ -25,6 +26,12 @@ class Batch(models.Model):
         help_text="Region that batch came from."
     )
 
+    def save(self, *args, **kwargs):
+        # The post_save signal writes the Batch_Event of the batch, in the same transaction the batch is saved in, so
+        # a batch is never committed without its event
+        with transaction.atomic():
+            super(Batch, self).save(*args, **kwargs)
+
     def __str__(self):
         return str(self.batch_id)
 
@@ -128,6 +135,17 @@ class Job_Spec(models.Model):
         default=0,
         help_text="Optional priority for potentially ordering jobs",
     )
+    weight = models.PositiveSmallIntegerField(
+        null=False,
+        default=1,
+        help_text="The share of the cluster this job spec gets under the weighted fair scheduling policy",
+    )
+    max_active_jobs = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text="Optional cap on the number of jobs of this job spec that can be active at the same time",
+    )
     active = models.BooleanField(
         default=True,
         null=False,
@@ -151,6 +169,12 @@ class Job_Spec(models.Model):
         null=False,
         help_text="The maximum amount of data to process in the job"
     )
+    max_wait = models.DurationField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text="Optional time after which a job is started below the data threshold, counted from its first batch",
+    )
     created_by = models.CharField(
         max_length=20, choices=USERS, default=GREG, help_text='The user who defined the job spec')
     environment_variables = models.JSONField(default=dict, null=True)
@@ -170,41 +194,71 @@ class Job_Spec(models.Model):
 class Batch_Job(models.Model):
     """
     Defines the relationship between jobs and batches, i.e. keeps track of
-    what jobs are run with what batch.
+    what jobs are run with what batch. The lifecycle of the job is kept in
+    `state`, and `JobManager` only moves it along `TRANSITIONS`.
     """
+
+    QUEUED = 'queued'
+    SCHEDULED = 'scheduled'
+    CREATED = 'created'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATES = [
+        (QUEUED, 'Queued'),
+        (SCHEDULED, 'Scheduled'),
+        (CREATED, 'Created on k8s'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    # The states a job may move to from each state. Moving to the state a job
+    # is already in is always allowed, since k8s events can be repeated.
+    TRANSITIONS = {
+        QUEUED: {SCHEDULED},
+        SCHEDULED: {QUEUED, CREATED, RUNNING, SUCCEEDED, FAILED},
+        CREATED: {RUNNING, SUCCEEDED, FAILED},
+        RUNNING: {SUCCEEDED, FAILED},
+        SUCCEEDED: set(),
+        FAILED: {QUEUED},
+    }
+
+    # States of jobs which take up a slot on the cluster
+    IN_FLIGHT_STATES = (SCHEDULED, CREATED, RUNNING)
+
+    # A job is marked as failed once its pods have failed more often than this
+    MAX_TRIES = 5
+
     job_spec = models.ForeignKey(
         'Job_Spec',
         null=False,
         help_text="The job spec defining this batch job.",
         on_delete=models.CASCADE
     )
-    scheduled = models.BooleanField(
-        default=False,
-        help_text="Flag denoting whether the job has been scheduled"
-    )
-
-    created_on_k8s = models.BooleanField(
-        default=False,
-        help_text="Flag denoting whether the job has been created on k8s."
+    state = models.CharField(
+        max_length=16,
+        choices=STATES,
+        default=QUEUED,
+        null=False,
+        help_text="The lifecycle state of the job."
     )
-
-    started = models.BooleanField(
-        default=False,
-        help_text="Flag denoting whether the job has been started."
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        null=True,
+        help_text="Time the job was created, i.e. when its first batch arrived."
     )
-    finished = models.BooleanField(
-        default=False,
-        help_text="Flag denoting whether the job has terminated."
+    state_changed_at = models.DateTimeField(
+        null=True,
+        default=None,
+        help_text="The time of the last state transition, should be in UTC time."
     )
     time_started = models.DateTimeField(
         null=True,
         default=None,
         help_text="The start time of the job, should be in UTC time."
     )
-    succeeded = models.BooleanField(
-        default=False,
-        help_text="Flag denoting whether the job was successful or not."
-    )
     tries = models.PositiveSmallIntegerField(
         default=0,
         null=False,
@@ -213,4 +267,75 @@ class Batch_Job(models.Model):
     batches = models.ManyToManyField(Batch,
                                      help_text='The batches that this job took place on'
                                      )
+    batch_count = models.PositiveIntegerField(
+        default=0,
+        null=False,
+        help_text="The number of batches in the job, kept in line with `batches` on every add/remove."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job_spec', 'state'], name='batch_job_spec_state_idx'),
+            models.Index(fields=['state', 'state_changed_at'], name='batch_job_state_changed_idx'),
+        ]
+
+    def can_transition_to(self, state):
+        return state == self.state or state in self.TRANSITIONS[self.state]
+
+    # Read-only views of the state, matching the flags the state column replaced
+
+    @property
+    def scheduled(self):
+        return self.state != self.QUEUED
+
+    @property
+    def created_on_k8s(self):
+        return self.state in (self.CREATED, self.RUNNING, self.SUCCEEDED, self.FAILED)
+
+    @property
+    def started(self):
+        return self.state in (self.RUNNING, self.SUCCEEDED, self.FAILED)
+
+    @property
+    def finished(self):
+        return self.state in (self.SUCCEEDED, self.FAILED)
+
+    @property
+    def succeeded(self):
+        return self.state == self.SUCCEEDED
+
+
+class Batch_Event(models.Model):
+    """
+    Outbox of batches waiting to be fanned out to their jobs. A row is written
+    whenever a batch is saved, and the `process_batch_events` management
+    command drains them in bulk outside of the request path.
+    """
+    batch = models.ForeignKey(
+        'Batch',
+        on_delete=models.CASCADE,
+        help_text="The batch which was saved."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="Time the event was queued."
+    )
+    processed_at = models.DateTimeField(
+        null=True,
+        default=None,
+        help_text="Time the event was handled, null while it is pending."
+    )
+    tries = models.PositiveSmallIntegerField(
+        default=0,
+        null=False,
+        help_text="The number of times handling the event has been attempted"
+    )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                name='batch_event_pending_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
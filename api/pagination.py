@@ -0,0 +1,23 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the list endpoints, newest first. The cursor encodes the position in the ordering instead
+    of an offset, so every page is a single indexed range query no matter how deep the client pages.
+    """
+    ordering = ('-created_at', '-pk')
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = int(settings.API_PAGE_SIZE)
+        self.max_page_size = int(settings.API_MAX_PAGE_SIZE)
+
+
+class IdCursorPagination(CreatedAtCursorPagination):
+    """
+    Same as `CreatedAtCursorPagination` for models without a (reliable) `created_at`. Ids are handed out in insertion
+    order, so this is newest first as well.
+    """
+    ordering = '-id'
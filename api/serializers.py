@@ -10,13 +10,29 @@ from .models import (
 from rest_framework import serializers
 
 
+class DynamicFieldsMixin(object):
+    """
+    Lets clients ask for a subset of the fields with a `fields` query parameter, e.g. `?fields=id,state`. Unknown
+    field names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return
+        requested = set(request.query_params['fields'].split(','))
+        for field_name in set(self.fields) - requested:
+            self.fields.pop(field_name)
+
+
 class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job_Definition
         fields = '__all__'
 
 
-class RegionSerializer(serializers.ModelSerializer):
+class RegionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Region
         fields = '__all__'
@@ -33,7 +49,7 @@ def validate_batch_id(value):
         raise serializers.ValidationError('Batch_id already exists!')
 
 
-class BatchSerializer(serializers.ModelSerializer):
+class BatchSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     batch_id = serializers.UUIDField(validators=[validate_batch_id])
     region = serializers.SlugRelatedField(
         many=False,
@@ -47,13 +63,13 @@ class BatchSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class JobSpecSerializer(serializers.ModelSerializer):
+class JobSpecSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Job_Spec
         fields = '__all__'
 
 
-class BatchJobSerializer(serializers.ModelSerializer):
+class BatchJobSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Batch_Job
         fields = '__all__'
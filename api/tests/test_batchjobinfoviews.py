@@ -44,38 +44,38 @@ class TestBatchJobView(TestCase):
         # batch2 - successful, active, failed
         # batch3 - successful, active, queued, also queued with job_spec3
         self.batch1_active_job = Batch_Job.objects.create(job_spec = self.job_spec1, 
-            scheduled=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.RUNNING, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch1_active_job.batches.add(self.batch1)
         self.batch1_active_job.save()
         self.batch1_queued_job = Batch_Job.objects.create(job_spec = self.job_spec2)
         self.batch1_queued_job.batches.add(self.batch1)
         self.batch1_queued_job.save()
         self.batch1_failed_job = Batch_Job.objects.create(job_spec = self.job_spec1, 
-            scheduled=True, finished=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.FAILED, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch1_failed_job.batches.add(self.batch1)
         self.batch1_failed_job.save()
         
         self.batch_2_succ_job = Batch_Job.objects.create(job_spec = self.job_spec1, 
-            scheduled=True, succeeded=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.SUCCEEDED, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch_2_succ_job.batches.add(self.batch2)
         self.batch_2_succ_job.save()
         self.batch_2_active_job = Batch_Job.objects.create(job_spec = self.job_spec2, 
-            scheduled=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.RUNNING, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch_2_active_job.batches.add(self.batch2)
         self.batch_2_active_job.save()
 
         self.batch_2_failed_job = Batch_Job.objects.create(job_spec = self.job_spec1, 
-            scheduled=True, finished=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.FAILED, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch_2_failed_job.batches.add(self.batch2)
         self.batch_2_failed_job.save()
 
         self.batch_3_succjob = Batch_Job.objects.create(job_spec = self.job_spec2, 
-            scheduled=True, succeeded=True, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.SUCCEEDED, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch_3_succjob.batches.add(self.batch3)
         self.batch_3_succjob.save()
 
         self.batch_3_activejob = Batch_Job.objects.create(job_spec = self.job_spec1, 
-            scheduled=True,  time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+            state=Batch_Job.RUNNING, time_started=dt.datetime.now().replace(tzinfo=dt.timezone.utc))
         self.batch_3_activejob.batches.add(self.batch3)
         self.batch_3_activejob.save()
 
@@ -142,6 +142,35 @@ class TestBatchJobView(TestCase):
         self.assertEqual(data_dict['Successful_Jobs']['Job_List'][0]["job_name"], self.batch_3_succjob.job_spec.job_definition.name)
         self.assertEqual(data_dict['Successful_Jobs']['Job_List'][0]["time_started"], self.batch_3_succjob.time_started.strftime("%Y-%m-%d %H:%M:%S"))
 
+    @patch('api.models.models.base.post_save')
+    def test_single_query(self, post_save_mock):
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/jobs-by-batch/', data={"batch_id": str(self.batch3.batch_id)})
+        self.assertEqual(resp.json()["Total_Jobs"], 4)
+
+    @patch('api.models.models.base.post_save')
+    def test_multiple_batches(self, post_save_mock):
+        missing_batch_id = str(uuid.uuid4())
+        batch_ids = [str(self.batch1.batch_id), str(self.batch2.batch_id), missing_batch_id]
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/jobs-by-batch/', data={"batch_id": ",".join(batch_ids)})
+        self.assertEqual(resp.status_code, 200)
+        data_dict = resp.json()
+        self.assertEqual(set(data_dict["Batches"]), {str(self.batch1.batch_id), str(self.batch2.batch_id)})
+        self.assertEqual(data_dict["Batches"][str(self.batch1.batch_id)]["Queued_Jobs"]["Total"], 1)
+        self.assertEqual(data_dict["Batches"][str(self.batch2.batch_id)]["Successful_Jobs"]["Total"], 1)
+        self.assertEqual(data_dict["Missing_Batches"], [missing_batch_id])
+
+    @patch('api.models.models.base.post_save')
+    def test_multiple_batches_post(self, post_save_mock):
+        batch = Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+        resp = self.client.post('/api/jobs-by-batch/', data={"batch_ids": [str(self.batch3.batch_id), str(batch.batch_id)]},
+                                content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        data_dict = resp.json()["Batches"]
+        self.assertEqual(data_dict[str(self.batch3.batch_id)]["Total_Jobs"], 4)
+        self.assertEqual(data_dict[str(batch.batch_id)]["Total_Jobs"], 0)
+
     @patch('api.models.models.base.post_save')
     def test_total_queued_works(self, post_save_mock):
         resp = self.client.get("/api/jobs-queued/")
@@ -2,6 +2,9 @@ import datetime as dt
 import uuid
 from unittest.mock import patch
 
+from django.test import override_settings
+from django.urls import reverse
+
 from api.tests.generictestview import GenericTestView
 from api.models import Job_Definition, Job_Spec, Batch_Job, Batch, Region
 
@@ -28,14 +31,14 @@ class TestBatchJobView(GenericTestView):
 
     def test_batch_job_get_multi(self, post_save_mock):
         Batch_Job.objects.create(job_spec=self.job_spec)
-        Batch_Job.objects.create(job_spec=self.job_spec, started=True)
+        Batch_Job.objects.create(job_spec=self.job_spec, state=Batch_Job.RUNNING)
         resp = self.generic_get_one_item('batchjobs-list')
         self.assertIn('1', resp.content.decode())
-        self.assertIn('true', resp.content.decode())
+        self.assertIn(Batch_Job.RUNNING, resp.content.decode())
 
     def test_batch_job_get_multi_w_batches(self, post_save_mock):
         bj1 = Batch_Job.objects.create(job_spec=self.job_spec)
-        bj2 = Batch_Job.objects.create(job_spec=self.job_spec, started=True)
+        bj2 = Batch_Job.objects.create(job_spec=self.job_spec, state=Batch_Job.RUNNING)
         batch_id1 = uuid.uuid4()
         batch_id2 = uuid.uuid4()
         batch1 = Batch.objects.create(batch_id=batch_id1, region=self.region)
@@ -45,6 +48,31 @@ class TestBatchJobView(GenericTestView):
         bj1.save()
         resp = self.generic_get_one_item('batchjobs-list')
         self.assertIn('1', resp.content.decode())
-        self.assertIn('true', resp.content.decode())
+        self.assertIn(Batch_Job.RUNNING, resp.content.decode())
         self.assertIn(str(batch_id1), resp.content.decode())
         self.assertIn(str(batch_id2), resp.content.decode())
+
+    @override_settings(API_PAGE_SIZE=2)
+    def test_batch_job_list_pages_with_cursor(self, post_save_mock):
+        batch_jobs = [Batch_Job.objects.create(job_spec=self.job_spec) for _ in range(3)]
+        resp = self.client.get(reverse('batchjobs-list'))
+        page = resp.json()
+        self.assertEqual([bj['id'] for bj in page['results']], [batch_jobs[2].id, batch_jobs[1].id])
+        resp = self.client.get(page['next'])
+        page = resp.json()
+        self.assertEqual([bj['id'] for bj in page['results']], [batch_jobs[0].id])
+        self.assertIsNone(page['next'])
+
+    def test_batch_job_list_prefetches_batches(self, post_save_mock):
+        for _ in range(3):
+            bj = Batch_Job.objects.create(job_spec=self.job_spec)
+            bj.batches.add(Batch.objects.create(batch_id=uuid.uuid4(), region=self.region))
+        # the page and one query for the batches of all jobs on it
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse('batchjobs-list'))
+        self.assertEqual(len(resp.json()['results']), 3)
+
+    def test_batch_job_list_fields(self, post_save_mock):
+        bj = Batch_Job.objects.create(job_spec=self.job_spec, state=Batch_Job.RUNNING)
+        resp = self.client.get(reverse('batchjobs-list'), {'fields': 'id,state'})
+        self.assertEqual(resp.json()['results'], [{'id': bj.id, 'state': Batch_Job.RUNNING}])
@@ -2,6 +2,9 @@ import uuid
 import logging
 from unittest.mock import patch
 
+from django.test import override_settings
+from django.urls import reverse
+
 # from django.db.models.signals import post_save
 
 from api.tests.generictestview import GenericTestView
@@ -185,3 +188,86 @@ class TestBatchViews(GenericTestView):
     #     batch = Batch.objects.get(batch_id=batch_id)
     #     self.assertEqual(batch.region.code, 'Crackerbox Palace')
     #     self.assertEqual(len(post_save_mock.mock_calls),  2)
+
+
+@patch('api.views.batchevents.submit_batches')
+@patch('api.views._notify_houston_many')
+class TestBatchBulkView(GenericTestView):
+
+    def setUp(self):
+        self.region = Region.objects.create(code='Crackerbox Palace',
+        description="we've been expecting yoooooooooou", namespace='George')
+
+    def test_bulk_post_creates_and_updates(self, notify_houston_mock, submit_batches_mock):
+        existing_id, new_id = uuid.uuid4(), uuid.uuid4()
+        with patch('api.models.models.base.post_save'):
+            Batch.objects.create(batch_id=existing_id, region=self.region)
+        data = [
+            {'batch_id': str(existing_id), 'region': self.region.code},
+            {'batch_id': str(new_id), 'device_id': str(uuid.uuid4()), 'region': self.region.code},
+        ]
+        r = self.client.post(reverse('batches-bulk'), data=data, content_type='application/json')
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual(body['updated'], 1)
+        self.assertEqual([result['status'] for result in body['results']], ['updated', 'created'])
+        self.assertEqual(Batch.objects.count(), 2)
+        self.assertIsNotNone(Batch.objects.get(batch_id=existing_id).updated_at)
+        submit_batches_mock.assert_called_once()
+        self.assertEqual({batch.batch_id for batch in submit_batches_mock.call_args.args[0]}, {existing_id, new_id})
+        notify_houston_mock.assert_called_once()
+        self.assertEqual(len(notify_houston_mock.call_args.args[1]), 4)
+
+    def test_bulk_post_reports_invalid_items(self, notify_houston_mock, submit_batches_mock):
+        batch_id = uuid.uuid4()
+        data = {'batches': [
+            {'batch_id': str(batch_id), 'region': self.region.code},
+            {'batch_id': str(batch_id), 'region': self.region.code},
+            {'batch_id': 'Wubbalubbadubdub', 'region': self.region.code},
+            {'batch_id': str(uuid.uuid4()), 'region': 'Wubbalubbadubdub'},
+            {'region': self.region.code},
+            {'batch_id': str(uuid.uuid4()), 'region': [self.region.code]},
+        ]}
+        r = self.client.post(reverse('batches-bulk'), data=data, content_type='application/json')
+        self.assertEqual(r.status_code, 200)
+        body = r.json()
+        self.assertEqual(body['created'], 1)
+        self.assertEqual(body['failed'], 5)
+        self.assertEqual([result['status'] for result in body['results']],
+                         ['created', 'error', 'error', 'error', 'error', 'error'])
+        self.assertEqual(body['results'][5]['errors'], ['Badly formatted region'])
+        self.assertEqual(Batch.objects.count(), 1)
+        notify_houston_mock.assert_called_once()
+        self.assertEqual(len(notify_houston_mock.call_args.args[1]), 2)
+
+    def test_bulk_post_reports_concurrently_created_batches_as_updated(self, notify_houston_mock, submit_batches_mock):
+        raced_id, new_id = uuid.uuid4(), uuid.uuid4()
+        with patch('api.models.models.base.post_save'):
+            Batch.objects.create(batch_id=raced_id, region=self.region)
+        in_bulk = Batch.objects.in_bulk
+        # the first look for existing batches misses the batch another request inserted in the meantime
+        with patch.object(Batch.objects, 'in_bulk', side_effect=[{}, in_bulk([raced_id])]):
+            r = self.client.post(reverse('batches-bulk'), content_type='application/json', data=[
+                {'batch_id': str(raced_id), 'region': self.region.code},
+                {'batch_id': str(new_id), 'region': self.region.code},
+            ])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([result['status'] for result in r.json()['results']], ['updated', 'created'])
+        self.assertEqual(Batch.objects.count(), 2)
+
+    def test_bulk_post_queries_do_not_grow_with_batches(self, notify_houston_mock, submit_batches_mock):
+        data = [{'batch_id': str(uuid.uuid4()), 'region': self.region.code} for _ in range(50)]
+        # regions, existing batches and the insert, plus the savepoints of the transaction and the insert
+        with self.assertNumQueries(7):
+            self.generic_post_success('batches-bulk', data, 200)
+        self.assertEqual(Batch.objects.count(), 50)
+
+    @override_settings(BATCH_BULK_MAX_SIZE=1)
+    def test_bulk_post_too_many_batches(self, notify_houston_mock, submit_batches_mock):
+        data = [{'batch_id': str(uuid.uuid4()), 'region': self.region.code} for _ in range(2)]
+        self.generic_post_failure('batches-bulk', data)
+        self.assertEqual(Batch.objects.count(), 0)
+
+    def test_bulk_post_not_a_list(self, notify_houston_mock, submit_batches_mock):
+        self.generic_post_failure('batches-bulk', {'batch_id': str(uuid.uuid4())})
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from prometheus_client import generate_latest
+
+from hydra.jobmanager import locks
+
+
+@override_settings(CONTROLLER_METRICS_PORT=0)
+@patch('api.management.commands.schedule_pending_jobs.JobManager')
+@patch('api.management.commands.run_hydra_controller.JobManager')
+class TestRunHydraController(TestCase):
+
+    def test_controller_starts_watcher_and_schedules(self, controller_job_manager_mock, job_manager_mock):
+        call_command('run_hydra_controller', once=True)
+        controller_job_manager_mock.return_value.job_scheduler.jobwatcher.start.assert_called_once()
+        job_manager_mock.return_value.reconcile_active_jobs.assert_called_once()
+        job_manager_mock.return_value.schedule_pending.assert_called_once()
+
+    @override_settings(CONTROLLER_METRICS_PORT=8001)
+    @patch('hydra.jobmanager.metrics.start_http_server')
+    @patch('hydra.jobmanager.metrics.update_database_totals')
+    def test_controller_serves_metrics(self, update_database_totals_mock, start_http_server_mock,
+                                       controller_job_manager_mock, job_manager_mock):
+        call_command('run_hydra_controller', once=True)
+        start_http_server_mock.assert_called_once()
+        self.assertEqual(start_http_server_mock.call_args.args, (8001,))
+        update_database_totals_mock.assert_called_once()
+        content = generate_latest(start_http_server_mock.call_args.kwargs["registry"]).decode()
+        self.assertIn("# TYPE hydra_batches_total gauge", content)
+        self.assertIn("# TYPE hydra_jobs_succeeded_total counter", content)
+
+    @patch.object(locks.LeaderLock, 'is_held', return_value=False)
+    def test_controller_stops_when_lock_is_lost(self, is_held_mock, controller_job_manager_mock, job_manager_mock):
+        with self.assertRaises(CommandError):
+            call_command('run_hydra_controller', once=True)
+        job_manager_mock.return_value.schedule_pending.assert_not_called()
+
+
+class TestProcessBatchEvents(TestCase):
+
+    @override_settings(BATCH_EVENTS_METRICS_PORT=8002)
+    @patch('hydra.jobmanager.metrics.start_http_server')
+    @patch('api.management.commands.process_batch_events.batchevents.process_pending_events', return_value=0)
+    def test_worker_serves_metrics(self, process_pending_events_mock, start_http_server_mock):
+        call_command('process_batch_events', once=True)
+        process_pending_events_mock.assert_called_once()
+        self.assertEqual(start_http_server_mock.call_args.args, (8002,))
+        content = generate_latest(start_http_server_mock.call_args.kwargs["registry"]).decode()
+        self.assertNotIn("hydra_batches_total", content)
@@ -0,0 +1,90 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+
+from api import houston
+from api.houston import HoustonNotifier
+
+
+def houston_response(status_code, content=b"{}"):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    return response
+
+
+@override_settings(HOUSTON_TOKEN="token", HOUSTON_MAX_RETRIES=2, HOUSTON_QUEUE_SIZE=2)
+@patch('api.houston.time.sleep')
+class TestHoustonNotifier(TestCase):
+
+    def setUp(self):
+        HoustonNotifier._instance = None
+        self.notifier = HoustonNotifier()
+        self.notifier.session = MagicMock()
+        self.photo_status = {"batch": "4ece9443-35dd-4570-9929-d7d050242134", "status": 3, "completed": True}
+        self.imu_status = {"batch": "4ece9443-35dd-4570-9929-d7d050242134", "status": 4, "completed": True}
+
+    def tearDown(self):
+        HoustonNotifier._instance = None
+
+    def test_send_posts_each_status(self, sleep_mock):
+        self.notifier.session.post.return_value = houston_response(201)
+        self.notifier.send([("api/batch_statuses/", self.photo_status), ("api/batch_statuses/", self.imu_status)])
+        self.assertEqual(self.notifier.session.post.call_count, 2)
+
+    def test_send_coalesces_statuses_in_bulk_mode(self, sleep_mock):
+        self.notifier.bulk_statuses = True
+        self.notifier.session.post.return_value = houston_response(201)
+        self.notifier.send([("api/batch_statuses/", self.photo_status), ("api/batch_statuses/", self.imu_status)])
+        self.notifier.session.post.assert_called_once()
+        self.assertEqual(self.notifier.session.post.call_args.kwargs["json"], [self.photo_status, self.imu_status])
+
+    @override_settings(HOUSTON_MAX_BULK_SIZE=2)
+    def test_send_splits_many_statuses_in_bulk_mode(self, sleep_mock):
+        HoustonNotifier._instance = None
+        self.notifier = HoustonNotifier()
+        self.notifier.session = MagicMock()
+        self.notifier.bulk_statuses = True
+        self.notifier.session.post.return_value = houston_response(201)
+        self.notifier.send([("api/batch_statuses/", [self.photo_status, self.imu_status, self.photo_status])])
+        self.assertEqual([call.kwargs["json"] for call in self.notifier.session.post.call_args_list],
+                         [[self.photo_status, self.imu_status], self.photo_status])
+
+    def test_send_posts_many_statuses_one_by_one(self, sleep_mock):
+        self.notifier.session.post.return_value = houston_response(201)
+        self.notifier.send([("api/batch_statuses/", [self.photo_status, self.imu_status])])
+        self.assertEqual(self.notifier.session.post.call_count, 2)
+
+    @patch.object(HoustonNotifier, '_ensure_workers')
+    def test_notify_many_takes_one_place_in_the_queue(self, ensure_workers_mock, sleep_mock):
+        houston.notify_many("api/batch_statuses/", [self.photo_status, self.imu_status, self.photo_status])
+        houston.notify("api/batch_statuses/", self.photo_status)
+        self.assertEqual(self.notifier.queue.qsize(), 2)
+
+    def test_send_retries_when_houston_is_unavailable(self, sleep_mock):
+        self.notifier.session.post.side_effect = [houston_response(503), houston_response(201)]
+        self.notifier.send([("api/batch_statuses/", self.photo_status)])
+        self.assertEqual(self.notifier.session.post.call_count, 2)
+        self.assertEqual(sleep_mock.call_count, 1)
+
+    def test_send_gives_up_after_max_retries(self, sleep_mock):
+        self.notifier.session.post.return_value = houston_response(503)
+        self.notifier.send([("api/batch_statuses/", self.photo_status)])
+        self.assertEqual(self.notifier.session.post.call_count, 3)
+
+    def test_send_does_not_retry_client_errors(self, sleep_mock):
+        self.notifier.session.post.return_value = houston_response(400, b'{"batch": ["unknown batch"]}')
+        self.notifier.send([("api/batch_statuses/", self.photo_status)])
+        self.notifier.session.post.assert_called_once()
+
+    @patch.object(HoustonNotifier, '_ensure_workers')
+    def test_notify_drops_when_queue_is_full(self, ensure_workers_mock, sleep_mock):
+        for _ in range(3):
+            houston.notify("api/batch_statuses/", self.photo_status)
+        self.assertEqual(self.notifier.queue.qsize(), 2)
+
+    @override_settings(HOUSTON_TOKEN=None)
+    @patch.object(HoustonNotifier, 'notify')
+    def test_notify_skipped_without_token(self, notify_mock, sleep_mock):
+        houston.notify("api/batch_statuses/", self.photo_status)
+        notify_mock.assert_not_called()
@@ -1,6 +1,15 @@
+import datetime as dt
+import uuid
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.test import Client
 
+from prometheus_client import generate_latest
+
+from api.models import Batch, Batch_Job, Job_Definition, Job_Spec, Region
+from hydra.jobmanager import metrics
+
 
 class MetricsTestView(TestCase):
     def setUp(self):
@@ -15,4 +24,40 @@ class MetricsTestView(TestCase):
         client = Client()
         response = client.get("/metrics/")
         self.assertEqual(response.status_code, 302)
-        self.assertEqual(response.url, self.metrics_url)
\ No newline at end of file
+        self.assertEqual(response.url, self.metrics_url)
+
+    @patch('api.models.models.base.post_save')
+    def test_database_totals(self, post_save_mock):
+        region = Region.objects.create(code='EU.CARDIFF', description='CARDIFF', namespace='county')
+        batch = Batch.objects.create(batch_id=uuid.uuid4(), region=region)
+        video = Job_Definition.objects.create(name='video', description='makes videos')
+        imu = Job_Definition.objects.create(name='imu', description='imu processing')
+        for job_definition, states in [(video, [Batch_Job.SUCCEEDED, Batch_Job.SUCCEEDED, Batch_Job.RUNNING]),
+                                       (imu, [Batch_Job.FAILED, Batch_Job.QUEUED])]:
+            job_spec = Job_Spec.objects.create(job_definition=job_definition, run_environment=Job_Spec.AMAZON,
+                                               container_image='image', namespace='processing',
+                                               time_limit=dt.timedelta(hours=1), data_threshold=1)
+            for state in states:
+                Batch_Job.objects.create(job_spec=job_spec, state=state).batches.add(batch)
+
+        with self.assertNumQueries(2):
+            metrics.update_database_totals()
+        content = generate_latest(metrics.DATABASE_TOTALS).decode()
+        self.assertIn("hydra_batches_total 1.0\n", content)
+        self.assertIn("hydra_batch_jobs_total 5.0\n", content)
+        self.assertIn("hydra_batch_jobs_failed_total 1.0\n", content)
+        self.assertIn("hydra_batch_jobs_running 1.0\n", content)
+        self.assertIn('hydra_batch_jobs_succeeded_total{job_definition="video"} 2.0\n', content)
+        self.assertIn('hydra_batch_jobs_succeeded_total{job_definition="imu"} 0.0\n', content)
+
+    def test_metrics_do_not_query_the_database(self):
+        with self.assertNumQueries(0):
+            response = Client().get(self.metrics_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("hydra_batches_total", response.content.decode())
+
+    def test_metrics_include_job_lifecycle_metrics(self):
+        content = Client().get(self.metrics_url).content.decode()
+        self.assertIn("# TYPE hydra_jobs_succeeded_total counter", content)
+        self.assertIn("# TYPE hydra_job_queue_wait_seconds histogram", content)
+        self.assertIn("# TYPE hydra_job_run_seconds histogram", content)
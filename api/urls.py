@@ -7,6 +7,7 @@ urlpatterns = [
     path('regions/<str:code>/', views.RegionDetail.as_view(),
          name="regions-details"),
     path('batches/', views.BatchList.as_view(), name="batches-list"),
+    path('batches/bulk/', views.BatchBulk.as_view(), name="batches-bulk"),
     path('batches/<str:batch_id>/',
          views.BatchDetail.as_view(), name="batches-details"),
     path('jobs/', views.JobList.as_view(), name="jobs-list"),
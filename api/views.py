@@ -4,11 +4,12 @@ import logging
 import uuid
 from collections import namedtuple
 from json import JSONDecodeError
-from urllib.parse import urljoin
 
-import requests
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Value, When
 from django.http import Http404
+from prometheus_client import CONTENT_TYPE_LATEST
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import generics
@@ -22,6 +23,7 @@ from django.http import HttpResponse
 from django.views.decorators.http import require_GET
 
 
+from .pagination import CreatedAtCursorPagination, IdCursorPagination
 from .serializers import (
     RegionSerializer,
     BatchSerializer,
@@ -36,94 +38,32 @@ from .models import (
     Batch,
     Job_Definition
 )
+from hydra.jobmanager import batchevents
+from hydra.jobmanager import metrics as hydra_metrics
+from . import houston
 
 def healthcheck(request):
     return HttpResponse("Ready to serve your needs!", status=200)
 
 def _notify_houston(endpoint, data):
-    if not hasattr(settings, "HOUSTON_URL") and not hasattr(settings, "HOUSTON_TOKEN"):
-        logging.warning("Houston notification was skipped")
-        return
-    HOUSTON_BATCH_API = urljoin(settings.HOUSTON_URL, endpoint)
-    try:
-        response = requests.post(
-            HOUSTON_BATCH_API,
-            json=data,
-            headers={"Authorization": f"Token {settings.HOUSTON_TOKEN}"},
-            verify=settings.ROOT_CERT,
-        )
-        prefixed_data = {}
-    except Exception as e:
-        logging.warning("Houston request failed", extra={"exception": e})
-        return
-    if response.status_code == 201:
-        for key, value in data.items():
-            prefixed_data["houston_" + key] = value
-        logging.info(
-            "Houston notified",
-            extra={
-                "status_code": response.status_code,
-                "endpoint": endpoint,
-                "data": prefixed_data,
-                "batch_id": data["batch"] if "batch" in data else "",
-            },
-        )
-    else:
-        try:
-            data = json.loads(response.content)
-            logging.error(
-                "Houston request failed",
-                extra={
-                    "endpoint": endpoint,
-                    "status_code": response.status_code,
-                    "error": str(data["batch"]) if "batch" in data else data
-                }
-              )
-        except JSONDecodeError as e:
-            error_msg = str("Could not parse json request")
-            logging.error(
-                error_msg,
-                extra={
-                      'data': response.content,
-                      'exception': e
-                    }
-                )
+    """
+    Queues a notification for Houston, it is sent in the background so the request doesn't wait for Houston.
+    """
+    houston.notify(endpoint, data)
+
+def _notify_houston_many(endpoint, payloads):
+    """
+    Queues several notifications for Houston as one, so a bulk request takes a single place in the queue.
+    """
+    houston.notify_many(endpoint, payloads)
 
 @require_GET
 def metrics(request):
-    batches_count = Batch.objects.all().count()
-    number_of_batch_jobs = Batch_Job.objects.all().count()
-    number_of_failed_batch_jobs = Batch_Job.objects.filter(tries__gt=5, finished=False,scheduled=True,created_on_k8s=True,succeeded=False).count()
-    number_of_running_batch_jobs = Batch_Job.objects.filter(started=True, created_on_k8s=True, finished=False, succeeded=False, tries__lt=6).count()
-
-    # Videos
-    number_of_videos = Batch_Job.objects.filter(job_spec=1, succeeded=True, finished=True).count()
-
-
-    metrics = (
-        "# TYPE hydra_batches_total counter\n"
-        "# UNIT hydra_batches_total batches\n"
-        "# HELP hydra_batches_total Total batches registered in Hydra.\n"
-        f"hydra_batches_total {batches_count}\n"
-        "# TYPE hydra_batch_jobs_total counter\n"
-        "# UNIT hydra_batch_jobs_total batch_jobs\n"
-        "# HELP hydra_batch_jobs_total Total batch jobs registered in Hydra.\n"
-        f"hydra_batch_jobs_total {number_of_batch_jobs}\n"
-        "# TYPE hydra_batch_jobs_failed_total counter\n"
-        "# UNIT hydra_batch_jobs_failed_total batch_jobs\n"
-        "# HELP hydra_batch_jobs_failed_total Total failed batch jobs registered in Hydra.\n"
-        f"hydra_batch_jobs_failed_total {number_of_failed_batch_jobs}\n"
-        "# TYPE hydra_batch_jobs_running gauge\n"
-        "# UNIT hydra_batch_jobs_running batch_jobs\n"
-        "# HELP hydra_batch_jobs_running Current running batch jobs registered in Hydra.\n"
-        f"hydra_batch_jobs_running {number_of_running_batch_jobs}\n"
-        "# TYPE hydra_batch_jobs_videos_total counter\n"
-        "# UNIT hydra_batch_jobs_videos_total videos\n"
-        "# HELP hydra_batch_jobs_videos_total Total videos processed by Hydra.\n"
-        f"hydra_batch_jobs_videos_total {number_of_videos}\n"
-        "#EOF\n"
-    )
-    return HttpResponse(metrics, content_type="text/plain")
+    """
+    Prometheus metrics of the web processes, kept in memory so scrapes never query the database. The job lifecycle
+    metrics of the watcher and the totals stored in the database are served by the Hydra controller.
+    """
+    return HttpResponse(hydra_metrics.render(), content_type=CONTENT_TYPE_LATEST)
 
 class ApiOverview(APIView):
     """
@@ -145,6 +85,7 @@ class RegionList(generics.ListCreateAPIView):
     """
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
+    pagination_class = IdCursorPagination
     renderer_classes = (BrowsableAPIRenderer, JSONRenderer, HTMLFormRenderer)
 
 
@@ -163,8 +104,9 @@ class BatchList(generics.ListCreateAPIView):
     """
     List all Batch, or create a new Batch.
     """
-    queryset = Batch.objects.all()
+    queryset = Batch.objects.select_related('region')
     serializer_class = BatchSerializer
+    pagination_class = CreatedAtCursorPagination
     renderer_classes = (BrowsableAPIRenderer, JSONRenderer, HTMLFormRenderer)
 
     def post(self, request, *args, **kwargs):
@@ -283,12 +225,121 @@ class BatchDetail(generics.RetrieveUpdateAPIView):
         return Response(status=200)
         
 
+class BatchBulk(APIView):
+    """
+        Create or update many Batch instances in one request. Accepts a list of batches (or {"batches": [...]}) in the
+        same format as `BatchList`. New batches are inserted with a single bulk insert, existing batches get their
+        `updated_at` bumped like `BatchDetail.put` does, and all of them are handed to the job fan-out at once. The
+        Houston statuses of all batches are queued as one notification. Returns a result for every item, in the order
+        they were sent.
+    """
+
+    def post(self, request, *args, **kwargs):
+        items = request.data.get("batches") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return Response(data={"Message": "Expected a list of batches"}, status=400)
+        max_size = int(settings.BATCH_BULK_MAX_SIZE)
+        if len(items) > max_size:
+            return Response(data={"Message": "Too many batches, at most {0} are allowed".format(max_size)}, status=400)
+
+        regions = {region.code: region for region in Region.objects.filter(
+            code__in={item.get("region") for item in items if isinstance(item, dict) and isinstance(item.get("region"), str)})}
+        results = []
+        parsed = {}
+        for item in items:
+            result, batch = self._parse_item(item, regions)
+            if batch is not None:
+                if batch.batch_id in parsed:
+                    result = {"batch_id": result["batch_id"], "status": "error", "errors": ["Duplicate batch_id in request"]}
+                else:
+                    parsed[batch.batch_id] = batch
+            results.append(result)
+
+        now = dt.datetime.now().replace(tzinfo=dt.timezone.utc)
+        with transaction.atomic():
+            existing = Batch.objects.in_bulk(list(parsed.keys()))
+            new_batches = []
+            for batch_id, batch in parsed.items():
+                if batch_id in existing:
+                    existing[batch_id].updated_at = now
+                elif batch.region_id is None:
+                    parsed[batch_id] = None
+                else:
+                    new_batches.append(batch)
+            try:
+                with transaction.atomic():
+                    Batch.objects.bulk_create(new_batches)
+            except IntegrityError:
+                # A concurrent request inserted some of the batches in the meantime, those are reported as existing
+                raced = Batch.objects.in_bulk([batch.batch_id for batch in new_batches])
+                for batch in raced.values():
+                    batch.updated_at = now
+                existing.update(raced)
+                new_batches = [batch for batch in new_batches if batch.batch_id not in raced]
+                Batch.objects.bulk_create(new_batches, ignore_conflicts=True)
+            Batch.objects.filter(batch_id__in=list(existing.keys())).update(updated_at=now)
+            batchevents.submit_batches(new_batches + list(existing.values()))
+        hydra_metrics.BATCHES_INGESTED.inc(len(new_batches))
+
+        statuses = []
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            batch_id = uuid.UUID(result["batch_id"])
+            if batch_id in existing:
+                result["status"] = "updated"
+            elif parsed[batch_id] is None:
+                result.update({"status": "error", "errors": ["Invalid region"]})
+                continue
+            else:
+                result["status"] = "created"
+            statuses.append({"batch": result["batch_id"], "status": 3, "completed": True})
+            statuses.append({"batch": result["batch_id"], "status": 4, "completed": True})
+        if statuses:
+            _notify_houston_many("api/batch_statuses/", statuses)
+
+        failed = len(items) - len(new_batches) - len(existing)
+        logging.info("Bulk batch request handled", extra={
+            "batches_created": len(new_batches), "batches_updated": len(existing), "batches_failed": failed})
+        return Response(data={
+            "created": len(new_batches),
+            "updated": len(existing),
+            "failed": failed,
+            "results": results,
+        }, status=200)
+
+    def _parse_item(self, item, regions):
+        """
+        Returns the result entry and an unsaved `Batch` for one item of the request, the batch is None if the item is
+        invalid. A batch without a known region can still update an existing batch, so its region is left empty here.
+        """
+        if not isinstance(item, dict) or "batch_id" not in item:
+            return {"batch_id": None, "status": "error", "errors": ["Cant find key 'batch_id' in data"]}, None
+        try:
+            batch_id = uuid.UUID(str(item["batch_id"]))
+        except ValueError:
+            return {"batch_id": item["batch_id"], "status": "error", "errors": ["Badly formatted batch_id"]}, None
+        device_id = item.get("device_id")
+        if device_id is not None:
+            try:
+                device_id = uuid.UUID(str(device_id))
+            except ValueError:
+                return {"batch_id": str(batch_id), "status": "error", "errors": ["Badly formatted device_id"]}, None
+        region_code = item.get("region")
+        if region_code is not None and not isinstance(region_code, str):
+            return {"batch_id": str(batch_id), "status": "error", "errors": ["Badly formatted region"]}, None
+        region = regions.get(region_code)
+        batch = Batch(batch_id=batch_id, device_id=device_id, region=region)
+        return {"batch_id": str(batch_id), "status": "pending"}, batch
+
+
 class JobSpecsList(generics.ListCreateAPIView):
     """
     List all Job_Specs, or create a new Job Spec.
     """
     queryset = Job_Spec.objects.all()
     serializer_class = JobSpecSerializer
+    pagination_class = IdCursorPagination
     renderer_classes = (BrowsableAPIRenderer, JSONRenderer, HTMLFormRenderer)
 
 
@@ -324,57 +375,99 @@ class BatchJobList(generics.ListAPIView):
     """
         List all batch jobs
     """
-    queryset = Batch_Job.objects.all()
+    queryset = Batch_Job.objects.prefetch_related('batches')
     serializer_class = BatchJobSerializer
+    pagination_class = IdCursorPagination
 
 class BatchJobsByBatch(APIView):
+    """
+        The jobs of one or more batches, grouped by state. Takes one or more `batch_id` query parameters (repeated
+        or comma separated), or a POST with {"batch_ids": [...]} for long lists. A single batch returns its jobs
+        directly, several batches return them per batch_id.
+    """
+    CATEGORIES = (
+        ("Queued_Jobs", "queued"),
+        ("Active_Jobs", "active"),
+        ("Successful_Jobs", "successful"),
+        ("Failed_Jobs", "failed"),
+    )
 
-    def _get_pretty_job(self, batch_job):
+    def _get_pretty_job(self, row):
         time_started = None
-        if batch_job.time_started:
-            time_started = batch_job.time_started.strftime("%Y-%m-%d %H:%M:%S")
-        return {"job_name": batch_job.job_spec.job_definition.name, 
+        if row["batch_job__time_started"]:
+            time_started = row["batch_job__time_started"].strftime("%Y-%m-%d %H:%M:%S")
+        return {"job_name": row["batch_job__job_spec__job_definition__name"],
         "time_started": time_started}
 
-    def _get_response(self, queued_jobs, active_jobs, successful_jobs, failed_jobs):
-        response = {"Total_Jobs": len(queued_jobs) + len(active_jobs) + len(successful_jobs) + len(failed_jobs), 
-        "Queued_Jobs": {"Total": len(queued_jobs), "Job_List": queued_jobs},
-        "Active_Jobs": {"Total": len(active_jobs), "Job_List": active_jobs}, 
-        "Successful_Jobs": {"Total": len(successful_jobs), "Job_List": successful_jobs}, 
-        "Failed_Jobs": {"Total": len(failed_jobs), "Job_List": failed_jobs}}
+    def _get_response(self, jobs_by_category):
+        response = {"Total_Jobs": sum(len(jobs) for jobs in jobs_by_category.values())}
+        for key, category in self.CATEGORIES:
+            response[key] = {"Total": len(jobs_by_category[category]), "Job_List": jobs_by_category[category]}
         return response
 
-
-    def get(self, request):
+    def _get_jobs_by_batch(self, batch_ids):
+        """
+        Returns the jobs of the batches in a single query, classified by the database. Batches without jobs are
+        included (with no jobs), batches that don't exist are not.
+        """
+        rows = (
+            Batch.objects.filter(batch_id__in=batch_ids)
+            .annotate(category=Case(
+                When(batch_job__isnull=True, then=Value(None)),
+                When(batch_job__state=Batch_Job.QUEUED, then=Value("queued")),
+                When(batch_job__state=Batch_Job.SUCCEEDED, then=Value("successful")),
+                When(batch_job__state=Batch_Job.FAILED, then=Value("failed")),
+                default=Value("active"),
+                output_field=CharField(),
+            ))
+            .values('batch_id', 'category', 'batch_job__time_started', 'batch_job__job_spec__job_definition__name')
+            .order_by('batch_id', 'batch_job__id')
+        )
+        jobs_by_batch = {}
+        for row in rows:
+            jobs_by_category = jobs_by_batch.setdefault(
+                row["batch_id"], {category: [] for _, category in self.CATEGORIES})
+            if row["category"] is not None:
+                jobs_by_category[row["category"]].append(self._get_pretty_job(row))
+        return jobs_by_batch
+
+    def _respond(self, raw_batch_ids):
         try:
-            batch_id = uuid.UUID(request.query_params['batch_id'])
+            batch_ids = [uuid.UUID(str(batch_id)) for batch_id in raw_batch_ids]
         except Exception as e:
             return Response(data={"Message": "Invalid batch_id requested"}, status=400)
-        try:
-            batch = Batch.objects.get(batch_id=batch_id)
-        except Exception as e:
-            return Response(data={"Message": "Batch doesn't exist"}, status=400)
-
-        batch_jobs = batch.batch_job_set.all()
-        queued_jobs = []
-        active_jobs = []
-        successful_jobs = []
-        failed_jobs = []
-        for bj in batch_jobs:
-            bj_pretty = self._get_pretty_job(bj)
-            if not bj.scheduled:
-                queued_jobs.append(bj_pretty)
-            elif bj.succeeded:
-                successful_jobs.append(bj_pretty)
-            elif not bj.finished:
-                active_jobs.append(bj_pretty)
-            else:
-                failed_jobs.append(bj_pretty)
-        final_response = self._get_response(queued_jobs, active_jobs, successful_jobs, failed_jobs)
-        return Response(data=final_response, status=200)
-    
+        if not batch_ids:
+            return Response(data={"Message": "Invalid batch_id requested"}, status=400)
+        max_batches = int(settings.API_MAX_PAGE_SIZE)
+        if len(batch_ids) > max_batches:
+            return Response(data={"Message": "Too many batch_ids, at most {0} are allowed".format(max_batches)},
+                            status=400)
+
+        jobs_by_batch = self._get_jobs_by_batch(batch_ids)
+        if len(batch_ids) == 1:
+            if batch_ids[0] not in jobs_by_batch:
+                return Response(data={"Message": "Batch doesn't exist"}, status=400)
+            return Response(data=self._get_response(jobs_by_batch[batch_ids[0]]), status=200)
+        return Response(data={
+            "Batches": {str(batch_id): self._get_response(jobs) for batch_id, jobs in jobs_by_batch.items()},
+            "Missing_Batches": [str(batch_id) for batch_id in batch_ids if batch_id not in jobs_by_batch],
+        }, status=200)
+
+    def get(self, request):
+        raw_batch_ids = []
+        for value in request.query_params.getlist('batch_id'):
+            raw_batch_ids.extend(value.split(','))
+        return self._respond(raw_batch_ids)
+
+    def post(self, request):
+        raw_batch_ids = request.data.get('batch_ids') if isinstance(request.data, dict) else None
+        if not isinstance(raw_batch_ids, list):
+            return Response(data={"Message": "Expected a list of batch_ids"}, status=400)
+        return self._respond(raw_batch_ids)
+
+
 class BatchJobsQueued(APIView):
 
     def get(self, request):
-        return Response(status=200, data={"Total Queued Jobs": Batch_Job.objects.filter(scheduled=False, job_spec__active=True).count()})
+        return Response(status=200, data={"Total Queued Jobs": Batch_Job.objects.filter(state=Batch_Job.QUEUED, job_spec__active=True).count()})
         
\ No newline at end of file
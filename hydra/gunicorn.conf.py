@@ -0,0 +1,6 @@
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of workers that exited, their counters stay in the merged totals
+    multiprocess.mark_process_dead(worker.pid)
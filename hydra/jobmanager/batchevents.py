@@ -0,0 +1,93 @@
+import datetime as dt
+import logging
+
+from distutils import util
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from api.models import Batch_Event
+from hydra.jobmanager import metrics
+from hydra.jobmanager.jobmanager import JobManager
+
+
+def is_queue_enabled():
+    """
+    Returns whether saved batches should be written to the `Batch_Event` outbox (the default) instead of being fanned
+    out to their jobs inside the request that saved them.
+    """
+    return util.strtobool(str(getattr(settings, "BATCH_EVENT_QUEUE", True)))
+
+
+def submit_batches(batches):
+    """
+    Hands newly saved batches over to the job fan-out. When the queue is enabled this is a single INSERT, which should
+    run in the transaction that saved the batches, otherwise the batches are added to their jobs right away.
+    :param batches: Should be a list of `Batch` instances.
+    """
+    if not batches:
+        return
+    if is_queue_enabled():
+        Batch_Event.objects.bulk_create([Batch_Event(batch=batch) for batch in batches])
+        logging.debug("Queued %s batch event(s)", len(batches))
+    else:
+        JobManager().on_add_batches_event(batches)
+
+
+def process_pending_events(limit=None):
+    """
+    Drains up to `limit` pending `Batch_Event`s. Events belonging to the same batch are coalesced, and all batches
+    are fanned out in a single scheduling pass. Pending rows are locked with SKIP LOCKED, so several workers can
+    drain the queue concurrently without handling the same event twice.
+    :param limit: The maximum number of events to take, defaults to `settings.BATCH_EVENT_BATCH_SIZE`.
+    :return: The number of events that were taken from the queue.
+    """
+    if limit is None:
+        limit = int(settings.BATCH_EVENT_BATCH_SIZE)
+    max_tries = int(settings.BATCH_EVENT_MAX_TRIES)
+    with transaction.atomic():
+        events = list(
+            Batch_Event.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, tries__lt=max_tries)
+            .select_related('batch')
+            .order_by('created_at')[:limit]
+        )
+        if not events:
+            return 0
+
+        events_by_batch = {}
+        for event in events:
+            events_by_batch.setdefault(event.batch_id, []).append(event)
+        batches = [batch_events[0].batch for batch_events in events_by_batch.values()]
+        logging.info("Processing %s batch event(s) for %s batch(es)", len(events), len(batches))
+
+        job_manager = JobManager()
+        processed_ids = []
+        failed_ids = []
+        try:
+            with transaction.atomic():
+                job_manager.on_add_batches_event(batches)
+            processed_ids = [event.id for event in events]
+        except Exception as e:
+            # Fall back to one batch at a time, so a single bad batch does not hold back the rest of the queue
+            logging.warning("Bulk batch fan-out failed, retrying batches one by one", extra={"exception": e})
+            for batch in batches:
+                event_ids = [event.id for event in events_by_batch[batch.batch_id]]
+                try:
+                    with transaction.atomic():
+                        job_manager.on_add_batches_event([batch])
+                    processed_ids.extend(event_ids)
+                except Exception as e:
+                    logging.error("Failed to process batch event", extra={"batch_id": str(batch.batch_id), "exception": e})
+                    failed_ids.extend(event_ids)
+
+        now = dt.datetime.now().replace(tzinfo=dt.timezone.utc)
+        Batch_Event.objects.filter(id__in=processed_ids).update(processed_at=now, tries=F('tries') + 1)
+        Batch_Event.objects.filter(id__in=failed_ids).update(tries=F('tries') + 1)
+        # Events out of tries are no longer picked up, they wait in the table to be replayed by hand
+        abandoned = [event for event in events if event.id in set(failed_ids) and event.tries + 1 >= max_tries]
+        for event in abandoned:
+            logging.error("Giving up on batch event after %s tries", max_tries,
+                          extra={"batch_id": str(event.batch_id), "batch_event_id": event.id})
+        metrics.BATCH_EVENTS_ABANDONED.inc(len(abandoned))
+    return len(events)
@@ -1,12 +1,21 @@
 import datetime as dt
-import sys
+import functools
 import logging
+import threading
 import uuid
 import os
 from api.models import Job_Spec
+from api.models import Batch
 from api.models import Batch_Job
+from hydra.jobmanager import locks
+from hydra.jobmanager import metrics
+from hydra.jobmanager import policies
 from hydra.jobscheduler import jobscheduler
 from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, Count, DateTimeField, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from distutils import util
 
 class JobManager(object):
     _instance = None
@@ -27,12 +36,34 @@ class JobManager(object):
         # Note: data_type should be a static variable defined in each subclass instance of jobmanager
 
         self.max_active_jobs = int(settings.MAX_ACTIVE_K8S_JOBS)
-        self.active_jobs = 0
-        try:
-            self.job_scheduler = jobscheduler.JobScheduler()
-        except Exception as e:
-            logging.error("Failed to create jobscheduler, quitting JobManager", extra={"Exception": e})
-            sys.exit(1)
+        self.scheduling_policy = policies.get_policy()
+        self._job_scheduler = None
+        self._job_scheduler_lock = threading.Lock()
+
+    @property
+    def job_scheduler(self):
+        """
+        The job scheduler of `settings.K8S_JOB_SCHEDULER_BACKEND`, created on first use, so processes that never talk
+        to k8s (and tests) don't pay for setting up the k8s client. If it can not be created the error is raised to
+        the caller, and the next use tries again.
+        """
+        if self._job_scheduler is None:
+            with self._job_scheduler_lock:
+                if self._job_scheduler is None:
+                    try:
+                        self._job_scheduler = jobscheduler.get_job_scheduler()
+                    except Exception as e:
+                        logging.error("Failed to create jobscheduler", extra={"exception": str(e)})
+                        raise
+        return self._job_scheduler
+
+    @property
+    def active_jobs(self):
+        """
+        The number of jobs that take up a slot on the cluster. It is counted from the database, so it is the same for
+        all processes and survives restarts.
+        """
+        return Batch_Job.objects.filter(state__in=Batch_Job.IN_FLIGHT_STATES).count()
 
     def make_kubernetes_job_name(self, batch_job):
         """
@@ -48,15 +79,24 @@ class JobManager(object):
         :param batch_data: Should be an instance of `Batch`. Information about the current batch.
         :param parent_job: Should be an instance of `Job_Definition` or None. The parent job that has been completed, if any.
         """
+        self.on_add_batches_event([batch], parent_job=parent_job)
 
+    def on_add_batches_event(self, batches, parent_job=None):
+        """
+        Same as `on_add_batch_event`, but for several batches at once. The job specs are only looked up once, so a burst
+        of batches is handled in a single scheduling pass.
+        :param batches: Should be a list of `Batch` instances.
+        :param parent_job: Should be an instance of `Job_Definition` or None. The parent job that has been completed, if any.
+        """
 
         # Get all active job specs associated with this parent job
         job_specs = Job_Spec.objects.filter(active=True, job_definition__parent_job=parent_job).order_by(
             '-priority')  # TODO: Add other possible filters
 
         # Notify all observers (all jobs which are interested in this batch of data)
+        batches_added = False
         for j_spec in job_specs:
-            # Check for devices here 
+            # Check for devices here
             whitelisted_devices = j_spec.whitelisted_devices
             if whitelisted_devices is not None and len(whitelisted_devices) > 0:
                 try:
@@ -65,13 +105,17 @@ class JobManager(object):
                     logging.warning("INVALID DEVICES SPECIFIED, WHITELISTED DEVICES WILL BE IGNORED!!!", extra={'whitelisted_devices': whitelisted_devices})
             elif whitelisted_devices is None:
                 whitelisted_devices = []
-            device_id = batch.device_id
-            if (device_id and device_id in whitelisted_devices) or not device_id or len(whitelisted_devices) == 0:
-                # Only add batch to job and decide job if:
-                # There is a device and it is in the whitelisted devices, there is no device_id, or there are no whitelisted devices
-                batch_job_to_decide = self.add_batch_to_job(j_spec, batch)
-                # Decide whether or not to run the job
-                self.decide_job(batch_job_to_decide)
+            for batch in batches:
+                device_id = batch.device_id
+                if (device_id and device_id in whitelisted_devices) or not device_id or len(whitelisted_devices) == 0:
+                    # Only add batch to job and decide job if:
+                    # There is a device and it is in the whitelisted devices, there is no device_id, or there are no whitelisted devices
+                    self.add_batch_to_job(j_spec, batch)
+                    batches_added = True
+        # The scheduling policy picks which of the ready jobs get the free slots, in a single pass for all batches.
+        # Full jobs that are still waiting for a slot get their chance as well, not only the jobs these batches filled.
+        if batches_added:
+            self.schedule_pending()
 
     def on_save_batch_job_event(self, batch_job):
         """
@@ -79,37 +123,117 @@ class JobManager(object):
         a subclass.
         :param batch_job: The instance `Batch_Job` that was saved.
         """
-        if batch_job.finished and batch_job.succeeded:  # only want to do something if the batch job completed successfully
+        if batch_job.state == Batch_Job.SUCCEEDED:  # only want to do something if the batch job completed successfully
             for batch in batch_job.batches.all():
                 self.on_add_batch_event(batch,
                                         parent_job=batch_job.job_spec.job_definition)
 
     def add_batch_to_job(self, job_spec, batch):
         """
-        This method should be overridden in a subclass. In effect, will add a Batch to a kubernetes job.
-        """
-        curr_batch_job = None
-        # TODO: More data integrity checks to account for possible race conditions?
-        # Look at all unstarted jobs
-        for cand_batch_job in job_spec.batch_job_set.filter(scheduled=False):
-            # Make sure this job doesn't have too much data added to it already
-            # GI: Criteria based on number of batches
-            if cand_batch_job.batches.count() < job_spec.data_threshold:
-                curr_batch_job = cand_batch_job
-            else:  # If job already has enough data to be run, see if it should be run
-                self.decide_job(cand_batch_job)
-        if curr_batch_job is None:  # Didn't find a Batch_Job to add the batch to, so create a new one
-            curr_batch_job = Batch_Job.objects.create(job_spec=job_spec)
-        curr_batch_job.batches.add(batch)
-        curr_batch_job.save()
+        Adds a Batch to the oldest unscheduled `Batch_Job` of the job spec that still has room for it, or to a new
+        `Batch_Job` if there is none. The open job is found with a single query and its row is locked, so concurrent
+        workers can not overfill the same job.
+        :param job_spec: Should be an instance of `Job_Spec`.
+        :param batch: Should be an instance of `Batch`.
+        """
+        with transaction.atomic():
+            curr_batch_job = self._unscheduled_jobs(job_spec, full=False).first()
+            if curr_batch_job is None:  # Didn't find a Batch_Job to add the batch to, so create a new one
+                curr_batch_job = Batch_Job.objects.create(job_spec=job_spec)
+            curr_batch_job.batches.add(batch)
         return curr_batch_job
 
+    def _unscheduled_jobs(self, job_spec, full):
+        """
+        Returns the unscheduled jobs of a job spec which are full (or still have room when `full` is False), oldest
+        first. The rows are locked with SKIP LOCKED, so this should be evaluated inside a transaction.
+        """
+        candidates = job_spec.batch_job_set.select_for_update(skip_locked=True).filter(state=Batch_Job.QUEUED)
+        if full:
+            candidates = candidates.filter(batch_count__gte=job_spec.data_threshold)
+        else:
+            candidates = candidates.filter(batch_count__lt=job_spec.data_threshold)
+        return candidates.order_by('id')
+
+    def schedule_pending(self):
+        """
+        Starts ready, unscheduled jobs of the active job specs while there are free slots, in the order of the
+        scheduling policy (see `hydra.jobmanager.policies`). Jobs are ready when they are full, or when their first
+        batch has waited longer than the `max_wait` of their job spec. Called when batches filled up jobs, whenever a
+        job gives its slot back, and periodically by the `schedule_pending_jobs` command, so queued work does not wait
+        for the next batch of its job spec.
+        :return: The jobs that were scheduled.
+        """
+        if self.max_active_jobs - self.active_jobs <= 0:
+            return []
+        with transaction.atomic():
+            # Hold the admission lock while picking, so concurrent passes see each other's jobs in the usage
+            locks.advisory_xact_lock(locks.JOB_ADMISSION_LOCK)
+            free_slots = self.max_active_jobs - self.active_jobs
+            if free_slots <= 0:
+                return []
+            candidate_ids = self._candidate_ids(
+                Batch_Job.objects.filter(self._ready_jobs_filter(), state=Batch_Job.QUEUED, job_spec__active=True),
+                free_slots)
+            pending_jobs = self._with_region_namespace(
+                Batch_Job.objects.select_for_update(skip_locked=True, of=('self',)).select_related(
+                    'job_spec__job_definition').filter(id__in=candidate_ids)
+            ).order_by('id')
+            selected = self.scheduling_policy.select(list(pending_jobs), self.get_usage(), free_slots)
+            started = self.start_jobs(selected)
+        if started:
+            logging.info("Scheduled %s pending job(s)", len(started), extra={"batch_job_ids": [job.pk for job in started]})
+        return started
+
+    def _candidate_ids(self, ready_jobs, per_group):
+        """
+        Returns a queryset of the ids of the `per_group` oldest ready jobs of every job spec and region namespace, jobs
+        without a region form a group of their own. A policy orders
+        the jobs of such a group by age and can not start more than the free slots from it, so these are all the jobs
+        it could pick, however long the backlog of the other groups is.
+        """
+        ready_jobs = self._with_region_namespace(ready_jobs).annotate(
+            group_namespace=Coalesce(F('region_namespace'), Value('')))
+        oldest_of_group = ready_jobs.filter(
+            job_spec_id=OuterRef('job_spec_id'), group_namespace=OuterRef('group_namespace')
+        ).order_by('id').values('id')[:per_group]
+        return ready_jobs.filter(id__in=Subquery(oldest_of_group)).values_list('id', flat=True)
+
+    @staticmethod
+    def _ready_jobs_filter():
+        lingered_since = ExpressionWrapper(Value(dt.datetime.now().replace(tzinfo=dt.timezone.utc)) - F('job_spec__max_wait'),
+                                           output_field=DateTimeField())
+        return Q(batch_count__gte=F('job_spec__data_threshold')) | Q(
+            job_spec__max_wait__isnull=False, batch_count__gt=0, created_at__lte=lingered_since)
+
+    def get_usage(self):
+        """
+        Returns the `policies.Usage` of the jobs that take up a slot on the cluster.
+        """
+        in_flight_jobs = Batch_Job.objects.filter(state__in=Batch_Job.IN_FLIGHT_STATES)
+        by_job_spec = in_flight_jobs.values('job_spec_id').annotate(jobs=Count('id')).order_by()
+        by_namespace = self._with_region_namespace(in_flight_jobs).values('region_namespace').annotate(
+            jobs=Count('id')).order_by()
+        return policies.Usage({row['job_spec_id']: row['jobs'] for row in by_job_spec},
+                              {row['region_namespace']: row['jobs'] for row in by_namespace})
+
+    @staticmethod
+    def _with_region_namespace(batch_jobs):
+        # The batches of a job come from the same upload, so the region of any of them stands for the job
+        return batch_jobs.annotate(region_namespace=Subquery(
+            Batch.objects.filter(batch_job=OuterRef('pk')).values('region__namespace')[:1]))
+
     def decide_job(self, job_to_decide):
         """
-        This method should be overridden in a subclass - will determine whether or not to trigger a job.
+        This method should be overridden in a subclass - will determine whether or not a job is ready to be triggered.
+        The ready jobs are started by `schedule_pending`, when the scheduling policy gives them a slot.
+        :return: True if the job is ready.
         """
-        if self.active_jobs < self.max_active_jobs and job_to_decide.batches.count() >= job_to_decide.job_spec.data_threshold:
-            self.start_job(job_to_decide)
+        job_spec = job_to_decide.job_spec
+        if job_to_decide.batch_count >= job_spec.data_threshold:
+            return True
+        return job_spec.max_wait is not None and job_to_decide.created_at is not None and \
+            job_to_decide.created_at + job_spec.max_wait <= dt.datetime.now().replace(tzinfo=dt.timezone.utc)
 
     def start_job(self, batch_job):
         """
@@ -117,37 +241,159 @@ class JobManager(object):
         to the database.
         :param k_job: Should be an instance of `Kube_Job`, defines the job (or metadata about the job if you prefer) that will be started.
         """
-        batch_job.scheduled = True
-        batch_job.save()
-        self.active_jobs += 1
-        batch_ids = []
-        for batch in batch_job.batches.all():
-            batch_id = str(batch.batch_id)
-            logging.debug("Adding batch to batches:" + batch_id)
-            batch_ids.append(batch_id)
+        self.start_jobs([batch_job])
+
+    def start_jobs(self, batch_jobs):
+        """
+        Schedules as many of the given jobs as there are free slots on the cluster, in order, and creates them on k8s
+        once the surrounding transaction has committed.
+        :param batch_jobs: A list of `Batch_Job` instances.
+        :return: The jobs that were scheduled.
+        """
+        admitted = self.admit_jobs(batch_jobs)
+        for batch_job in admitted:
+            # The k8s job is only created once the job is committed as scheduled, so the watcher always finds it
+            transaction.on_commit(functools.partial(self.create_k8s_job, batch_job))
+        return admitted
+
+    def admit_jobs(self, batch_jobs):
+        """
+        Moves jobs to SCHEDULED while the number of in-flight jobs stays within `max_active_jobs`. All processes
+        admit jobs under the same advisory lock, so the cap holds across workers and restarts.
+        :param batch_jobs: A list of `Batch_Job` instances.
+        :return: The jobs that were moved to SCHEDULED.
+        """
+        admitted = []
+        if not batch_jobs:
+            return admitted
+        with transaction.atomic():
+            locks.advisory_xact_lock(locks.JOB_ADMISSION_LOCK)
+            free_slots = self.max_active_jobs - self.active_jobs
+            for batch_job in batch_jobs:
+                if len(admitted) >= free_slots:
+                    break
+                # Only one worker may schedule a job, the transition fails if it has been scheduled already
+                if self.transition(batch_job, Batch_Job.SCHEDULED):
+                    admitted.append(batch_job)
+        return admitted
+
+    def reconcile_active_jobs(self):
+        """
+        Brings the in-flight jobs in line with their k8s jobs, repairing the events the watcher missed. The k8s jobs
+        are listed once per namespace, so the cost grows with the number of in-flight jobs, not with the job history.
+        Jobs whose k8s job was created, started or finished are moved along in bulk. In-flight jobs without a k8s
+        job give their slot back: scheduled ones go back to the queue to be submitted again, created and running
+        ones can not be resumed and are failed. Missing jobs that changed state less than
+        `settings.K8S_SCHEDULED_GRACE_SECONDS` ago are left alone, their k8s job may still be on its way.
+        :return: A dict with the number of jobs that were moved to each state.
+        """
+        cutoff = dt.datetime.now().replace(tzinfo=dt.timezone.utc) - dt.timedelta(
+            seconds=int(settings.K8S_SCHEDULED_GRACE_SECONDS))
+        in_flight_jobs = Batch_Job.objects.select_related('job_spec__job_definition').filter(
+            state__in=Batch_Job.IN_FLIGHT_STATES)
+        k8s_jobs = {}
+        moves = {state: [] for state in (Batch_Job.QUEUED, Batch_Job.CREATED, Batch_Job.RUNNING, Batch_Job.SUCCEEDED, Batch_Job.FAILED)}
+        for batch_job in in_flight_jobs:
+            namespace = batch_job.job_spec.namespace
+            if namespace not in k8s_jobs:
+                k8s_jobs[namespace] = self.job_scheduler.kube_list_jobs(namespace)
+            k8s_job = k8s_jobs[namespace].get(self.make_kubernetes_job_name(batch_job))
+            status = k8s_job.status if k8s_job is not None else None
+            if getattr(status, 'succeeded', None) and not status.active:
+                moves[Batch_Job.SUCCEEDED].append(batch_job)
+            elif status is not None and self.has_k8s_job_failed(status):
+                batch_job.tries = status.failed or 0
+                moves[Batch_Job.FAILED].append(batch_job)
+            elif k8s_job is None or k8s_job.metadata.deletion_timestamp is not None:
+                if batch_job.state_changed_at is None or batch_job.state_changed_at < cutoff:
+                    moves[Batch_Job.QUEUED if batch_job.state == Batch_Job.SCHEDULED else Batch_Job.FAILED].append(batch_job)
+            elif getattr(status, 'active', None) and batch_job.state != Batch_Job.RUNNING:
+                batch_job.time_started = status.start_time or k8s_job.metadata.creation_timestamp
+                batch_job.tries = 0
+                moves[Batch_Job.RUNNING].append(batch_job)
+            elif batch_job.state == Batch_Job.SCHEDULED:
+                moves[Batch_Job.CREATED].append(batch_job)
+
+        fields = {Batch_Job.RUNNING: ['time_started', 'tries'], Batch_Job.FAILED: ['tries']}
+        moved = {state: self.transition_many(batch_jobs, state, fields.get(state, ())) for state, batch_jobs in moves.items()}
+        for batch_job in moved[Batch_Job.SUCCEEDED]:
+            if util.strtobool(str(settings.K8S_DELETE_SUCCEEDED_JOBS)):
+                self.job_scheduler.kube_delete_job(self.make_kubernetes_job_name(batch_job), batch_job.job_spec.namespace)
+        if moved[Batch_Job.QUEUED] or moved[Batch_Job.SUCCEEDED] or moved[Batch_Job.FAILED]:
+            self.schedule_pending()
+        counts = {state: len(batch_jobs) for state, batch_jobs in moved.items()}
+        logging.info("Reconciled active jobs with k8s", extra={"reconciled_batch_jobs": counts})
+        return counts
+
+    @staticmethod
+    def has_k8s_job_failed(status):
+        """
+        Returns whether k8s gave up on a job (backoff limit or deadline), or its pods failed more often than Hydra
+        allows, from the status of the k8s job.
+        """
+        for condition in status.conditions or []:
+            if condition.type == "Failed" and condition.status == "True":
+                return True
+        return (status.failed or 0) > Batch_Job.MAX_TRIES
+
+    def create_k8s_job(self, batch_job):
+        """
+        Creates the k8s job of a scheduled `Batch_Job`, in the background on the submission workers of the job scheduler.
+        :param batch_job: Should be an instance of `Batch_Job`.
+        """
+        batch_ids = [str(batch_id) for batch_id in batch_job.batches.values_list('batch_id', flat=True)]
         logging.debug("Starting Job with batches: " + str(batch_ids))
         # logging.info("{0}, {1}, {2}, {3}".format(self.make_kubernetes_job_name(batch_job), batch_job.job_spec.namespace, {'BATCH_IDS': ','.join(batch_ids)}, batch_job.job_spec.container_image))
         job_spec = batch_job.job_spec
         job_name = self.make_kubernetes_job_name(batch_job)
         k8s_labels = batch_job.job_spec.k8s_job_labels
         try:
-            self.job_scheduler.kube_create_job(job_name, job_spec.namespace, self.get_env_vars(batch_job, batch_ids),
-                                               job_spec.container_image, init_photo_container=job_spec.init_photo_container, labels=k8s_labels)
+            submission = self.job_scheduler.kube_submit_job(
+                job_name, job_spec.namespace, self.get_env_vars(batch_job, batch_ids), job_spec.container_image,
+                init_photo_container=job_spec.init_photo_container, labels=k8s_labels)
+            submission.add_done_callback(functools.partial(self._on_job_submitted, batch_job, job_name))
         except Exception as e:
+            # The job was never submitted, e.g. because the k8s client could not be set up, so it can be tried again
             logging.warning("Job {0} was unable to be created".format(
                 job_name), extra={'job_name': job_name, 'exception': e})
+            self.transition(batch_job, Batch_Job.QUEUED)
+
+    def _on_job_submitted(self, batch_job, job_name, submission):
+        """
+        Gives the slot of a `Batch_Job` back when k8s did not create its job. Jobs k8s may accept later on, after
+        server errors or lost connections, go back to the queue, jobs k8s refused fail.
+        """
+        error = submission.exception()
+        if error is None:
+            return
+        logging.warning("Job {0} was unable to be created".format(
+            job_name), extra={'job_name': job_name, 'exception': error})
+        try:
+            if getattr(error, 'retryable', True):
+                self.transition(batch_job, Batch_Job.QUEUED)
+            elif self.transition(batch_job, Batch_Job.FAILED):
+                self.schedule_pending()
+        finally:
+            # The submission workers are long-lived threads, so they have to drop broken or expired db connections
+            # themselves. A callback of a submission that was already done runs in the caller, whose transaction stays.
+            if not connection.in_atomic_block:
+                close_old_connections()
 
         # Defines the job to be done for the instance of the class
-    def on_job_failure(self, batch_job, job_tries):
+    def on_job_failure(self, batch_job, job_tries, terminal=False):
         """
         Defines the general behavior that should be done whenever a job fails. Basically, this is just adding the failure information to the database.
         :param k_job: Should be an instance of `Kube_Job`, defines the job (or metadata about the job if you prefer) that will be started.
         :param job_tries: A optional argument that specified the number of (re)tries for a specific k_job
+        :param terminal: Whether k8s gave up on the job, which then fails whatever the number of tries
         """
 
-        batch_job.tries = job_tries
-        self.active_jobs = max(self.active_jobs - 1, 0)
-        batch_job.save()
+        batch_job.tries = int(job_tries)
+        if terminal or batch_job.tries > Batch_Job.MAX_TRIES:
+            if self.transition(batch_job, Batch_Job.FAILED, ['tries']):
+                self.schedule_pending()
+        else:
+            self._save_batch_job(batch_job, ['tries'])
         job_name = self.make_kubernetes_job_name(batch_job)
         logging.debug("Job {0} was marked as failed".format(
             job_name), extra={'job_name': job_name})
@@ -157,31 +403,125 @@ class JobManager(object):
         Defines the general behavior that should be done whenever a job succeeds Basically, this is just adding the success information to the database.
         :param k_job: Should be an instance of `Kube_Job`, defines the job (or metadata about the job if you prefer) that will be started.
         """
-        batch_job.finished = True
-        batch_job.succeeded = True
-        self.active_jobs = max(self.active_jobs - 1, 0)
-        batch_job.save()
+        if self.transition(batch_job, Batch_Job.SUCCEEDED):
+            self.schedule_pending()
 
     def on_job_created(self, batch_job):
         """
         Defines the general behavior that should be done whenever a job is created as a k8s object, but not yet running a pod.
         :param k_job: Should be an instance of `Kube_Job`, defines the job (or metadata about the job if you prefer) that will be started.
         """
-        batch_job.started = False
-        batch_job.created_on_k8s = True
-        batch_job.save()
+        self.transition(batch_job, Batch_Job.CREATED)
 
     def on_job_started(self, batch_job, start_time):
         """
         Defines the general behavior that should be done whenever a job is created as a k8s object AND have a running k8s pod.
         :param k_job: Should be an instance of `Kube_Job`, defines the job (or metadata about the job if you prefer) that will be started.
         """
-        batch_job.started = True
-        batch_job.succeeded = False
-        batch_job.finished = False
         batch_job.time_started = start_time
         batch_job.tries = 0
-        batch_job.save()
+        self.transition(batch_job, Batch_Job.RUNNING, ['time_started', 'tries'])
+
+    def transition(self, batch_job, state, fields=()):
+        """
+        Moves a `Batch_Job` to `state` and saves it together with `fields`. The move is only done if it is allowed by
+        `Batch_Job.TRANSITIONS` and the job is still in the state it was loaded in, so a stale or repeated k8s event
+        can not move a job backwards.
+        :param batch_job: Should be an instance of `Batch_Job`.
+        :param state: One of the `Batch_Job` states.
+        :param fields: Other fields of `batch_job` that should be saved with the new state.
+        :return: True if the job is now in `state`, False if the transition was refused.
+        """
+        current_state = batch_job.state
+        current_state_changed_at = batch_job.state_changed_at
+        if not batch_job.can_transition_to(state):
+            logging.warning("Refused to move Batch_Job %s from '%s' to '%s'", batch_job.pk, current_state, state,
+                            extra={"batch_job_id": batch_job.pk, "state": current_state, "new_state": state})
+            return False
+        if state != current_state:
+            batch_job.state = state
+            batch_job.state_changed_at = dt.datetime.now().replace(tzinfo=dt.timezone.utc)
+        if batch_job.pk is None:
+            batch_job.save()
+        else:
+            changes = {field: getattr(batch_job, field) for field in ['state', 'state_changed_at', *fields]}
+            if not Batch_Job.objects.filter(pk=batch_job.pk, state=current_state).update(**changes):
+                # Somebody else moved the job in the meantime
+                batch_job.refresh_from_db(fields=['state', 'state_changed_at', *fields])
+                logging.info("Batch_Job %s was moved to '%s' concurrently", batch_job.pk, batch_job.state,
+                             extra={"batch_job_id": batch_job.pk, "state": batch_job.state, "new_state": state})
+                return False
+        if state != current_state:
+            self._observe_transition(batch_job, current_state, current_state_changed_at)
+        return True
+
+    def transition_many(self, batch_jobs, state, fields=()):
+        """
+        Moves several `Batch_Job`s to `state` like `transition`, with one locking select and one update per state
+        the jobs are in. Jobs that can not move to `state`, or were moved by somebody else in the meantime, are left
+        alone.
+        :param batch_jobs: A list of `Batch_Job` instances.
+        :param state: One of the `Batch_Job` states.
+        :param fields: Other fields of the jobs that should be saved with the new state, each job keeps its own value.
+        :return: The jobs that were moved.
+        """
+        jobs_by_state = {}
+        for batch_job in batch_jobs:
+            if batch_job.state != state and batch_job.can_transition_to(state):
+                jobs_by_state.setdefault(batch_job.state, {})[batch_job.pk] = batch_job
+            elif batch_job.state != state:
+                logging.warning("Refused to move Batch_Job %s from '%s' to '%s'", batch_job.pk, batch_job.state, state,
+                                extra={"batch_job_id": batch_job.pk, "state": batch_job.state, "new_state": state})
+        moved = []
+        if not jobs_by_state:
+            return moved
+        now = dt.datetime.now().replace(tzinfo=dt.timezone.utc)
+        with transaction.atomic():
+            for current_state, jobs in jobs_by_state.items():
+                ids = list(Batch_Job.objects.select_for_update().filter(
+                    pk__in=list(jobs), state=current_state).values_list('pk', flat=True))
+                if not ids:
+                    continue
+                changes = {'state': state, 'state_changed_at': now}
+                for field in fields:
+                    changes[field] = Case(*[When(pk=pk, then=Value(getattr(jobs[pk], field))) for pk in ids],
+                                          output_field=Batch_Job._meta.get_field(field))
+                Batch_Job.objects.filter(pk__in=ids).update(**changes)
+                for pk in ids:
+                    batch_job = jobs[pk]
+                    previous_state_changed_at = batch_job.state_changed_at
+                    batch_job.state = state
+                    batch_job.state_changed_at = now
+                    self._observe_transition(batch_job, current_state, previous_state_changed_at)
+                    moved.append(batch_job)
+        return moved
+
+    def _observe_transition(self, batch_job, previous_state, previous_state_changed_at):
+        """
+        Updates the in-process job metrics after `batch_job` moved out of `previous_state`.
+        """
+        job_definition = batch_job.job_spec.job_definition.name
+        now = batch_job.state_changed_at
+        if batch_job.state == Batch_Job.CREATED:
+            metrics.JOBS_CREATED.labels(job_definition=job_definition).inc()
+        elif batch_job.state == Batch_Job.RUNNING:
+            metrics.JOBS_STARTED.labels(job_definition=job_definition).inc()
+            metrics.observe_seconds(metrics.JOB_QUEUE_WAIT, job_definition, batch_job.created_at, now)
+        elif batch_job.state in (Batch_Job.SUCCEEDED, Batch_Job.FAILED):
+            counter = metrics.JOBS_SUCCEEDED if batch_job.state == Batch_Job.SUCCEEDED else metrics.JOBS_FAILED
+            counter.labels(job_definition=job_definition).inc()
+            if previous_state == Batch_Job.RUNNING:
+                metrics.observe_seconds(metrics.JOB_RUN_TIME, job_definition, previous_state_changed_at, now)
+
+    def _save_batch_job(self, batch_job, fields):
+        """
+        Saves only the given fields of a `Batch_Job`, so that concurrent updates of other columns (such as
+        `batch_count`) are not overwritten. A job that was never saved is inserted as a whole.
+        """
+        if batch_job.pk is None:
+            batch_job.save()
+        else:
+            batch_job.save(update_fields=fields)
 
     def get_env_vars(self, batch_job, batch_ids):
         environment_variables = batch_job.job_spec.environment_variables
@@ -0,0 +1,76 @@
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+# Keys of the Postgres advisory locks taken by Hydra, they only have to be unique within the database
+JOB_ADMISSION_LOCK = 0x48594401
+CONTROLLER_LOCK = 0x48594402
+
+
+def advisory_xact_lock(key):
+    """
+    Takes a transaction-level advisory lock, which is held until the surrounding transaction commits or rolls back,
+    so this must be called inside `transaction.atomic()`. Other databases (sqlite in the tests) only allow a single
+    writer at a time, so there is nothing to lock there.
+    :param key: One of the lock keys of this module.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+class LeaderLock(object):
+    """
+    A session-level advisory lock, for electing the one process that runs a singleton task. The lock is held on a
+    database connection of its own, so closing the regular (per-thread) connections does not give it up, and it is
+    released by Postgres when the process dies. Other databases have no such locks, every process leads there.
+    """
+
+    def __init__(self, key, using=DEFAULT_DB_ALIAS):
+        self.key = key
+        self.using = using
+        self._connection = None
+
+    def acquire(self):
+        """
+        Tries to take the lock without waiting.
+        :return: True if this process holds the lock now.
+        """
+        if self._connection is not None:
+            return self.is_held()
+        db_connection = connections.create_connection(self.using)
+        if db_connection.vendor != 'postgresql':
+            self._connection = db_connection
+            return True
+        with db_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [self.key])
+            acquired = cursor.fetchone()[0]
+        if acquired:
+            self._connection = db_connection
+        else:
+            db_connection.close()
+        return acquired
+
+    def is_held(self):
+        """
+        Returns whether the lock is still held, i.e. the connection that holds it is still alive.
+        """
+        if self._connection is None:
+            return False
+        if self._connection.vendor != 'postgresql':
+            return True
+        try:
+            with self._connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
@@ -0,0 +1,159 @@
+import os
+
+from django.db.models import Count, Q
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+                               start_http_server)
+
+from api.models import Batch, Batch_Job
+
+# Queue waits and run times range from seconds (small jobs on an idle cluster) to hours
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400)
+
+BATCHES_INGESTED = Counter(
+    "hydra_batches_ingested",
+    "Batches created by this process, updates and re-submits of existing batches are not counted.",
+)
+BATCH_EVENTS_ABANDONED = Counter(
+    "hydra_batch_events_abandoned",
+    "Batch events given up on after BATCH_EVENT_MAX_TRIES failed tries, their batches were never fanned out.",
+)
+JOBS_CREATED = Counter(
+    "hydra_jobs_created",
+    "Batch jobs created on k8s.",
+    ["job_definition"],
+)
+JOBS_STARTED = Counter(
+    "hydra_jobs_started",
+    "Batch jobs which started running on k8s.",
+    ["job_definition"],
+)
+JOBS_FAILED = Counter(
+    "hydra_jobs_failed",
+    "Batch jobs which failed more than Batch_Job.MAX_TRIES times.",
+    ["job_definition"],
+)
+JOBS_SUCCEEDED = Counter(
+    "hydra_jobs_succeeded",
+    "Batch jobs which completed successfully.",
+    ["job_definition"],
+)
+JOB_QUEUE_WAIT = Histogram(
+    "hydra_job_queue_wait_seconds",
+    "Time from the creation of a batch job until it is running on k8s.",
+    ["job_definition"],
+    buckets=DURATION_BUCKETS,
+)
+JOB_RUN_TIME = Histogram(
+    "hydra_job_run_seconds",
+    "Time from a batch job starting to run until it succeeded or failed.",
+    ["job_definition"],
+    buckets=DURATION_BUCKETS,
+)
+WATCH_EVENTS = Counter(
+    "hydra_k8s_watch_events",
+    "Events received from the k8s watch streams, per kind of object.",
+    ["resource", "type"],
+)
+WATCH_RESTARTS = Counter(
+    "hydra_k8s_watch_restarts",
+    "Times a k8s watch stream ended and was restarted, per kind of object.",
+    ["resource"],
+)
+
+# The totals stored in the database. The Hydra controller refreshes them with `update_database_totals` and exports
+# them with `serve`, so scrapes never query the database and the other processes do not export stale zeros.
+DATABASE_TOTALS = CollectorRegistry(auto_describe=True)
+BATCHES_TOTAL = Gauge(
+    "hydra_batches_total",
+    "Total batches registered in Hydra.",
+    registry=DATABASE_TOTALS,
+)
+BATCH_JOBS_TOTAL = Gauge(
+    "hydra_batch_jobs_total",
+    "Total batch jobs registered in Hydra.",
+    registry=DATABASE_TOTALS,
+)
+BATCH_JOBS_FAILED_TOTAL = Gauge(
+    "hydra_batch_jobs_failed_total",
+    "Total failed batch jobs registered in Hydra.",
+    registry=DATABASE_TOTALS,
+)
+BATCH_JOBS_RUNNING = Gauge(
+    "hydra_batch_jobs_running",
+    "Current running batch jobs registered in Hydra.",
+    registry=DATABASE_TOTALS,
+)
+BATCH_JOBS_SUCCEEDED_TOTAL = Gauge(
+    "hydra_batch_jobs_succeeded_total",
+    "Total succeeded batch jobs per job definition.",
+    ["job_definition"],
+    registry=DATABASE_TOTALS,
+)
+
+
+def update_database_totals():
+    """
+    Sets the gauges of the totals stored in the database. All batch job totals come from a single conditional
+    aggregation grouped by job definition.
+    """
+    jobs_by_definition = (
+        Batch_Job.objects.values('job_spec__job_definition__name')
+        .annotate(
+            total=Count('id'),
+            failed=Count('id', filter=Q(state=Batch_Job.FAILED)),
+            running=Count('id', filter=Q(state=Batch_Job.RUNNING)),
+            succeeded=Count('id', filter=Q(state=Batch_Job.SUCCEEDED)),
+        )
+        .order_by('job_spec__job_definition__name')
+    )
+    rows = list(jobs_by_definition)
+    BATCHES_TOTAL.set(Batch.objects.count())
+    BATCH_JOBS_TOTAL.set(sum(row['total'] for row in rows))
+    BATCH_JOBS_FAILED_TOTAL.set(sum(row['failed'] for row in rows))
+    BATCH_JOBS_RUNNING.set(sum(row['running'] for row in rows))
+    for row in rows:
+        BATCH_JOBS_SUCCEEDED_TOTAL.labels(job_definition=row['job_spec__job_definition__name']).set(row['succeeded'])
+
+
+def render():
+    """
+    Renders all metrics in the Prometheus text format. When `PROMETHEUS_MULTIPROC_DIR` is set (e.g. under gunicorn
+    with several workers) the in-process metrics of all processes are merged.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+class _Registries(object):
+    """
+    Collects the metrics of several registries, for a single HTTP server.
+    """
+
+    def __init__(self, *registries):
+        self.registries = registries
+
+    def collect(self):
+        for registry in self.registries:
+            yield from registry.collect()
+
+
+def serve(port, database_totals=False):
+    """
+    Serves the in-process metrics on `port`, for the worker processes that are not behind the /api/metrics/ endpoint.
+    :param database_totals: Whether to also export the totals stored in the database, set by the process that
+    refreshes them.
+    """
+    registry = _Registries(REGISTRY, DATABASE_TOTALS) if database_totals else REGISTRY
+    start_http_server(port, registry=registry)
+
+
+def observe_seconds(histogram, job_definition, start, end):
+    """
+    Records the time between two datetimes, if both are known.
+    """
+    if start is not None and end is not None:
+        histogram.labels(job_definition=job_definition).observe(max((end - start).total_seconds(), 0))
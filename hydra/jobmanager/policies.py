@@ -0,0 +1,109 @@
+import logging
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Usage(object):
+    """
+    The number of active jobs per job spec (by id) and per region namespace, as seen by a scheduling policy.
+    """
+
+    def __init__(self, by_job_spec=None, by_namespace=None):
+        self.by_job_spec = dict(by_job_spec or {})
+        self.by_namespace = dict(by_namespace or {})
+
+    def job_spec(self, job_spec):
+        return self.by_job_spec.get(job_spec.id, 0)
+
+    def namespace(self, namespace):
+        return self.by_namespace.get(namespace, 0)
+
+    def add(self, batch_job, count=1):
+        self.by_job_spec[batch_job.job_spec.id] = self.job_spec(batch_job.job_spec) + count
+        namespace = getattr(batch_job, 'region_namespace', None)
+        self.by_namespace[namespace] = self.namespace(namespace) + count
+
+
+class SchedulingPolicy(ABC):
+    """
+    Decides which pending jobs get the free slots of the cluster. Subclasses define the order with `sort_key`, the
+    per-spec concurrency caps (`Job_Spec.max_active_jobs`) are applied by every policy.
+    """
+    name = None
+
+    def select(self, candidates, usage, free_slots):
+        """
+        Picks the jobs to start, one slot at a time, so the order can depend on the jobs picked before.
+        :param candidates: The pending `Batch_Job`s, oldest first, with their `job_spec` loaded and the namespace of
+            their region in `region_namespace`.
+        :param usage: The `Usage` of the active jobs, it is updated with the picked jobs.
+        :param free_slots: The number of jobs that can be started.
+        :return: The picked jobs, in the order they should be started.
+        """
+        remaining = list(enumerate(candidates))
+        selected = []
+        while len(selected) < free_slots:
+            eligible = [(age, job) for age, job in remaining if self.has_room(job, usage)]
+            if not eligible:
+                break
+            age, job = min(eligible, key=lambda candidate: (self.sort_key(candidate[1], usage), candidate[0]))
+            remaining.remove((age, job))
+            usage.add(job)
+            selected.append(job)
+        return selected
+
+    def has_room(self, batch_job, usage):
+        max_active_jobs = batch_job.job_spec.max_active_jobs
+        return max_active_jobs is None or usage.job_spec(batch_job.job_spec) < max_active_jobs
+
+    @abstractmethod
+    def sort_key(self, batch_job, usage):
+        """
+        Returns the key jobs are picked by, lowest first, ties go to the oldest job. It may only depend on the job spec
+        and region namespace of the job and on the usage, as the `JobManager` only passes the oldest jobs of every job
+        spec and namespace as candidates.
+        """
+
+
+class StrictPriorityPolicy(SchedulingPolicy):
+    """
+    Starts the jobs of the job specs with the highest `priority` first, oldest first within a priority.
+    """
+    name = 'strict_priority'
+
+    def sort_key(self, batch_job, usage):
+        return -batch_job.job_spec.priority
+
+
+class WeightedFairPolicy(SchedulingPolicy):
+    """
+    Shares the slots between regions first, every region namespace gets an equal share so a busy region can not
+    hold back the jobs of a small one. Within a region the slots are shared between the job specs in proportion to
+    their `weight`, and ties go to the highest priority and then the oldest job.
+    """
+    name = 'weighted_fair'
+
+    def sort_key(self, batch_job, usage):
+        job_spec = batch_job.job_spec
+        spec_share = usage.job_spec(job_spec) / job_spec.weight if job_spec.weight else float('inf')
+        return usage.namespace(getattr(batch_job, 'region_namespace', None)), spec_share, -job_spec.priority
+
+
+POLICIES = {policy.name: policy for policy in (StrictPriorityPolicy, WeightedFairPolicy)}
+
+
+def get_policy(name=None):
+    """
+    Returns an instance of the scheduling policy called `name`, `settings.JOB_SCHEDULING_POLICY` by default. Besides
+    the names in `POLICIES`, the dotted path of a `SchedulingPolicy` subclass can be given.
+    """
+    name = name or settings.JOB_SCHEDULING_POLICY
+    if name in POLICIES:
+        return POLICIES[name]()
+    try:
+        return import_string(name)()
+    except ImportError as e:
+        logging.error("Unknown scheduling policy '%s'", name, extra={"exception": str(e)})
+        raise ValueError("Unknown scheduling policy '{0}'".format(name))
@@ -1,24 +1,49 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save
 import logging
-from api.models import Batch
-from hydra.jobmanager.jobmanager import JobManager
+from api.models import Batch, Batch_Job
+from hydra.jobmanager import batchevents, metrics
 import os
 
 
 
 @receiver(post_save, sender=Batch)
-def on_callback_from_batch(instance, *args, **kwargs):
+def on_callback_from_batch(instance, created=False, *args, **kwargs):
     """
         Based on Django Signals. This method will be called every time a new `Batch_Photo` is saved to the database
         :param instance: The actual instance that have been saved to the database
+        :param created: Whether the batch was inserted, and not updated
     """
     logging.debug("Signal received, a batch was saved")
     batch_obj = instance
     batch_id = batch_obj.batch_id
     logging.info("Hydra received batch with id: %s . Starting to process", str(batch_id))
-    job_manager = JobManager()
-    job_manager.on_add_batch_event(batch=batch_obj)
+    if created:
+        metrics.BATCHES_INGESTED.inc()
+    batchevents.submit_batches([batch_obj])
+
+
+@receiver(m2m_changed, sender=Batch_Job.batches.through)
+def on_batch_job_batches_changed(instance, action, reverse, pk_set, **kwargs):
+    """
+        Keeps the denormalized `Batch_Job.batch_count` in line with `Batch_Job.batches`. Django only passes the ids that
+        were really added or removed in `pk_set`, so adding a batch twice does not count it twice.
+        :param instance: The `Batch_Job` (or the `Batch` when the relation is changed from the reverse side)
+    """
+    if action in ("post_add", "post_remove") and pk_set:
+        step = 1 if action == "post_add" else -1
+        if reverse:
+            # batch.batch_job_set.add(...): every job in pk_set gained (or lost) this one batch
+            Batch_Job.objects.filter(pk__in=pk_set).update(batch_count=F('batch_count') + step)
+        else:
+            Batch_Job.objects.filter(pk=instance.pk).update(batch_count=F('batch_count') + step * len(pk_set))
+            instance.batch_count += step * len(pk_set)
+    elif action == "pre_clear" and reverse:
+        instance.batch_job_set.update(batch_count=F('batch_count') - 1)
+    elif action == "post_clear" and not reverse:
+        Batch_Job.objects.filter(pk=instance.pk).update(batch_count=0)
+        instance.batch_count = 0
 
 
 
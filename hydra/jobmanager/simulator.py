@@ -0,0 +1,111 @@
+import heapq
+import math
+import random
+
+from api.models import Batch_Job, Job_Spec
+from hydra.jobmanager import policies
+
+# A busy region next to two small ones, with a heavy and a light job spec
+DEFAULT_WORKLOAD = {
+    "slots": 10,
+    "duration": 3600,
+    "job_specs": [
+        {"name": "process-imu", "priority": 1, "weight": 3, "max_active_jobs": None},
+        {"name": "process-photos", "priority": 0, "weight": 1, "max_active_jobs": 6},
+    ],
+    "arrivals": [
+        {"job_spec": "process-imu", "namespace": "london", "rate": 0.08, "runtime": 60},
+        {"job_spec": "process-photos", "namespace": "london", "rate": 0.05, "runtime": 120},
+        {"job_spec": "process-imu", "namespace": "cardiff", "rate": 0.005, "runtime": 60},
+        {"job_spec": "process-photos", "namespace": "bristol", "rate": 0.005, "runtime": 120},
+    ],
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1)]
+
+
+def simulate(policy, workload=None, seed=0):
+    """
+    Replays a synthetic workload against a scheduling policy. Jobs of each arrival stream arrive as a Poisson process
+    with `rate` jobs per second and run for an exponentially distributed time with mean `runtime` seconds. The policy
+    is asked for jobs whenever a job arrives or finishes and there are free slots.
+    :param policy: A `policies.SchedulingPolicy` instance.
+    :param workload: A dict like `DEFAULT_WORKLOAD`.
+    :param seed: Seed of the random arrivals and runtimes, the same seed gives every policy the same jobs.
+    :return: A dict with the number of jobs that arrived and finished, the busy fraction of the slots, and the wait
+        times (mean, p50, p95 and max in seconds) overall, per namespace and per job spec.
+    """
+    workload = workload or DEFAULT_WORKLOAD
+    rng = random.Random(seed)
+    slots = int(workload["slots"])
+    duration = float(workload["duration"])
+    job_specs = {}
+    for spec_id, spec in enumerate(workload["job_specs"], start=1):
+        job_specs[spec["name"]] = Job_Spec(id=spec_id, priority=spec.get("priority", 0), weight=spec.get("weight", 1),
+                                           max_active_jobs=spec.get("max_active_jobs"))
+
+    # (time, order, kind, payload) events, the order keeps the heap stable for events at the same time
+    events = []
+    jobs = []
+    for stream in workload["arrivals"]:
+        now = rng.expovariate(stream["rate"])
+        while now < duration:
+            batch_job = Batch_Job(id=len(jobs) + 1, job_spec=job_specs[stream["job_spec"]])
+            batch_job.region_namespace = stream["namespace"]
+            batch_job.arrived_at = now
+            batch_job.runtime = rng.expovariate(1.0 / stream["runtime"])
+            batch_job.started_at = None
+            jobs.append(batch_job)
+            now += rng.expovariate(stream["rate"])
+    for batch_job in jobs:
+        heapq.heappush(events, (batch_job.arrived_at, batch_job.id, "arrival", batch_job))
+
+    pending = []
+    usage = policies.Usage()
+    running = 0
+    busy_time = 0.0
+    last_time = 0.0
+    finished = 0
+    while events:
+        now, _, kind, batch_job = heapq.heappop(events)
+        busy_time += running * (now - last_time)
+        last_time = now
+        if kind == "arrival":
+            pending.append(batch_job)
+        else:
+            running -= 1
+            finished += 1
+            usage.add(batch_job, count=-1)
+        if running < slots and pending:
+            # Pending jobs are kept oldest first, like the candidates the JobManager passes to the policy
+            for started in policy.select(pending, usage, slots - running):
+                pending.remove(started)
+                running += 1
+                started.started_at = now
+                heapq.heappush(events, (now + started.runtime, started.id, "finish", started))
+
+    def waits(selected_jobs):
+        times = [job.started_at - job.arrived_at for job in selected_jobs if job.started_at is not None]
+        return {
+            "jobs": len(times),
+            "mean": sum(times) / len(times) if times else None,
+            "p50": percentile(times, 0.5),
+            "p95": percentile(times, 0.95),
+            "max": max(times) if times else None,
+        }
+
+    namespaces = sorted({job.region_namespace for job in jobs})
+    return {
+        "policy": policy.name,
+        "arrived": len(jobs),
+        "finished": finished,
+        "utilization": busy_time / (last_time * slots) if last_time else 0.0,
+        "wait": waits(jobs),
+        "wait_by_namespace": {ns: waits([job for job in jobs if job.region_namespace == ns]) for ns in namespaces},
+        "wait_by_job_spec": {name: waits([job for job in jobs if job.job_spec is spec]) for name, spec in job_specs.items()},
+    }
@@ -242,7 +242,7 @@ class JobManagerIntegrationTestCases(TestCase):
                 )
                 self.assertTrue(Batch_Job.objects.filter(job_spec__data_threshold=3).exists())
                 self.assertTrue(Batch_Job.objects.filter(job_spec__data_threshold=3).count(), 2)
-                self.assertEqual(Batch_Job.objects.filter(job_spec__data_threshold=3, scheduled=True).count(), 1)
+                self.assertEqual(Batch_Job.objects.filter(job_spec__data_threshold=3).exclude(state=Batch_Job.QUEUED).count(), 1)
 
                 self.assertTrue(Batch_Job.objects.filter(job_spec__data_threshold=4).exists())
                 self.assertTrue(Batch_Job.objects.filter(job_spec__data_threshold=4).first().scheduled)
@@ -274,8 +274,8 @@ class JobManagerIntegrationTestCases(TestCase):
                 region=self.region
             )
 
-            num_scheduled = Batch_Job.objects.filter(scheduled=True).count()
-            num_not_started = Batch_Job.objects.filter(started=False).count()
+            num_scheduled = Batch_Job.objects.exclude(state=Batch_Job.QUEUED).count()
+            num_not_started = Batch_Job.objects.filter(state__in=[Batch_Job.QUEUED, Batch_Job.SCHEDULED, Batch_Job.CREATED]).count()
             self.assertEqual(num_scheduled, 2)
             self.assertEqual(num_not_started, 3)
             #batch_jobs = Batch_Job.objects.count()
@@ -290,8 +290,8 @@ class JobManagerIntegrationTestCases(TestCase):
                 region=self.region
             )
 
-            num_scheduled = Batch_Job.objects.filter(scheduled=True).count()
-            num_not_started = Batch_Job.objects.filter(started=False).count()
+            num_scheduled = Batch_Job.objects.exclude(state=Batch_Job.QUEUED).count()
+            num_not_started = Batch_Job.objects.filter(state__in=[Batch_Job.QUEUED, Batch_Job.SCHEDULED, Batch_Job.CREATED]).count()
             self.assertEqual(num_scheduled, 3)
             self.assertEqual(num_not_started, 4)
 
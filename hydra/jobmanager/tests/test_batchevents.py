@@ -0,0 +1,81 @@
+import uuid
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from api.models import Batch, Batch_Event, Region
+from hydra.jobmanager import batchevents
+
+
+def ingested_batches():
+    return REGISTRY.get_sample_value("hydra_batches_ingested_total")
+
+
+def abandoned_events():
+    return REGISTRY.get_sample_value("hydra_batch_events_abandoned_total")
+
+
+@patch('hydra.jobmanager.batchevents.JobManager')
+class TestBatchEvents(TestCase):
+
+    @patch('api.models.models.base.post_save')
+    def setUp(self, post_save_mock):
+        self.region = Region.objects.create(code='EU.CARDIFF', description='CARDIFF', namespace='county')
+        self.batch1 = Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+        self.batch2 = Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+
+    def test_submit_batches_queues_events(self, job_manager_mock):
+        with self.settings(BATCH_EVENT_QUEUE=True):
+            batchevents.submit_batches([self.batch1, self.batch2])
+        self.assertEqual(Batch_Event.objects.filter(processed_at__isnull=True).count(), 2)
+        job_manager_mock.assert_not_called()
+
+    def test_submit_batches_without_queue(self, job_manager_mock):
+        with self.settings(BATCH_EVENT_QUEUE=False):
+            batchevents.submit_batches([self.batch1])
+        self.assertEqual(Batch_Event.objects.count(), 0)
+        job_manager_mock.return_value.on_add_batches_event.assert_called_once_with([self.batch1])
+
+    def test_batch_is_saved_with_its_event(self, job_manager_mock):
+        with self.settings(BATCH_EVENT_QUEUE=True):
+            with patch.object(Batch_Event.objects, 'bulk_create', side_effect=DatabaseError("connection lost")):
+                with self.assertRaises(DatabaseError):
+                    Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+            self.assertEqual(Batch.objects.count(), 2)
+            Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+        self.assertEqual(Batch.objects.count(), 3)
+        self.assertEqual(Batch_Event.objects.count(), 1)
+
+    def test_only_created_batches_are_counted(self, job_manager_mock):
+        ingested_before = ingested_batches()
+        with self.settings(BATCH_EVENT_QUEUE=True):
+            Batch.objects.create(batch_id=uuid.uuid4(), region=self.region)
+            self.batch1.save()
+        self.assertEqual(ingested_batches(), ingested_before + 1)
+        self.assertEqual(Batch_Event.objects.count(), 2)
+
+    def test_process_pending_events_coalesces_batches(self, job_manager_mock):
+        for batch in [self.batch1, self.batch2, self.batch1]:
+            Batch_Event.objects.create(batch=batch)
+        self.assertEqual(batchevents.process_pending_events(limit=10), 3)
+        job_manager_mock.return_value.on_add_batches_event.assert_called_once_with([self.batch1, self.batch2])
+        self.assertEqual(Batch_Event.objects.filter(processed_at__isnull=True).count(), 0)
+        self.assertEqual(batchevents.process_pending_events(limit=10), 0)
+
+    def test_process_pending_events_failure_is_retried(self, job_manager_mock):
+        Batch_Event.objects.create(batch=self.batch1)
+        job_manager_mock.return_value.on_add_batches_event.side_effect = Exception("k8s is down")
+        abandoned_before = abandoned_events()
+        with self.settings(BATCH_EVENT_MAX_TRIES=2):
+            batchevents.process_pending_events(limit=10)
+            event = Batch_Event.objects.get()
+            self.assertIsNone(event.processed_at)
+            self.assertEqual(event.tries, 1)
+            self.assertEqual(abandoned_events(), abandoned_before)
+            batchevents.process_pending_events(limit=10)
+            self.assertEqual(batchevents.process_pending_events(limit=10), 0)
+        self.assertEqual(abandoned_events(), abandoned_before + 1)
+        event.refresh_from_db()
+        self.assertEqual(event.tries, 2)
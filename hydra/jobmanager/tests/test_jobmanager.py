@@ -5,11 +5,19 @@ from unittest.mock import patch
 from django.test import TestCase
 from django.conf import settings
 from unittest.mock import patch
+from concurrent.futures import Future
 import os
+from hydra.jobmanager import metrics
+from hydra.jobmanager import policies
 from hydra.jobmanager.jobmanager import JobManager
+from hydra.jobscheduler.jobscheduler import JobCreationError
 from api.models import Batch_Job
 from api.models import Job_Spec
 from api.models import Job_Definition
+from api.models import Batch
+from api.models import Region
+import uuid
+from kubernetes.client import V1Job, V1JobCondition, V1JobStatus, V1ObjectMeta
 
 
 @patch('hydra.jobmanager.jobmanager.jobscheduler')
@@ -51,7 +59,7 @@ class TestJobManager(TestCase):
 
 
     def test_on_job_success(self, patch_mock_js):
-        b_job = Batch_Job(job_spec=self.imu_job_spec1)
+        b_job = Batch_Job(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
         self.assertFalse(b_job.succeeded)
         self.assertFalse(b_job.finished)
         self.j_manager.on_job_success(b_job)
@@ -60,7 +68,7 @@ class TestJobManager(TestCase):
         self.assertTrue(b_job.finished)
 
     def test_on_job_started(self, patch_mock_js):
-        b_job = Batch_Job(job_spec=self.imu_job_spec1)
+        b_job = Batch_Job(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
         self.assertFalse(b_job.started)
         start_time = dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
         self.j_manager.on_job_started(b_job, start_time)
@@ -71,7 +79,7 @@ class TestJobManager(TestCase):
         self.assertEqual(b_job.tries, 0)
 
     def test_on_job_created(self, patch_mock_js):
-        b_job = Batch_Job(job_spec=self.imu_job_spec1)
+        b_job = Batch_Job(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
         self.assertFalse(b_job.started)
         self.assertFalse(b_job.created_on_k8s)
         self.j_manager.on_job_created(b_job)
@@ -108,4 +116,253 @@ class TestJobManager(TestCase):
         # to create a new JobManager instance for every test
         JobManager._instance = None
         self.j_manager = JobManager()
-        self.assertEqual(self.j_manager.max_active_jobs, settings.MAX_ACTIVE_K8S_JOBS)
\ No newline at end of file
+        self.assertEqual(self.j_manager.max_active_jobs, settings.MAX_ACTIVE_K8S_JOBS)
+
+    @patch('api.models.models.base.post_save')
+    def test_add_batch_to_job_packs_open_job(self, patch_mock_ps, patch_mock_js):
+        JobManager._instance = None
+        self.j_manager = JobManager()
+        region = Region.objects.create(code="EU.CARDIFF", description="CARDIFF", namespace="county")
+        batches = [Batch.objects.create(batch_id=uuid.uuid4(), region=region) for _ in range(4)]
+        first_job = self.j_manager.add_batch_to_job(self.imu_job_spec1, batches[0])
+        self.assertEqual(self.j_manager.add_batch_to_job(self.imu_job_spec1, batches[1]), first_job)
+        self.assertEqual(self.j_manager.add_batch_to_job(self.imu_job_spec1, batches[2]), first_job)
+        self.assertEqual(first_job.batches.count(), 3)
+        # the first job is full now, so the next batch should go to a new job
+        second_job = self.j_manager.add_batch_to_job(self.imu_job_spec1, batches[3])
+        self.assertNotEqual(second_job, first_job)
+        self.assertEqual(second_job.batches.count(), 1)
+
+    @patch('api.models.models.base.post_save')
+    def test_add_batch_event_starts_full_jobs(self, patch_mock_ps, patch_mock_js):
+        JobManager._instance = None
+        self.j_manager = JobManager()
+        region = Region.objects.create(code="EU.CARDIFF", description="CARDIFF", namespace="county")
+        full_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+        for _ in range(3):
+            full_job.batches.add(Batch.objects.create(batch_id=uuid.uuid4(), region=region))
+        self.j_manager.on_add_batch_event(Batch.objects.create(batch_id=uuid.uuid4(), region=region))
+        full_job.refresh_from_db()
+        self.assertTrue(full_job.scheduled)
+        self.assertEqual(self.j_manager.active_jobs, 1)
+
+    @patch('api.models.models.base.post_save')
+    def test_add_batch_event_starts_the_job_it_fills(self, patch_mock_ps, patch_mock_js):
+        JobManager._instance = None
+        self.j_manager = JobManager()
+        region = Region.objects.create(code="EU.CARDIFF", description="CARDIFF", namespace="county")
+        open_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+        for _ in range(2):
+            open_job.batches.add(Batch.objects.create(batch_id=uuid.uuid4(), region=region))
+        # the batch fills up the job, which is started right away
+        self.j_manager.on_add_batch_event(Batch.objects.create(batch_id=uuid.uuid4(), region=region))
+        open_job.refresh_from_db()
+        self.assertTrue(open_job.scheduled)
+        self.assertEqual(open_job.batches.count(), 3)
+
+    def test_start_jobs_respects_max_active_jobs(self, patch_mock_js):
+        self.j_manager.max_active_jobs = 2
+        Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.RUNNING)
+        Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SUCCEEDED)
+        queued_jobs = [Batch_Job.objects.create(job_spec=self.imu_job_spec1) for _ in range(3)]
+        admitted = self.j_manager.start_jobs(queued_jobs)
+        self.assertEqual(admitted, queued_jobs[:1])
+        self.assertEqual(self.j_manager.active_jobs, 2)
+        self.assertEqual(self.j_manager.start_jobs(queued_jobs[1:]), [])
+
+    @patch('api.models.models.base.post_save')
+    def test_schedule_pending_by_priority_and_age(self, patch_mock_ps, patch_mock_js):
+        urgent_job_spec = Job_Spec.objects.create(job_definition=self.test_imu_jd, run_environment='k8s',
+                                                  container_image="registry.mobilizedconstruction.com/mc/hydra/process-batch-test:latest", time_limit=dt.timedelta(hours=1),
+                                                  data_threshold=1, priority=5, namespace='processing-test')
+        old_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=3)
+        new_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=3)
+        urgent_job = Batch_Job.objects.create(job_spec=urgent_job_spec, batch_count=1)
+        Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=2)
+        self.j_manager.max_active_jobs = 2
+        self.assertEqual(self.j_manager.schedule_pending(), [urgent_job, old_job])
+        self.assertEqual(self.j_manager.schedule_pending(), [])
+        # finishing a job frees its slot for the next pending job
+        urgent_job.refresh_from_db()
+        self.j_manager.on_job_success(urgent_job)
+        new_job.refresh_from_db()
+        self.assertEqual(new_job.state, Batch_Job.SCHEDULED)
+
+    @patch('api.models.models.base.post_save')
+    def test_schedule_pending_candidates_per_job_spec(self, patch_mock_ps, patch_mock_js):
+        urgent_job_spec = Job_Spec.objects.create(job_definition=self.test_imu_jd, run_environment='k8s',
+                                                  container_image="registry.mobilizedconstruction.com/mc/hydra/process-batch-test:latest", time_limit=dt.timedelta(hours=1),
+                                                  data_threshold=1, priority=5, namespace='processing-test')
+        backlog = [Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=3) for _ in range(5)]
+        urgent_job = Batch_Job.objects.create(job_spec=urgent_job_spec, batch_count=1)
+        ready_jobs = Batch_Job.objects.filter(state=Batch_Job.QUEUED)
+        # the newest job is a candidate next to the oldest of the backlog, however long the backlog is
+        self.assertEqual(sorted(self.j_manager._candidate_ids(ready_jobs, 2)), [backlog[0].id, backlog[1].id, urgent_job.id])
+        self.j_manager.max_active_jobs = 1
+        self.assertEqual(self.j_manager.schedule_pending(), [urgent_job])
+
+    @patch('api.models.models.base.post_save')
+    def test_schedule_pending_with_weighted_fair_policy(self, patch_mock_ps, patch_mock_js):
+        london = Region.objects.create(code="EU.LONDON", description="LONDON", namespace="london")
+        cardiff = Region.objects.create(code="EU.CARDIFF", description="CARDIFF", namespace="county")
+        self.imu_job_spec1.data_threshold = 1
+        self.imu_job_spec1.save()
+        jobs = []
+        for region in [london, london, london, cardiff]:
+            b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+            b_job.batches.add(Batch.objects.create(batch_id=uuid.uuid4(), region=region))
+            jobs.append(b_job)
+        self.j_manager.transition(jobs[0], Batch_Job.SCHEDULED)
+        self.j_manager.max_active_jobs = 3
+        usage = self.j_manager.get_usage()
+        self.assertEqual(usage.by_namespace, {"london": 1})
+        self.assertEqual(usage.by_job_spec, {self.imu_job_spec1.id: 1})
+        with patch.object(self.j_manager, 'scheduling_policy', policies.WeightedFairPolicy()):
+            self.assertEqual(self.j_manager.schedule_pending(), [jobs[3], jobs[1]])
+
+    def test_schedule_pending_starts_lingering_jobs(self, patch_mock_js):
+        self.imu_job_spec1.max_wait = dt.timedelta(minutes=10)
+        self.imu_job_spec1.save()
+        long_ago = dt.datetime.now().replace(tzinfo=dt.timezone.utc) - dt.timedelta(minutes=11)
+        lingering_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=1)
+        Batch_Job.objects.filter(pk=lingering_job.pk).update(created_at=long_ago)
+        lingering_job.refresh_from_db()
+        Batch_Job.objects.create(job_spec=self.imu_job_spec1, batch_count=1)
+        empty_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+        Batch_Job.objects.filter(pk=empty_job.pk).update(created_at=long_ago)
+        self.assertTrue(self.j_manager.decide_job(lingering_job))
+        self.assertEqual(self.j_manager.schedule_pending(), [lingering_job])
+
+    def test_reconcile_active_jobs(self, patch_mock_js):
+        long_ago = dt.datetime.now().replace(tzinfo=dt.timezone.utc) - dt.timedelta(hours=1)
+        def make_b_job(state, changed_at=long_ago):
+            return Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=state, state_changed_at=changed_at)
+        orphaned = make_b_job(Batch_Job.SCHEDULED)
+        vanished = make_b_job(Batch_Job.RUNNING)
+        running = make_b_job(Batch_Job.RUNNING)
+        just_scheduled = make_b_job(Batch_Job.SCHEDULED, dt.datetime.now().replace(tzinfo=dt.timezone.utc))
+        created = make_b_job(Batch_Job.SCHEDULED)
+        started = make_b_job(Batch_Job.CREATED)
+        succeeded = make_b_job(Batch_Job.SCHEDULED)
+        failed = make_b_job(Batch_Job.RUNNING)
+        k8s_jobs = {
+            running: V1JobStatus(active=1),
+            created: V1JobStatus(),
+            started: V1JobStatus(active=1, start_time=long_ago),
+            succeeded: V1JobStatus(succeeded=1),
+            failed: V1JobStatus(failed=2, conditions=[V1JobCondition(type="Failed", status="True")]),
+        }
+        self.j_manager.job_scheduler.kube_list_jobs.return_value = {
+            self.j_manager.make_kubernetes_job_name(b_job): V1Job(
+                metadata=V1ObjectMeta(name=self.j_manager.make_kubernetes_job_name(b_job)), status=status)
+            for b_job, status in k8s_jobs.items()}
+        self.assertEqual(self.j_manager.reconcile_active_jobs(), {
+            Batch_Job.QUEUED: 1, Batch_Job.CREATED: 1, Batch_Job.RUNNING: 1, Batch_Job.SUCCEEDED: 1, Batch_Job.FAILED: 2})
+        for b_job, state in [(orphaned, Batch_Job.QUEUED), (vanished, Batch_Job.FAILED), (running, Batch_Job.RUNNING),
+                             (just_scheduled, Batch_Job.SCHEDULED), (created, Batch_Job.CREATED),
+                             (started, Batch_Job.RUNNING), (succeeded, Batch_Job.SUCCEEDED), (failed, Batch_Job.FAILED)]:
+            b_job.refresh_from_db()
+            self.assertEqual(b_job.state, state)
+        self.assertEqual(started.time_started, long_ago)
+        self.assertEqual(failed.tries, 2)
+        self.j_manager.job_scheduler.kube_list_jobs.assert_called_once_with('processing-test')
+
+    def test_job_scheduler_is_created_on_first_use(self, patch_mock_js):
+        JobManager._instance = None
+        self.j_manager = JobManager()
+        patch_mock_js.get_job_scheduler.assert_not_called()
+        patch_mock_js.get_job_scheduler.side_effect = Exception("k8s is unreachable")
+        with self.assertRaises(Exception):
+            self.j_manager.job_scheduler
+        patch_mock_js.get_job_scheduler.side_effect = None
+        self.assertIs(self.j_manager.job_scheduler, patch_mock_js.get_job_scheduler.return_value)
+        self.assertIs(self.j_manager.job_scheduler, patch_mock_js.get_job_scheduler.return_value)
+        self.assertEqual(patch_mock_js.get_job_scheduler.call_count, 2)
+
+    def test_transition_follows_state_machine(self, patch_mock_js):
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+        self.assertEqual(b_job.state, Batch_Job.QUEUED)
+        self.assertFalse(self.j_manager.transition(b_job, Batch_Job.RUNNING))
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.SCHEDULED))
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.CREATED))
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.RUNNING))
+        # a replayed k8s ADDED event must not move a running job backwards
+        self.assertFalse(self.j_manager.transition(b_job, Batch_Job.CREATED))
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.RUNNING))
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.SUCCEEDED))
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.SUCCEEDED)
+        self.assertIsNotNone(b_job.state_changed_at)
+
+    def test_transition_refused_when_state_changed_concurrently(self, patch_mock_js):
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1)
+        stale_b_job = Batch_Job.objects.get(pk=b_job.pk)
+        self.assertTrue(self.j_manager.transition(b_job, Batch_Job.SCHEDULED))
+        self.assertFalse(self.j_manager.transition(stale_b_job, Batch_Job.SCHEDULED))
+        self.assertEqual(stale_b_job.state, Batch_Job.SCHEDULED)
+
+    def test_on_job_failure_marks_failed_after_max_tries(self, patch_mock_js):
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.RUNNING)
+        self.j_manager.on_job_failure(b_job, Batch_Job.MAX_TRIES)
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.RUNNING)
+        self.j_manager.on_job_failure(b_job, Batch_Job.MAX_TRIES + 1)
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.FAILED)
+        self.assertTrue(b_job.finished)
+        self.assertFalse(b_job.succeeded)
+
+    def test_job_not_created_gives_slot_back(self, patch_mock_js):
+        job_name = "test-imu-jobmanager"
+        for error, state in [(JobCreationError(job_name, "Internal Server Error", "", True), Batch_Job.QUEUED),
+                             (ConnectionError("Connection refused"), Batch_Job.QUEUED),
+                             (JobCreationError(job_name, "Invalid", "", False), Batch_Job.FAILED)]:
+            b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
+            submission = Future()
+            submission.set_exception(error)
+            self.j_manager._on_job_submitted(b_job, job_name, submission)
+            b_job.refresh_from_db()
+            self.assertEqual(b_job.state, state)
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
+        submission = Future()
+        submission.set_result("AlreadyExists")
+        self.j_manager._on_job_submitted(b_job, job_name, submission)
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.SCHEDULED)
+
+    def test_job_not_submitted_goes_back_to_queue(self, patch_mock_js):
+        patch_mock_js.get_job_scheduler.side_effect = RuntimeError("k8s is not configured")
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
+        self.j_manager.create_k8s_job(b_job)
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.QUEUED)
+
+    @patch('hydra.jobmanager.jobmanager.close_old_connections')
+    @patch('hydra.jobmanager.jobmanager.connection')
+    def test_job_not_created_drops_old_connections(self, connection_mock, close_old_connections_mock, patch_mock_js):
+        connection_mock.in_atomic_block = False
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
+        submission = Future()
+        submission.set_exception(ConnectionError("Connection refused"))
+        self.j_manager._on_job_submitted(b_job, "test-imu-jobmanager", submission)
+        close_old_connections_mock.assert_called_once()
+
+    def test_on_job_failure_marks_failed_when_k8s_gave_up(self, patch_mock_js):
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.RUNNING)
+        self.j_manager.on_job_failure(b_job, 1, terminal=True)
+        b_job.refresh_from_db()
+        self.assertEqual(b_job.state, Batch_Job.FAILED)
+        self.assertEqual(b_job.tries, 1)
+
+    def test_transitions_update_metrics(self, patch_mock_js):
+        labels = {"job_definition": self.test_imu_jd.name}
+        started_before = metrics.JOBS_STARTED.labels(**labels)._value.get()
+        succeeded_before = metrics.JOBS_SUCCEEDED.labels(**labels)._value.get()
+        b_job = Batch_Job.objects.create(job_spec=self.imu_job_spec1, state=Batch_Job.SCHEDULED)
+        start_time = dt.datetime.utcnow().replace(tzinfo=dt.timezone.utc)
+        self.j_manager.on_job_started(b_job, start_time)
+        # a repeated event for a running job is not counted again
+        self.j_manager.on_job_started(b_job, start_time)
+        self.j_manager.on_job_success(b_job)
+        self.assertEqual(metrics.JOBS_STARTED.labels(**labels)._value.get(), started_before + 1)
+        self.assertEqual(metrics.JOBS_SUCCEEDED.labels(**labels)._value.get(), succeeded_before + 1)
@@ -1,11 +1,15 @@
+import datetime as dt
 import json
 import logging
+import uuid
+from io import StringIO
 from unittest.mock import patch
 
+from django.core.management import call_command
 from django.test import TestCase
 from rest_framework.test import APIClient
 
-from api.models import Batch
+from api.models import Batch, Batch_Job, Job_Definition, Job_Spec, Region
 
 
 @patch('api.models.models.base.post_save')
@@ -66,3 +70,53 @@ class TestSignal(TestCase):
                       "description": "CARDIFF", "namespace": "county"}
         res = self.api_client.post(url, valid_data)
         logging.debug(res)
+
+
+class TestBatchCountSignal(TestCase):
+    @patch('api.models.models.base.post_save')
+    def setUp(self, patch_mock_ps):
+        region = Region.objects.create(code="EU.CARDIFF", description="CARDIFF", namespace="county")
+        job_definition = Job_Definition.objects.create(name="counter", description="counts")
+        self.job_spec = Job_Spec.objects.create(job_definition=job_definition, run_environment=Job_Spec.AMAZON,
+                                                container_image="counter", namespace="processing-test",
+                                                time_limit=dt.timedelta(hours=1), data_threshold=3)
+        self.batch1 = Batch.objects.create(batch_id=uuid.uuid4(), region=region)
+        self.batch2 = Batch.objects.create(batch_id=uuid.uuid4(), region=region)
+
+    def test_batch_count_follows_batches(self):
+        batch_job = Batch_Job.objects.create(job_spec=self.job_spec)
+        batch_job.batches.add(self.batch1, self.batch2)
+        self.assertEqual(batch_job.batch_count, 2)
+        # adding a batch which is already there should not count it again
+        batch_job.batches.add(self.batch1)
+        batch_job.refresh_from_db()
+        self.assertEqual(batch_job.batch_count, 2)
+        batch_job.batches.remove(self.batch2)
+        batch_job.refresh_from_db()
+        self.assertEqual(batch_job.batch_count, 1)
+        batch_job.batches.clear()
+        batch_job.refresh_from_db()
+        self.assertEqual(batch_job.batch_count, 0)
+
+    def test_batch_count_follows_reverse_add(self):
+        batch_job1 = Batch_Job.objects.create(job_spec=self.job_spec)
+        batch_job2 = Batch_Job.objects.create(job_spec=self.job_spec)
+        self.batch1.batch_job_set.add(batch_job1, batch_job2)
+        self.batch2.batch_job_set.add(batch_job1)
+        batch_job1.refresh_from_db()
+        batch_job2.refresh_from_db()
+        self.assertEqual(batch_job1.batch_count, 2)
+        self.assertEqual(batch_job2.batch_count, 1)
+        self.batch1.batch_job_set.clear()
+        batch_job1.refresh_from_db()
+        batch_job2.refresh_from_db()
+        self.assertEqual(batch_job1.batch_count, 1)
+        self.assertEqual(batch_job2.batch_count, 0)
+
+    def test_backfill_batch_counts(self):
+        batch_job = Batch_Job.objects.create(job_spec=self.job_spec)
+        batch_job.batches.add(self.batch1, self.batch2)
+        Batch_Job.objects.filter(pk=batch_job.pk).update(batch_count=0)
+        call_command("backfill_batch_counts", stdout=StringIO())
+        batch_job.refresh_from_db()
+        self.assertEqual(batch_job.batch_count, 2)
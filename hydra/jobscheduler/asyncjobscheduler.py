@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from kubernetes.client.rest import ApiException
+
+from hydra.jobmanager import metrics
+from hydra.jobscheduler.informer import Informer
+from hydra.jobscheduler.jobscheduler import RETRY_STATUS_CODES, JobCreationError, JobScheduler
+
+try:
+    from kubernetes_asyncio import client as async_client, config as async_config, watch as async_watch
+    from kubernetes_asyncio.client.exceptions import ApiException as AsyncApiException
+except ImportError:
+    async_client = None
+
+
+class BlockingApi(object):
+    """
+    Calls the methods of a kubernetes_asyncio API from other threads, by running them on the event loop and waiting
+    for the result, so the code written for the sync client (the job watcher, status lookups, ...) works unchanged.
+    API errors are raised as the `ApiException` of the sync client.
+    """
+
+    def __init__(self, api, loop):
+        self._api = api
+        self._loop = loop
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not asyncio.iscoroutine(result):
+                return result
+            if _running_loop() is self._loop:
+                # Waiting for the loop on the loop would never return
+                result.close()
+                raise RuntimeError("Blocking k8s call '{0}' on the event loop of the AsyncJobScheduler".format(name))
+            try:
+                return asyncio.run_coroutine_threadsafe(result, self._loop).result()
+            except AsyncApiException as e:
+                error = ApiException(status=e.status, reason=e.reason)
+                error.body, error.headers = e.body, e.headers
+                raise error from e
+        return call
+
+
+def _copy_future_state(source, destination):
+    if source.cancelled():
+        destination.cancel()
+    elif source.exception() is not None:
+        destination.set_exception(source.exception())
+    else:
+        destination.set_result(source.result())
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class AsyncInformer(Informer):
+    """
+    An `Informer` that lists and watches with kubernetes_asyncio on the event loop of the `AsyncJobScheduler`, instead
+    of in a thread of its own. The store is updated and the handlers are called in a single thread per informer, in
+    the order of the events, as the handlers block on the database and on the queue of the job watcher.
+    """
+
+    def __init__(self, loop, list_func, namespace, resource, **kwargs):
+        """
+        :param loop: The event loop to watch on.
+        :param list_func: The list function of the kubernetes_asyncio api, e.g. `BatchV1Api.list_namespaced_job`.
+        Other arguments are those of `Informer`.
+        """
+        super(AsyncInformer, self).__init__(list_func, namespace, resource, **kwargs)
+        self.loop = loop
+        self._dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kube-informer-" + resource)
+
+    def start(self):
+        """
+        Starts following the namespace on the event loop.
+        """
+        if self._thread is None:
+            # A future of the watch on the event loop takes the place of the thread
+            self._thread = asyncio.run_coroutine_threadsafe(self.run(), self.loop)
+
+    async def run(self):
+        failures = 0
+        while True:
+            try:
+                if self.resource_version is None:
+                    self.resource_version = await self.relist()
+                await self.stream()
+                failures = 0
+            except AsyncApiException as e:
+                if e.status == 410:
+                    logging.warning("k8s watch resource version expired, relisting %s", self.resource,
+                                    extra={"k8s_resource_version": self.resource_version})
+                    self.resource_version = None
+                else:
+                    failures += 1
+                    logging.error("lost connection to k8s, due to 'ApiException', restarting %s watcher", self.resource,
+                                  extra={"exception": str(e), "k8s_resource_version": self.resource_version})
+            except Exception as e:
+                failures += 1
+                logging.error("lost connection to k8s, due to '%s', restarting %s watcher", type(e).__name__, self.resource,
+                              extra={"exception": str(e), "k8s_resource_version": self.resource_version})
+            metrics.WATCH_RESTARTS.labels(resource=self.resource).inc()
+            await asyncio.sleep(self.get_backoff(failures))
+
+    async def relist(self):
+        logging.info("Listing k8s %s in '%s' namespace", self.resource, self.namespace)
+        objects = []
+        _continue = None
+        while True:
+            object_list = await self.list_func(
+                self.namespace, label_selector=self.label_selector or "", limit=int(settings.WATCH_K8S_LIST_PAGE_SIZE),
+                _continue=_continue, _request_timeout=settings.WATCH_K8S_REQUEST_TIMEOUT, _headers=self.list_headers)
+            objects.extend(object_list.items)
+            _continue = object_list.metadata._continue
+            if not _continue:
+                break
+        await self.loop.run_in_executor(self._dispatcher, self.replace, objects)
+        return object_list.metadata.resource_version
+
+    async def stream(self):
+        async with async_watch.Watch() as w:
+            async for event in w.stream(self.list_func, **self.get_watch_params()):
+                await self.loop.run_in_executor(self._dispatcher, self.on_watch_event, event)
+
+
+class AsyncJobScheduler(JobScheduler):
+    """
+    A `JobScheduler` on the asyncio k8s client (kubernetes_asyncio), selected with
+    `settings.K8S_JOB_SCHEDULER_BACKEND = "async"`. All k8s calls run on one event loop in a background thread, so
+    creates, deletes and watches in flight wait on the loop instead of each holding a thread.
+
+    It has the same methods as the `JobScheduler`: `kube_submit_job` and `kube_delete_job` return
+    `concurrent.futures.Future`s of coroutines on the loop, the other methods block the calling thread until their
+    call is done. Code that runs on the loop awaits `kube_create_job_async` and `kube_delete_job_async` instead.
+    """
+    _instance = None
+
+    def _init_client(self):
+        if async_client is None:
+            raise ImproperlyConfigured("The async job scheduler needs the kubernetes_asyncio package")
+        self.loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=self.loop.run_forever, args=(), name="kube-event-loop")
+        loop_thread.daemon = True
+        loop_thread.start()
+        asyncio.run_coroutine_threadsafe(self._init_async_client(), self.loop).result()
+
+        # aiohttp asks for compressed responses by itself, and also decompresses the watches
+        self.list_headers = {}
+        self.api_instance = BlockingApi(self.async_api_instance, self.loop)
+        self.core_api_instance = BlockingApi(self.async_core_api_instance, self.loop)
+
+    async def _init_async_client(self):
+        configuration = async_client.Configuration()
+        if not self.configure_from_settings(configuration):
+            logging.info("Loading k8s from file-system")
+            await async_config.load_kube_config(client_configuration=configuration)
+        # The number of connections, requests beyond it wait on the loop for a free one
+        configuration.connection_pool_maxsize = int(settings.K8S_CONNECTION_POOL_SIZE)
+        self.api_client = async_client.ApiClient(configuration)
+        self.async_api_instance = async_client.BatchV1Api(self.api_client)
+        self.async_core_api_instance = async_client.CoreV1Api(self.api_client)
+
+    def close(self):
+        """
+        Closes the connections of the client and stops the event loop.
+        """
+        asyncio.run_coroutine_threadsafe(self.api_client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _init_informers(self):
+        self.job_informer = AsyncInformer(self.loop, self.async_api_instance.list_namespaced_job,
+                                          settings.WATCH_K8S_NAMESPACE, "jobs", index_labels=("name",))
+        self.pod_informer = AsyncInformer(self.loop, self.async_core_api_instance.list_namespaced_pod,
+                                          settings.WATCH_K8S_NAMESPACE, "pods", index_labels=("job-name",),
+                                          label_selector="job-name")
+
+    def kube_create_job(self, job_name, namespace, env, container_image, init_photo_container=False, labels={}):
+        return self.kube_submit_job(job_name, namespace, env, container_image,
+                                    init_photo_container=init_photo_container, labels=labels).result()
+
+    def kube_submit_job(self, job_name, namespace, env, container_image, init_photo_container=False, labels={}):
+        """
+        Creates a job with `kube_create_job_async` on the event loop, within the rate limit of `self.rate_limiter`.
+        :return: A future with the result of `kube_create_job_async`. It is completed on a submission worker instead
+        of the loop, so its callbacks may use the database.
+        """
+        submission = Future()
+        creation = asyncio.run_coroutine_threadsafe(
+            self.kube_create_job_async(job_name, namespace, env, container_image,
+                                       init_photo_container=init_photo_container, labels=labels), self.loop)
+        creation.add_done_callback(
+            lambda creation: self._submit_executor.submit(_copy_future_state, creation, submission))
+        return submission
+
+    async def kube_create_job_async(self, job_name, namespace, env, container_image, init_photo_container=False,
+                                    labels={}):
+        """
+        Creates a job like `JobScheduler.kube_create_job`, retrying throttled and failed creates with a backoff.
+        :return: The created job, or the reason k8s gave if the job exists already.
+        :raises JobCreationError: If k8s refused to create the job.
+        """
+        body = self.kube_job_body(
+            job_name,
+            container_image,
+            namespace,
+            "jobcontainer",
+            init_photo_container,
+            labels,
+            env_vars=env
+        )
+        max_retries = int(settings.K8S_SUBMIT_MAX_RETRIES)
+        for attempt in range(max_retries + 1):
+            await self.rate_limiter.acquire_async()
+            retry_after = None
+            try:
+                return await self.async_api_instance.create_namespaced_job(namespace, body)
+            except AsyncApiException as e:
+                reason, message, retry = self._on_create_error(job_name, e, attempt == max_retries)
+                if e.status == 409:
+                    return reason
+                if not retry:
+                    raise JobCreationError(job_name, reason, message, e.status in RETRY_STATUS_CODES) from e
+                retry_after = (e.headers or {}).get("Retry-After")
+            except Exception as e:
+                # Connection errors
+                if attempt == max_retries:
+                    raise
+                message = str(e)
+            delay = self.get_submit_backoff(attempt + 1, retry_after)
+            logging.warning("Retrying to create job %s in %.1f seconds", job_name, delay,
+                            extra={"job_name": job_name, "attempt": attempt, "exception": message})
+            await asyncio.sleep(delay)
+
+    async def kube_delete_job_async(self, job_name, namespace):
+        """
+        Deletes a job like `kube_delete_job`, and waits until k8s accepted the delete.
+        """
+        await asyncio.wrap_future(self.kube_delete_job(job_name, namespace))
+
+    def _submit_delete(self, job_name, namespace):
+        return asyncio.run_coroutine_threadsafe(self._kube_delete_job_async(job_name, namespace), self.loop)
+
+    async def _kube_delete_job_async(self, job_name, namespace):
+        await self.rate_limiter.acquire_async()
+        try:
+            await self.async_api_instance.delete_namespaced_job(
+                job_name,
+                namespace,
+                grace_period_seconds=0,
+                propagation_policy='Background'
+            )
+        except AsyncApiException as e:
+            self._on_delete_error(job_name, namespace, e)
+        except Exception as e:
+            logging.error("Could not delete job %s", job_name, extra={"exception": str(e)})
@@ -0,0 +1,242 @@
+import json
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from urllib3.exceptions import InvalidChunkLength
+
+from hydra.jobmanager import metrics
+
+
+class Informer(object):
+    """
+    Keeps an in-memory copy of the k8s objects of one kind in a namespace, indexed by name and by label values, fed
+    by a list followed by a watch. The watch resumes from the last resource version it has seen (bookmarks included),
+    so a reconnect only receives the events that were missed, and the namespace is only listed again at startup and
+    when k8s no longer has that resource version (410 Gone).
+
+    Handlers added with `add_handler` are called with every event after the store was updated, so they can read the
+    new state from the store.
+    """
+
+    def __init__(self, list_func, namespace, resource, index_labels=(), label_selector=None, list_headers=None):
+        """
+        :param list_func: The list function of the k8s api, e.g. `BatchV1Api.list_namespaced_job`.
+        :param namespace: The namespace to follow.
+        :param resource: The name of the kind of object, used in logs and metrics.
+        :param index_labels: The labels whose values can be looked up with `get_by_label`.
+        :param label_selector: Optional label selector, to only follow some of the objects.
+        :param list_headers: Extra headers of the list requests, e.g. to ask for compressed pages. The watch can not
+            take them, it reads the raw stream.
+        """
+        self.list_func = list_func
+        self.namespace = namespace
+        self.resource = resource
+        self.index_labels = tuple(index_labels)
+        self.label_selector = label_selector
+        self.list_headers = dict(list_headers or {})
+        self.resource_version = None
+        self._handlers = []
+        self._items = {}
+        self._indices = {label: {} for label in self.index_labels}
+        self._lock = threading.RLock()
+        self._synced = threading.Event()
+        self._thread = None
+
+    def add_handler(self, handler):
+        self._handlers.append(handler)
+
+    def start(self):
+        """
+        Starts following the namespace in a daemon thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=())
+            self._thread.daemon = True
+            self._thread.start()
+
+    def has_synced(self):
+        """
+        Returns whether the store holds a complete list of the objects, callers should ask the API server otherwise.
+        """
+        return self._synced.is_set()
+
+    def get(self, name):
+        with self._lock:
+            return self._items.get(name)
+
+    def get_by_label(self, label, value):
+        with self._lock:
+            return [self._items[name] for name in self._indices[label].get(value, ())]
+
+    def list(self):
+        with self._lock:
+            return list(self._items.values())
+
+    def forget(self, name):
+        """
+        Removes an object from the store right away, e.g. after deleting it, instead of waiting for the DELETED event.
+        """
+        with self._lock:
+            self._remove(name)
+
+    def run(self):
+        failures = 0
+        while True:
+            try:
+                if self.resource_version is None:
+                    self.resource_version = self.relist()
+                self.stream()
+                failures = 0
+            except ApiException as e:
+                if e.status == 410:
+                    logging.warning("k8s watch resource version expired, relisting %s", self.resource,
+                                    extra={"k8s_resource_version": self.resource_version})
+                    self.resource_version = None
+                else:
+                    failures += 1
+                    logging.error("lost connection to k8s, due to 'ApiException', restarting %s watcher", self.resource,
+                                  extra={"exception": str(e), "k8s_resource_version": self.resource_version})
+            except (ValueError, InvalidChunkLength) as e:
+                # Sometimes w.stream() looses connection to the k8s cluster and raises InvalidChunkLength.
+                # more info here: https://github.com/kubernetes-client/python/issues?q=invalid+literal+for+int%28%29+with+base+16%3A+b%27
+                failures += 1
+                logging.error("lost connection to k8s, due to '%s', restarting %s watcher", type(e).__name__, self.resource,
+                              extra={"exception": str(e), "k8s_resource_version": self.resource_version})
+            except Exception as e:
+                failures += 1
+                logging.error("lost connection to k8s, due to 'Exception', restarting %s watcher", self.resource,
+                              extra={"exception": str(e), "k8s_resource_version": self.resource_version})
+            metrics.WATCH_RESTARTS.labels(resource=self.resource).inc()
+            time.sleep(self.get_backoff(failures))
+
+    def get_backoff(self, failures):
+        """
+        Returns how many seconds to wait before reconnecting, with exponential backoff and jitter after failures so
+        the watchers don't all hit a recovering API server at the same moment. A watch that ended cleanly is resumed
+        right away.
+        """
+        if failures == 0:
+            return 0
+        backoff = min(float(settings.WATCH_K8S_BACKOFF_BASE) * 2 ** (failures - 1), float(settings.WATCH_K8S_BACKOFF_MAX))
+        return backoff * random.uniform(0.5, 1)
+
+    def relist(self):
+        """
+        Lists all objects of the namespace page by page and replaces the store with them. Handlers get the listed
+        objects as ADDED events, the same way a watch without a resource version would replay them, and a DELETED
+        event for objects that disappeared since the last list.
+        :return: The resource version of the list, to start the watch from.
+        """
+        logging.info("Listing k8s %s in '%s' namespace", self.resource, self.namespace)
+        objects = []
+        _continue = None
+        while True:
+            object_list = self.list_func(
+                self.namespace, label_selector=self.label_selector or "", limit=int(settings.WATCH_K8S_LIST_PAGE_SIZE),
+                _continue=_continue, _request_timeout=settings.WATCH_K8S_REQUEST_TIMEOUT, _headers=self.list_headers)
+            objects.extend(object_list.items)
+            _continue = object_list.metadata._continue
+            if not _continue:
+                break
+        self.replace(objects)
+        return object_list.metadata.resource_version
+
+    def replace(self, objects):
+        """
+        Replaces the store with a complete list of the objects, and passes the changes on to the handlers.
+        """
+        with self._lock:
+            deleted = [self._items[name] for name in set(self._items) - {obj.metadata.name for obj in objects}]
+            self._items = {}
+            self._indices = {label: {} for label in self.index_labels}
+            for obj in objects:
+                self._put(obj)
+        self._synced.set()
+        for obj in deleted:
+            self._dispatch({"type": "DELETED", "object": obj})
+        for obj in objects:
+            self._dispatch({"type": "ADDED", "object": obj})
+
+    def stream(self):
+        """
+        Streams events from `self.resource_version` on until the server closes the watch, keeping the store and
+        `self.resource_version` up to date.
+        """
+        watch_params = self.get_watch_params()
+        w = watch.Watch()
+        try:
+            for event in w.stream(self.list_func, **watch_params):
+                self.on_watch_event(event)
+        finally:
+            w.stop()
+
+    def get_watch_params(self):
+        watch_params = {
+            "namespace": self.namespace,
+            "label_selector": self.label_selector or "",
+            "resource_version": self.resource_version,
+            "allow_watch_bookmarks": True,
+            "timeout_seconds": settings.WATCH_K8S_TIMEOUT,
+            "_request_timeout": settings.WATCH_K8S_REQUEST_TIMEOUT,
+        }
+        logging.info("Watching k8s for %s updates in '%s' namespace", self.resource, self.namespace,
+                     extra={"watch_params": json.dumps(watch_params)})
+        return watch_params
+
+    def on_watch_event(self, event):
+        """
+        Applies a watch event to the store, passes it on to the handlers and moves `self.resource_version` on.
+        """
+        metrics.WATCH_EVENTS.labels(resource=self.resource, type=event['type']).inc()
+        if event['type'] != "BOOKMARK":
+            with self._lock:
+                if event['type'] == "DELETED":
+                    self._remove(event['object'].metadata.name)
+                else:
+                    self._put(event['object'])
+            self._dispatch(event)
+        self.resource_version = self.get_event_resource_version(event) or self.resource_version
+
+    @staticmethod
+    def get_event_resource_version(event):
+        # Bookmarks only carry metadata, so they are not deserialized into a model
+        if isinstance(event['object'], dict):
+            return event['object'].get('metadata', {}).get('resourceVersion')
+        return event['object'].metadata.resource_version
+
+    def _dispatch(self, event):
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                # Skip the event instead of dropping the stream, a broken db connection is replaced for the next one
+                logging.error("Failed to handle k8s %s event", self.resource,
+                              extra={"exception": str(e), "event_type": event['type']})
+                close_old_connections()
+
+    def _put(self, obj):
+        name = obj.metadata.name
+        self._remove(name)
+        self._items[name] = obj
+        labels = obj.metadata.labels or {}
+        for label in self.index_labels:
+            if label in labels:
+                self._indices[label].setdefault(labels[label], set()).add(name)
+
+    def _remove(self, name):
+        obj = self._items.pop(name, None)
+        if obj is None:
+            return
+        labels = obj.metadata.labels or {}
+        for label in self.index_labels:
+            names = self._indices[label].get(labels.get(label))
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._indices[label][labels[label]]
@@ -5,7 +5,6 @@
 
 from api.models import Batch_Job
 from os import name
-from api.views import ApiOverview
 import logging
 import tempfile
 import base64
@@ -17,20 +16,72 @@ import kubernetes.client
 from kubernetes.client.models.v1_job import V1Job
 from kubernetes.client.rest import ApiException
 from django.conf import settings
+from django.utils.module_loading import import_string
 from distutils import util
+import copy
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from hydra.jobscheduler.informer import Informer
 from hydra.jobscheduler.jobwatcher import JobWatcher
+from hydra.jobscheduler.ratelimit import TokenBucket
 
+import random
+import socket
 import time
+from urllib3.connection import HTTPConnection
+
+# Probe idle connections to the API server after a minute, so they are not silently dropped in between calls
+KEEPALIVE_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    KEEPALIVE_SOCKET_OPTIONS += [(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+                                 (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15),
+                                 (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4)]
+
+# Responses of the API server worth retrying, e.g. 429 when priority and fairness rejected the request
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# The job scheduler classes selectable with settings.K8S_JOB_SCHEDULER_BACKEND
+BACKENDS = {
+    "sync": "hydra.jobscheduler.jobscheduler.JobScheduler",
+    "async": "hydra.jobscheduler.asyncjobscheduler.AsyncJobScheduler",
+}
+
+
+class JobCreationError(Exception):
+    """
+    Raised when k8s refused to create a job, with the reason k8s gave. `retryable` tells whether the create may work
+    later on, e.g. after a 5xx of an overloaded API server, or will be refused again, e.g. after a 403 or 422.
+    """
+
+    def __init__(self, job_name, reason, message, retryable):
+        super(JobCreationError, self).__init__("Could not create job {0}: {1}".format(job_name, message))
+        self.reason = reason
+        self.retryable = retryable
+
+
+def get_job_scheduler(backend=None):
+    """
+    Returns the job scheduler of the `backend`, `settings.K8S_JOB_SCHEDULER_BACKEND` by default: 'sync' for the
+    `JobScheduler` on the kubernetes client, 'async' for the `AsyncJobScheduler` on kubernetes_asyncio.
+    """
+    backend = backend or settings.K8S_JOB_SCHEDULER_BACKEND
+    if backend not in BACKENDS:
+        logging.error("Unknown job scheduler backend '%s'", backend)
+        raise ValueError("Unknown job scheduler backend '{0}'".format(backend))
+    return import_string(BACKENDS[backend])()
+
+
 class JobScheduler(object):
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             logging.debug("Creating the JobScheduler singleton", extra={})
-            cls._instance = super(JobScheduler, cls).__new__(cls)
-            cls._instance._init_instance()
-            # Put any initialization here.
+            instance = super(JobScheduler, cls).__new__(cls)
+            # Put any initialization here. The instance is only kept once it is set up, so a failed setup is retried
+            instance._init_instance()
+            cls._instance = instance
         return cls._instance
     def _init_instance(self):
         """
@@ -38,42 +89,90 @@ class JobScheduler(object):
             a k8s cluster
         """
 
-        # retrieve cluster details from environment variables
-        host_url = settings.K8S_API_URL
-        cacert = settings.K8S_CACERT
-        token = settings.K8S_TOKEN
+        self._init_client()
 
-        configuration = None
+        # Testing Credentials in the background, a slow or unreachable cluster must not hold up the process start
+        credentials_check = threading.Thread(target=self.kube_test_credentials, args=(), name="kube-credentials-check")
+        credentials_check.daemon = True
+        credentials_check.start()
 
-        if host_url:
-            # initialize configuration for token authentication
-            # this is the way to go if we're using a service account
-            configuration = client.Configuration()
-            configuration.api_key["authorization"] = token
-            configuration.api_key_prefix['authorization'] = 'Bearer'
-            configuration.host = host_url
+        # Local caches of the jobs and pods in the watched namespace, started by the watcher
+        self._init_informers()
 
-            # configuration.ssl_ca_cert expects a file containing the
-            # certificates,so we generate a temporary file to hold those
-            with tempfile.NamedTemporaryFile(mode='w', delete=False) as tf:
-                tf.write(base64.b64decode(cacert).decode("utf-8"))
-                configuration.ssl_ca_cert = tf.name
+        # Jobs are created from a pool of workers, and all writes share one rate limit
+        self.rate_limiter = TokenBucket(settings.K8S_API_QPS, settings.K8S_API_BURST)
+        self._submit_executor = ThreadPoolExecutor(max_workers=int(settings.K8S_SUBMIT_WORKERS),
+                                                   thread_name_prefix="kube-submit")
 
-        else:
+        # Jobs are deleted in the background, k8s confirms the deletions with DELETED events on the job informer
+        self._delete_executor = ThreadPoolExecutor(max_workers=int(settings.K8S_DELETE_WORKERS),
+                                                   thread_name_prefix="kube-delete")
+        self._deletions = {}
+        self._deletions_lock = threading.Lock()
+        self.job_informer.add_handler(self._on_job_event)
+
+        # Serialized job bodies per job spec, see kube_job_body
+        self._job_templates = OrderedDict()
+        self._job_templates_lock = threading.Lock()
+
+        # Create k8s watcher, it is only started by the controller process
+        self.jobwatcher = JobWatcher(self, self.api_instance, self.core_api_instance)
+
+    def _init_client(self):
+        """
+        Sets up the k8s client, `api_instance` and `core_api_instance`.
+        """
+        configuration = client.Configuration()
+        if not self.configure_from_settings(configuration):
             # try to initialize from $HOME/.kube/config (eg. kubectl config)
             logging.info("Loading k8s from file-system")
-            config.load_kube_config()
+            config.load_kube_config(client_configuration=configuration)
 
-        # initialize the Kubernetes client
-        kubernetes.client.rest.logger.setLevel(logging.INFO)
-        self.api_instance = kubernetes.client.BatchV1Api(kubernetes.client.ApiClient(configuration))
-        self.core_api_instance = kubernetes.client.CoreV1Api(kubernetes.client.ApiClient(configuration))
+        # One connection pool for all threads talking to k8s (submit and delete workers, informers, watcher), sized
+        # so they do not queue for connections, with TCP keep-alive so idle connections survive load balancers
+        configuration.connection_pool_maxsize = int(settings.K8S_CONNECTION_POOL_SIZE)
+        configuration.socket_options = HTTPConnection.default_socket_options + KEEPALIVE_SOCKET_OPTIONS
 
-        # Testing Credentials
-        self.kube_test_credentials()
+        # initialize the Kubernetes client, the batch and core APIs share it
+        kubernetes.client.rest.logger.setLevel(logging.INFO)
+        self.api_client = kubernetes.client.ApiClient(configuration)
+        # List responses are the large ones, watches can not be compressed as the client reads them undecoded
+        self.list_headers = {"Accept-Encoding": "gzip"} if util.strtobool(str(settings.K8S_API_COMPRESSION)) else {}
+        self.api_instance = kubernetes.client.BatchV1Api(self.api_client)
+        self.core_api_instance = kubernetes.client.CoreV1Api(self.api_client)
+
+    @staticmethod
+    def configure_from_settings(configuration):
+        """
+        Sets up token authentication from `settings.K8S_API_URL`, `K8S_TOKEN` and `K8S_CACERT`, the way to go with a
+        service account.
+        :return: False if no API url is set, the kubeconfig should be loaded instead.
+        """
+        # retrieve cluster details from environment variables
+        host_url = settings.K8S_API_URL
+        cacert = settings.K8S_CACERT
+        token = settings.K8S_TOKEN
+        if not host_url:
+            return False
 
-        # Create k8s watcher
-        jobwatcher = JobWatcher(self, self.api_instance, self.core_api_instance)
+        # initialize configuration for token authentication
+        configuration.api_key["authorization"] = token
+        configuration.api_key_prefix['authorization'] = 'Bearer'
+        configuration.host = host_url
+
+        # configuration.ssl_ca_cert expects a file containing the
+        # certificates,so we generate a temporary file to hold those
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as tf:
+            tf.write(base64.b64decode(cacert).decode("utf-8"))
+            configuration.ssl_ca_cert = tf.name
+        return True
+
+    def _init_informers(self):
+        self.job_informer = Informer(self.api_instance.list_namespaced_job, settings.WATCH_K8S_NAMESPACE, "jobs",
+                                     index_labels=("name",), list_headers=self.list_headers)
+        self.pod_informer = Informer(self.core_api_instance.list_namespaced_pod, settings.WATCH_K8S_NAMESPACE, "pods",
+                                     index_labels=("job-name",), label_selector="job-name",
+                                     list_headers=self.list_headers)
 
     def kube_cleanup_jobs_with_state(self, namespace='processing', state='Finished', jobs_label_selector=""):
         """
@@ -105,8 +204,8 @@ class JobScheduler(object):
             jobs = self.api_instance.list_namespaced_job(
                 namespace,
                 label_selector=jobs_label_selector,
-                pretty=True,
-                timeout_seconds=60
+                timeout_seconds=60,
+                _headers=self.list_headers
             )
         except ApiException as e:
             logging.warning(
@@ -120,18 +219,21 @@ class JobScheduler(object):
         # We are also logging the jobs we didn't clean up because they either
         # failed or are still running
         deleted_job_names = []
+        deletions = []
         for job in jobs.items:
             jobname = job.metadata.name
             jobstatus = job.status.conditions
             job_state = None
             if job.status.succeeded == 1 and state == "Finished":
                 #logging.info("Deleting finished job")
-                self.kube_delete_job(jobname,namespace)
+                deletions.append(self.kube_delete_job(jobname,namespace))
                 deleted_job_names.append(jobname)
             elif jobstatus is None and job.status.active == 1 and state == "Active":
                 #logging.info("Deleting active job")
-                self.kube_delete_job(jobname,namespace)
+                deletions.append(self.kube_delete_job(jobname,namespace))
                 deleted_job_names.append(jobname)
+        # The deletes run concurrently, wait until k8s accepted all of them
+        wait(deletions)
 
         return deleted_job_names
 
@@ -243,7 +345,53 @@ class JobScheduler(object):
         )
         # And finaly we can create our V1JobSpec!
         body.spec = client.V1JobSpec(
-            ttl_seconds_after_finished=600, template=template.template)
+            ttl_seconds_after_finished=int(settings.K8S_JOB_TTL_SECONDS), template=template.template)
+        return body
+
+    def kube_job_body(
+        self,
+        name,
+        container_image,
+        namespace="processing",
+        container_name="jobcontainer",
+        init_photo_container=False,
+        labels={},
+        env_vars={}
+    ):
+        """
+        Returns the body of a job like `kube_create_job_object`, in the serialized (dict) form the API client sends.
+        Everything but the job name and the BATCH_IDS is the same for all jobs of a job spec, so the serialized body
+        is built once per job spec and only copied and patched for every job. The cache is keyed by the job spec
+        values the body is built from, so a changed job spec gets a new template, and holds up to
+        `settings.K8S_JOB_TEMPLATE_CACHE_SIZE` templates.
+        """
+        batch_ids = env_vars.get("BATCH_IDS", "")
+        key = (container_image, namespace, container_name, bool(init_photo_container), int(settings.K8S_JOB_TTL_SECONDS),
+               json.dumps(labels or {}, sort_keys=True),
+               json.dumps([[env_name, None if env_name == "BATCH_IDS" else env_value] for env_name, env_value in env_vars.items()]))
+        with self._job_templates_lock:
+            template = self._job_templates.get(key)
+            if template is not None:
+                self._job_templates.move_to_end(key)
+        if template is None:
+            template_env_vars = dict(env_vars, BATCH_IDS="") if "BATCH_IDS" in env_vars else env_vars
+            template = self.api_instance.api_client.sanitize_for_serialization(self.kube_create_job_object(
+                "", container_image, namespace, container_name, init_photo_container, labels, env_vars=template_env_vars))
+            with self._job_templates_lock:
+                self._job_templates[key] = template
+                while len(self._job_templates) > int(settings.K8S_JOB_TEMPLATE_CACHE_SIZE):
+                    self._job_templates.popitem(last=False)
+
+        body = copy.deepcopy(template)
+        body["metadata"]["name"] = name
+        if "name" not in (labels or {}):
+            body["metadata"]["labels"]["name"] = name
+        pod_spec = body["spec"]["template"]["spec"]
+        for env_var in pod_spec["containers"][0].get("env", []):
+            if env_var["name"] == "BATCH_IDS":
+                env_var["value"] = batch_ids
+        for init_container in pod_spec.get("initContainers", []):
+            init_container["args"] = ["--batch=" + batch_ids if arg == "--batch=" else arg for arg in init_container.get("args", [])]
         return body
 
     def get_shared_volume_mount(self):
@@ -293,19 +441,21 @@ class JobScheduler(object):
         If you get an error on this call don't proceed. Something is wrong on
         your connectivty to k8s API.
         Check Credentials, permissions, keys, etc.
+        The call gives up after `settings.K8S_STARTUP_TIMEOUT` seconds.
         Docs: https://cloud.google.com/docs/authentication/
         """
         try:
-            api_response = self.api_instance.get_api_resources()
+            self.api_instance.get_api_resources(_request_timeout=float(settings.K8S_STARTUP_TIMEOUT))
             logging.info("Connected to k8s using credentials!")
         except ApiException as e:
-            logging.debug(
+            logging.warning(
                 "Test k8s credentials failed.",
                 extra={
-                    "response": api_response,
-                    "exception": e
+                    "exception": str(e)
                 }
             )
+        except Exception as e:
+            logging.warning("Could not reach k8s to test the credentials", extra={"exception": str(e)})
     def kube_create_job(
         self,
         job_name,
@@ -316,7 +466,7 @@ class JobScheduler(object):
         labels={}
     ):
         # Create the job
-        body = self.kube_create_job_object(
+        body = self.kube_job_body(
             job_name,
             container_image,
             namespace,
@@ -325,28 +475,108 @@ class JobScheduler(object):
             labels,
             env_vars=env
         )
-        api_response = None
-        try:
-            api_response = self.api_instance.create_namespaced_job(
-                namespace, body, pretty=True)
-        except ApiException as e:
-            logging.debug(
-                "Exception when calling BatchV1Api->create_namespaced_job",
-                extra={
-                    "exception": e,
-                }
-            )
-            jsonException = json.loads(e.body)
+        max_retries = int(settings.K8S_SUBMIT_MAX_RETRIES)
+        for attempt in range(max_retries + 1):
+            self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                return self.api_instance.create_namespaced_job(
+                    namespace, body)
+            except ApiException as e:
+                reason, message, retry = self._on_create_error(job_name, e, attempt == max_retries)
+                if e.status == 409:
+                    return reason
+                if not retry:
+                    raise JobCreationError(job_name, reason, message, e.status in RETRY_STATUS_CODES) from e
+                retry_after = (e.headers or {}).get("Retry-After")
+            except Exception as e:
+                # Connection errors
+                if attempt == max_retries:
+                    raise
+                message = str(e)
+            delay = self.get_submit_backoff(attempt + 1, retry_after)
+            logging.warning("Retrying to create job %s in %.1f seconds", job_name, delay,
+                            extra={"job_name": job_name, "attempt": attempt, "exception": message})
+            time.sleep(delay)
+
+    def _on_create_error(self, job_name, e, last_attempt):
+        """
+        Logs an API error of a job create. A job that exists already (409) counts as created and is not retried.
+        :return: The reason and message of the error, and whether the create should be retried.
+        """
+        logging.debug(
+            "Exception when calling BatchV1Api->create_namespaced_job",
+            extra={
+                "exception": e,
+            }
+        )
+        reason, message = self._get_api_error(e)
+        if e.status == 409:
+            # An earlier try or another worker created the job already, which is all we wanted
+            logging.info("k8s job %s already exists", job_name, extra={"job_name": job_name})
+            return reason, message, False
+        if e.status not in RETRY_STATUS_CODES or last_attempt:
             logging.info(
-                "Could not create job %s . k8s errormessage: %s", job_name,jsonException["message"],
+                "Could not create job %s . k8s errormessage: %s", job_name, message,
                 extra={}
             )
-            return jsonException["reason"]
-        return api_response
+            return reason, message, False
+        return reason, message, True
+
+    def kube_submit_job(self, job_name, namespace, env, container_image, init_photo_container=False, labels={}):
+        """
+        Creates a job like `kube_create_job` on the pool of `settings.K8S_SUBMIT_WORKERS` submission workers, so a
+        backlog of jobs is submitted concurrently, within the rate limit of `self.rate_limiter`.
+        :return: A future with the result of `kube_create_job`, or the `JobCreationError` k8s refused the job with.
+        """
+        return self._submit_executor.submit(self.kube_create_job, job_name, namespace, env, container_image,
+                                            init_photo_container=init_photo_container, labels=labels)
+
+    @staticmethod
+    def get_submit_backoff(retries, retry_after=None):
+        """
+        Returns how many seconds to wait before a retry, exponential with jitter, but at least what the API server
+        asked for in a Retry-After header.
+        """
+        backoff = min(float(settings.K8S_SUBMIT_BACKOFF_BASE) * 2 ** (retries - 1), float(settings.K8S_SUBMIT_BACKOFF_MAX))
+        backoff *= random.uniform(0.5, 1)
+        try:
+            return max(backoff, float(retry_after)) if retry_after is not None else backoff
+        except ValueError:
+            return backoff
+
+    @staticmethod
+    def _get_api_error(e):
+        try:
+            error = json.loads(e.body)
+            return error["reason"], error["message"]
+        except (TypeError, ValueError, KeyError):
+            return e.reason, str(e)
 
     def kube_delete_job(self, job_name,namespace):
+        """
+        Deletes a k8s job in the background, at most `settings.K8S_DELETE_WORKERS` deletes run at the same time. The
+        job counts as gone for `kube_does_job_exist` right away, use `kube_wait_for_job_deletion` to wait until k8s
+        has really removed it.
+        :return: A future which is done once k8s accepted the delete.
+        """
         logging.info("Deleting k8s job '%s'", job_name,
                      extra={})
+        with self._deletions_lock:
+            # Forget deletions k8s never confirmed (e.g. the DELETED event was missed), by now the TTL has removed them
+            expired = time.monotonic() - int(settings.K8S_JOB_TTL_SECONDS)
+            for key in [key for key, (_, started) in self._deletions.items() if started < expired]:
+                del self._deletions[key]
+            self._deletions.setdefault((namespace, job_name), (threading.Event(), time.monotonic()))
+        if namespace == self.job_informer.namespace:
+            self.job_informer.forget(job_name)
+        return self._submit_delete(job_name, namespace)
+
+    def _submit_delete(self, job_name, namespace):
+        return self._delete_executor.submit(self._kube_delete_job, job_name, namespace)
+
+    def _kube_delete_job(self, job_name, namespace):
+        self.rate_limiter.acquire()
         try:
             self.api_instance.delete_namespaced_job(
                 job_name,
@@ -355,36 +585,107 @@ class JobScheduler(object):
                 propagation_policy='Background'
             )
         except ApiException as e:
-            logging.debug(
-                "Exception when calling BatchV1Api->delete_namespaced_job",
-                extra={
-                    "exception": e,
-                }
-            )
-            jsonException = json.loads(e.body)
-            logging.info(
-                "Could not delete job %s. Maybe it was already deleted?", job_name,
-                extra={"exception": jsonException["message"]}
-            )
-        # make sure job is marked for deletion in the k8s cluster
-        time.sleep(1)
+            self._on_delete_error(job_name, namespace, e)
+        except Exception as e:
+            logging.error("Could not delete job %s", job_name, extra={"exception": str(e)})
 
-    def kube_does_job_exist(self,name,namespace):
+    def _on_delete_error(self, job_name, namespace, e):
+        logging.debug(
+            "Exception when calling BatchV1Api->delete_namespaced_job",
+            extra={
+                "exception": e,
+            }
+        )
+        if e.status == 404:
+            self._on_job_deleted(namespace, job_name)
         try:
-            job = self.api_instance.read_namespaced_job(name,namespace)
-            if job:
-                return True
-        except ApiException:
-            return False
+            message = json.loads(e.body)["message"]
+        except (TypeError, ValueError, KeyError):
+            message = str(e)
+        logging.info(
+            "Could not delete job %s. Maybe it was already deleted?", job_name,
+            extra={"exception": message}
+        )
 
-    def kube_does_job_exist(self,name,namespace):
+    def _on_job_event(self, event):
+        if event['type'] == "DELETED":
+            self._on_job_deleted(self.job_informer.namespace, event['object'].metadata.name)
+
+    def _on_job_deleted(self, namespace, job_name):
+        with self._deletions_lock:
+            deleted = self._deletions.pop((namespace, job_name), None)
+        if deleted is not None:
+            deleted[0].set()
+
+    def kube_wait_for_job_deletion(self, job_name, namespace, timeout=None):
+        """
+        Waits until k8s has removed a job deleted with `kube_delete_job`. The DELETED event of the job informer is
+        used when the informer is running, otherwise k8s is polled.
+        :return: True if the job is gone, False if it still exists after `timeout` seconds.
+        """
+        with self._deletions_lock:
+            deleted = self._deletions.get((namespace, job_name))
+        if deleted is None:
+            return True
+        if self.job_informer.has_synced() and namespace == self.job_informer.namespace:
+            return deleted[0].wait(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._job_exists_on_k8s(job_name, namespace):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(float(settings.K8S_DELETE_POLL_INTERVAL))
+        self._on_job_deleted(namespace, job_name)
+        return True
+
+    def _job_exists_on_k8s(self, name, namespace):
         try:
-            job = self.api_instance.read_namespaced_job(name,namespace)
-            if job:
-                return True
+            self.api_instance.read_namespaced_job(name, namespace)
+            return True
         except ApiException:
             return False
 
+    def _get_cached_job(self, name, namespace):
+        """
+        Returns whether the job informer can answer for the namespace, and the cached job (None if it doesn't exist).
+        Jobs that are being deleted count as gone.
+        """
+        if not self.job_informer.has_synced() or namespace != self.job_informer.namespace:
+            return False, None
+        job = self.job_informer.get(name)
+        if job is not None and job.metadata.deletion_timestamp is not None:
+            job = None
+        return True, job
+
+    def kube_list_jobs(self, namespace, label_selector="name"):
+        """
+        Lists the jobs of a namespace from the API server, page by page. Unlike the informer this always is a fresh
+        view of the cluster, for reconciling with the database. By default only jobs with a `name` label are
+        listed, which Hydra puts on all its jobs.
+        :return: A dict of the jobs by name.
+        """
+        jobs = {}
+        _continue = None
+        while True:
+            self.rate_limiter.acquire()
+            job_list = self.api_instance.list_namespaced_job(
+                namespace, label_selector=label_selector, limit=int(settings.WATCH_K8S_LIST_PAGE_SIZE), _continue=_continue,
+                _headers=self.list_headers)
+            for job in job_list.items:
+                jobs[job.metadata.name] = job
+            _continue = job_list.metadata._continue
+            if not _continue:
+                break
+        return jobs
+
+    def kube_does_job_exist(self,name,namespace):
+        cached, job = self._get_cached_job(name, namespace)
+        if cached:
+            return job is not None
+        with self._deletions_lock:
+            if (namespace, name) in self._deletions:
+                return False
+        return self._job_exists_on_k8s(name, namespace)
+
     def kube_get_job_status(self, name, namespace):
         """
         Returns the status of a k8s job.
@@ -392,17 +693,18 @@ class JobScheduler(object):
         :param namespace: the namespace for the k8s job. Most likely 'processing'
         :return: None or 1 depending the state of the job.
         """
-        api_response = None
-        try:
-            api_response = self.api_instance.read_namespaced_job_status(
-                name, namespace, pretty=True)
-        except ApiException as e:
-            logging.warning(
-                "Exception when calling BatchV1Api->read_namespaced_job_status",
-                extra={
-                    "exception": e,
-                }
-            )
+        cached, api_response = self._get_cached_job(name, namespace)
+        if not cached:
+            try:
+                api_response = self.api_instance.read_namespaced_job_status(
+                    name, namespace)
+            except ApiException as e:
+                logging.warning(
+                    "Exception when calling BatchV1Api->read_namespaced_job_status",
+                    extra={
+                        "exception": e,
+                    }
+                )
         # json_api_response = json.loads(api_response)
         try:
             V1JobStatus = api_response.status
@@ -1,5 +1,5 @@
+import datetime as dt
 import logging
-import time
 
 from django.conf import settings
 from distutils import util
@@ -9,108 +9,153 @@ from kubernetes import client, config, utils, watch
 import kubernetes.client
 from kubernetes.client.models.v1_job import V1Job
 from kubernetes.client.rest import ApiException
-from urllib3.exceptions import InvalidChunkLength
 
 from api.models import Batch_Job
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections
 from hydra.jobmanager import jobmanager
 
 
 class JobWatcher():
+    """
+    Moves `Batch_Job`s through their lifecycle by following the events of the job informer of the job scheduler.
+    Pod lookups are answered from the pod informer once it has synced.
+
+    The informer thread only queues the events, a pool of workers handles them. While an event of a job waits in
+    the queue, newer events of the same job replace it, so only the latest state of the job is handled, and a job is
+    never handled by two workers at once.
+    """
     def __init__(self, jobscheduler, api_instance, core_api_instance):
         self.jobscheduler = jobscheduler
         self.api_instance = api_instance
         self.core_api_instance = core_api_instance
         self.watch_namespace = settings.WATCH_K8S_NAMESPACE
-        # Watch k8s
-        if hasattr(settings, "WATCH_K8S"):
-            WATCH_K8S = util.strtobool(str(settings.WATCH_K8S))
-            if (WATCH_K8S):
-                thread = threading.Thread(target=self.watch_jobs_events, args=())
-                thread.daemon = True
-                thread.start()
-
-    def watch_jobs_events(self):
-        watch_params = {
-            "namespace": self.watch_namespace,
-            "timeout_seconds": settings.WATCH_K8S_TIMEOUT,
-            "_request_timeout": settings.WATCH_K8S_REQUEST_TIMEOUT,
-            "pretty": True
-         }
-        watch_namespace = watch_params["namespace"]
-        # This isnt the most elegant, but sometimes it seems that w.stream() looses connection to the k8s cluster and
-        # raised InvalidChunkLength exception. Catching this here and then restarting the for-loop
-        # more info here: https://github.com/kubernetes-client/python/issues?q=invalid+literal+for+int%28%29+with+base+16%3A+b%27
-        self.jobmanager = jobmanager.JobManager()
+        self.jobmanager = None
+        self.queue_size = int(settings.WATCH_K8S_QUEUE_SIZE)
+        self._pending = {}
+        self._in_progress = set()
+        self._queue_changed = threading.Condition()
+        self._started = False
+
+    def start(self):
+        """
+        Starts the workers and the informers, if `settings.WATCH_K8S` is on. Only the process that holds the
+        controller lock watches k8s (see the `run_hydra_controller` command), so the events are handled once.
+        """
+        if self._started or not util.strtobool(str(getattr(settings, "WATCH_K8S", False))):
+            return
+        self._started = True
+        for _ in range(int(settings.WATCH_K8S_WORKERS)):
+            thread = threading.Thread(target=self.handle_events, args=())
+            thread.daemon = True
+            thread.start()
+        self.jobscheduler.job_informer.add_handler(self.enqueue_event)
+        self.jobscheduler.pod_informer.start()
+        self.jobscheduler.job_informer.start()
+
+    def enqueue_event(self, event):
+        """
+        Queues a job event for the workers. If the job already has an event waiting, the new event replaces it (as a
+        MODIFIED event if either of them was one, so the status of the job is still looked at). Blocks while the queue
+        is full, which holds back the watch instead of growing without bounds.
+        """
+        if event['type'] not in ("ADDED", "MODIFIED"):
+            return
+        job_name = event['object'].metadata.name
+        with self._queue_changed:
+            while job_name not in self._pending and len(self._pending) >= self.queue_size:
+                self._queue_changed.wait()
+            pending = self._pending.get(job_name)
+            if pending is not None and pending['type'] == "MODIFIED":
+                event = {"type": "MODIFIED", "object": event['object']}
+            self._pending[job_name] = event
+            self._queue_changed.notify_all()
+
+    def take_event(self, block=True):
+        """
+        Takes the oldest waiting event of a job that no worker is busy with, and marks the job as in progress.
+        :return: The event, or None if there is none and `block` is False.
+        """
+        with self._queue_changed:
+            while True:
+                job_name = next((name for name in self._pending if name not in self._in_progress), None)
+                if job_name is not None or not block:
+                    break
+                self._queue_changed.wait()
+            if job_name is None:
+                return None
+            self._in_progress.add(job_name)
+            self._queue_changed.notify_all()
+            return self._pending.pop(job_name)
+
+    def finish_event(self, event):
+        with self._queue_changed:
+            self._in_progress.discard(event['object'].metadata.name)
+            self._queue_changed.notify_all()
+
+    def handle_events(self):
         while True:
-            logging.info("Watching k8s for job updates in '%s' namespace", watch_namespace,extra={"watch_params": json.dumps(watch_params)})
-            w = watch.Watch()
-            job_events_stream = w.stream(self.api_instance.list_namespaced_job, **watch_params)
+            event = self.take_event()
             try:
-                for event in job_events_stream:
-                    job_name = event['object'].metadata.name
-                    resource_version = event['object'].metadata.resource_version
-                    #logging.info("Event: %s %s %s status: %s" % (event['type'], event['object'].kind, job_name, event["object"].status.active))
-                    batch_job_id = job_name.split("-")[-1]
-                    try:
-                        batch_job = Batch_Job.objects.get(id=batch_job_id)
-                    except ObjectDoesNotExist:
-                        logging.info("Batch_Job with id: '%s' does not exists in the database", str(batch_job_id))
-                        continue
-                    batch_ids = [str(b.batch_id) for b in batch_job.batches.all()]
-                    if event['type'] == "ADDED":
-                        # make sure we only do this a single time
-                        if batch_job.started == False:
-                            self.job_is_created(job_name, batch_job, batch_job_id,batch_ids)
-                    elif event['type'] == "MODIFIED":
-                        # if job is still running but failing
-                        if event["object"].status.failed == None:
-                            event["object"].status.failed = 0
-                        # The job is created on k8s but not able to start or restarts
-                        if event["object"].status.active == 1 and event["object"].status.failed > 0:
-                            self.job_is_failing(event, job_name, batch_job, batch_job_id, batch_ids)
-                        elif event["object"].status.active == 1 and event["object"].status.succeeded == None:
-                            self.job_is_running(event, job_name, batch_job, batch_job_id, batch_ids)
-                        # if job is inactive (done running) and succeded and exists in k8s (sometimes the same k8s event is raised twice)
-                        elif event["object"].status.active == None and event["object"].status.succeeded == 1 and self.jobscheduler.kube_does_job_exist(job_name,watch_namespace):
-                            self.job_is_completed(event,job_name,batch_job,batch_job_id,batch_ids)
-            except ValueError as e:
-                logging.error("lost connection to k8s, due to 'ValueError', restarting k8s watcher",
-                  extra={
-                      "exception": str(e),
-                      "batch_job_id": batch_job_id if batch_job_id is not None else "None",
-                      "k8s_resource_version": resource_version
-                    }
-                  )
-            except InvalidChunkLength as e:
-                logging.error("lost connection to k8s, due to 'InvalidChunkLength', restarting k8s watcher",
-                  extra={
-                      "exception": str(e),
-                      "batch_job_id": batch_job_id if batch_job_id is not None else "None",
-                      "k8s_resource_version": resource_version
-                    }
-                  )
+                self.handle_event(event)
             except Exception as e:
-                logging.error("lost connection to k8s, due to 'Exception', restarting k8s watcher",
-                  extra={
-                      "exception": str(e),
-                      "batch_job_id": batch_job_id if batch_job_id is not None else "None",
-                      "k8s_resource_version": resource_version
-                    }
-                )
+                logging.error("Failed to handle k8s job event",
+                              extra={"exception": str(e), "event_type": event['type'], "job_name": event['object'].metadata.name})
             finally:
-                # we delete these two, to make sure we get a new connection to the k8s cluster
-                del w
-                del job_events_stream
-                time.sleep(2)
-
+                # Workers are long-lived threads, so they have to drop broken or expired db connections themselves
+                close_old_connections()
+                self.finish_event(event)
 
+    def handle_event(self, event):
+        if event['type'] not in ("ADDED", "MODIFIED"):
+            return
+        if self.jobmanager is None:
+            self.jobmanager = jobmanager.JobManager()
+        job_name = event['object'].metadata.name
+        batch_job_id = job_name.split("-")[-1]
+        if not batch_job_id.isdigit():
+            logging.debug("Ignoring k8s job '%s', it was not created by Hydra", job_name)
+            return
+        try:
+            batch_job = Batch_Job.objects.select_related('job_spec__job_definition').get(id=batch_job_id)
+        except ObjectDoesNotExist:
+            logging.info("Batch_Job with id: '%s' does not exists in the database", str(batch_job_id))
+            return
+        batch_ids = [str(b.batch_id) for b in batch_job.batches.all()]
+        # Any event means the job exists on k8s. An ADDED event may have been merged into a later MODIFIED one.
+        # make sure we only do this a single time
+        if batch_job.state == Batch_Job.SCHEDULED:
+            self.job_is_created(job_name, batch_job, batch_job_id, batch_ids)
+        if event['type'] == "MODIFIED":
+            # if job is still running but failing
+            if event["object"].status.failed == None:
+                event["object"].status.failed = 0
+            # The job is created on k8s but not able to start or restarts
+            if event["object"].status.active == 1 and event["object"].status.failed > 0:
+                self.job_is_failing(event, job_name, batch_job, batch_job_id, batch_ids)
+            elif event["object"].status.active == 1 and event["object"].status.succeeded == None:
+                self.job_is_running(event, job_name, batch_job, batch_job_id, batch_ids)
+            # if job is inactive (done running) and succeded and exists in k8s (sometimes the same k8s event is raised twice)
+            elif event["object"].status.active == None and event["object"].status.succeeded == 1 and self.jobscheduler.kube_does_job_exist(job_name, self.watch_namespace):
+                self.job_is_completed(event, job_name, batch_job, batch_job_id, batch_ids)
+            # k8s gave up on the job, it keeps its slot until it is marked as failed
+            elif not event["object"].status.active and batch_job.state in Batch_Job.IN_FLIGHT_STATES and \
+                    jobmanager.JobManager.has_k8s_job_failed(event["object"].status):
+                self.job_has_failed(event, job_name, batch_job, batch_job_id, batch_ids)
 
     def get_namespaced_pod_name(self, namespace, label_selector):
         pod_name = None
         logging.debug("Looking for pod in %s namespace with label-selector '%s'", namespace, label_selector)
+        pod_informer = self.jobscheduler.pod_informer
+        label, _, value = label_selector.partition("=")
+        if pod_informer.has_synced() and namespace == pod_informer.namespace and label in pod_informer.index_labels:
+            pods = pod_informer.get_by_label(label, value)
+            if pods:
+                # The newest pod is the one of the latest try
+                pod_name = max(pods, key=lambda pod: pod.metadata.creation_timestamp or dt.datetime.min.replace(tzinfo=dt.timezone.utc)).metadata.name
+            return pod_name
         try:
-            api_response = self.core_api_instance.list_namespaced_pod(namespace, pretty=True, label_selector=label_selector)
+            api_response = self.core_api_instance.list_namespaced_pod(namespace, label_selector=label_selector)
             pod_name = api_response.items[0].metadata.name
         except ApiException as e:
             print("Exception when calling CoreV1Api->list_namespaced_pod: '%s'\n" % e)
@@ -119,8 +164,12 @@ class JobWatcher():
 
     def get_pod_status(self, name, namespace):
         pod_status = None
+        pod_informer = self.jobscheduler.pod_informer
+        if pod_informer.has_synced() and namespace == pod_informer.namespace:
+            pod = pod_informer.get(name)
+            return pod.status.phase if pod is not None and pod.status is not None else None
         try:
-            api_response = self.core_api_instance.read_namespaced_pod_status(name, namespace, pretty=True)
+            api_response = self.core_api_instance.read_namespaced_pod_status(name, namespace)
             pod_status = api_response.status.phase
         except ApiException as e:
             print("Exception when calling CoreV1Api->read_namespaced_pod_status: '%s'\n" % e)
@@ -147,6 +196,15 @@ class JobWatcher():
                                "batches": batch_ids})
         self.jobmanager.on_job_failure(batch_job, pod_failure_count)
 
+    def job_has_failed(self, event, job_name, batch_job, batch_job_id, batch_ids):
+        pod_failure_count = event["object"].status.failed
+        logging.error("Hydra k8s job failed: '%s'", job_name,
+                      extra={"batch_job_id": batch_job_id,
+                             "job_name": job_name,
+                             "pod_failures": str(pod_failure_count),
+                             "batches": batch_ids})
+        self.jobmanager.on_job_failure(batch_job, pod_failure_count, terminal=True)
+
     def job_is_running(self,event, job_name, batch_job, batch_job_id, batch_ids):
         # set the job to be started
         start_time = event["object"].metadata.creation_timestamp
@@ -164,4 +222,5 @@ class JobWatcher():
                             "completion_time": completion_time,
                             "batches": batch_ids})
         self.jobmanager.on_job_success(batch_job)
-        self.jobscheduler.kube_delete_job(job_name, self.watch_namespace)
\ No newline at end of file
+        if util.strtobool(str(settings.K8S_DELETE_SUCCEEDED_JOBS)):
+            self.jobscheduler.kube_delete_job(job_name, self.watch_namespace)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    A client-side rate limit for calls to the k8s API, shared by all threads of the process. Tokens are added at
+    `rate` per second up to `burst`, and every call takes one. This keeps bursts of job submissions within what the
+    API server's priority and fairness lets through, instead of having them rejected with 429.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting until one is available. A rate of 0 (or less) turns the limit off.
+        """
+        wait = self._take()
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+    async def acquire_async(self):
+        """
+        Like `acquire`, but waits without blocking the event loop.
+        """
+        wait = self._take()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self._take()
+
+    def _take(self):
+        """
+        Takes a token if one is available.
+        :return: 0 if a token was taken, otherwise how many seconds to wait for the next one.
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import TestCase, override_settings
+from kubernetes.client import V1Job, V1JobList, V1ListMeta, V1ObjectMeta
+
+from hydra.jobscheduler import asyncjobscheduler
+from hydra.jobscheduler.asyncjobscheduler import AsyncInformer, AsyncJobScheduler
+from hydra.jobscheduler.jobscheduler import JobCreationError, JobScheduler, get_job_scheduler
+
+if asyncjobscheduler.async_client is not None:
+    from kubernetes_asyncio.client.exceptions import ApiException as AsyncApiException
+
+
+def make_job(name):
+    return V1Job(metadata=V1ObjectMeta(name=name, labels={"name": name}))
+
+
+@unittest.skipIf(asyncjobscheduler.async_client is None, "kubernetes_asyncio is not installed")
+@override_settings(WATCH_K8S=False, WATCH_K8S_NAMESPACE="processing", K8S_SUBMIT_MAX_RETRIES=2, K8S_API_QPS=0)
+@patch('hydra.jobscheduler.asyncjobscheduler.async_client.CoreV1Api')
+@patch('hydra.jobscheduler.asyncjobscheduler.async_client.BatchV1Api')
+class TestAsyncJobScheduler(TestCase):
+
+    def setUp(self):
+        AsyncJobScheduler._instance = None
+
+    def tearDown(self):
+        if AsyncJobScheduler._instance is not None:
+            AsyncJobScheduler._instance.close()
+        AsyncJobScheduler._instance = None
+
+    def test_is_selected_by_settings(self, batch_api_mock, core_api_mock):
+        with override_settings(K8S_JOB_SCHEDULER_BACKEND="async"):
+            jobscheduler = get_job_scheduler()
+        self.assertIsInstance(jobscheduler, AsyncJobScheduler)
+        self.assertIsNot(JobScheduler._instance, jobscheduler)
+        with self.assertRaises(ValueError):
+            get_job_scheduler("threads")
+
+    @patch('hydra.jobscheduler.asyncjobscheduler.AsyncJobScheduler.get_submit_backoff', return_value=0)
+    def test_submit_retries_when_throttled(self, backoff_mock, batch_api_mock, core_api_mock):
+        create_mock = batch_api_mock.return_value.create_namespaced_job = AsyncMock(
+            side_effect=[AsyncApiException(status=429, reason="Too Many Requests"), "created"])
+        jobscheduler = AsyncJobScheduler()
+        with patch.object(jobscheduler, 'kube_job_body', return_value={}):
+            submission = jobscheduler.kube_submit_job("hydra-job-1", "processing", {"BATCH_IDS": "a"}, "image")
+            self.assertEqual(submission.result(timeout=1), "created")
+        self.assertEqual(create_mock.await_count, 2)
+
+    def test_submit_completes_off_the_loop(self, batch_api_mock, core_api_mock):
+        batch_api_mock.return_value.create_namespaced_job = AsyncMock(
+            side_effect=AsyncApiException(status=422, reason="Unprocessable Entity"))
+        jobscheduler = AsyncJobScheduler()
+        callback_loops = []
+        with patch.object(jobscheduler, 'kube_job_body', return_value={}):
+            submission = jobscheduler.kube_submit_job("hydra-job-1", "processing", {"BATCH_IDS": "a"}, "image")
+            submission.add_done_callback(lambda submission: callback_loops.append(asyncjobscheduler._running_loop()))
+            with self.assertRaises(JobCreationError):
+                submission.result(timeout=1)
+        self.assertEqual(callback_loops, [None])
+
+    def test_delete_runs_on_the_loop(self, batch_api_mock, core_api_mock):
+        delete_mock = batch_api_mock.return_value.delete_namespaced_job = AsyncMock(
+            side_effect=AsyncApiException(status=404, reason="Not Found"))
+        jobscheduler = AsyncJobScheduler()
+        jobscheduler.kube_delete_job("hydra-job-1", "processing").result(timeout=1)
+        delete_mock.assert_awaited_once()
+        # k8s did not know the job, so its deletion is done
+        self.assertTrue(jobscheduler.kube_wait_for_job_deletion("hydra-job-1", "processing", timeout=0))
+
+    def test_blocking_calls_raise_sync_api_errors(self, batch_api_mock, core_api_mock):
+        batch_api_mock.return_value.read_namespaced_job = AsyncMock(
+            side_effect=AsyncApiException(status=404, reason="Not Found"))
+        jobscheduler = AsyncJobScheduler()
+        self.assertFalse(jobscheduler.kube_does_job_exist("hydra-job-1", "processing"))
+
+
+@unittest.skipIf(asyncjobscheduler.async_client is None, "kubernetes_asyncio is not installed")
+@override_settings(WATCH_K8S_LIST_PAGE_SIZE=2)
+class TestAsyncInformer(TestCase):
+
+    def test_relist_pages_and_dispatches(self):
+        list_func = AsyncMock(side_effect=[
+            V1JobList(items=[make_job("hydra-job-1"), make_job("hydra-job-2")],
+                      metadata=V1ListMeta(_continue="next", resource_version="5")),
+            V1JobList(items=[make_job("hydra-job-3")], metadata=V1ListMeta(resource_version="7")),
+        ])
+        loop = asyncio.new_event_loop()
+        informer = AsyncInformer(loop, list_func, "processing", "jobs", index_labels=("name",))
+        handler = MagicMock()
+        informer.add_handler(handler)
+        try:
+            self.assertEqual(loop.run_until_complete(informer.relist()), "7")
+        finally:
+            loop.close()
+        self.assertTrue(informer.has_synced())
+        self.assertEqual(len(informer.list()), 3)
+        self.assertEqual([job.metadata.name for job in informer.get_by_label("name", "hydra-job-2")], ["hydra-job-2"])
+        self.assertEqual(handler.call_count, 3)
+        self.assertEqual(list_func.await_args_list[1].kwargs["_continue"], "next")
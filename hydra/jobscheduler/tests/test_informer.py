@@ -0,0 +1,101 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from kubernetes.client import V1Job, V1JobList, V1ListMeta, V1ObjectMeta
+from kubernetes.client.rest import ApiException
+
+from hydra.jobscheduler.informer import Informer
+
+
+class StopWatching(Exception):
+    pass
+
+
+def make_job(name, resource_version, labels=None):
+    return V1Job(metadata=V1ObjectMeta(name=name, resource_version=resource_version, labels=labels))
+
+
+@patch('hydra.jobscheduler.informer.watch.Watch')
+class TestInformer(TestCase):
+
+    def setUp(self):
+        self.list_func = MagicMock()
+        self.informer = Informer(self.list_func, "processing", "jobs", index_labels=("name",))
+        self.handler = MagicMock()
+        self.informer.add_handler(self.handler)
+        self.informer.resource_version = "100"
+
+    def test_stream_resumes_from_resource_version(self, watch_mock):
+        watch_mock.return_value.stream.return_value = [
+            {"type": "ADDED", "object": make_job("hydra-job-1", "101", {"name": "hydra-job-1"})},
+            {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "105"}}},
+        ]
+        self.informer.stream()
+        stream_kwargs = watch_mock.return_value.stream.call_args.kwargs
+        self.assertEqual(stream_kwargs["resource_version"], "100")
+        self.assertTrue(stream_kwargs["allow_watch_bookmarks"])
+        self.assertEqual(self.informer.resource_version, "105")
+        self.handler.assert_called_once()
+        self.assertEqual(self.informer.get_by_label("name", "hydra-job-1")[0].metadata.name, "hydra-job-1")
+
+    def test_stream_keeps_store_up_to_date(self, watch_mock):
+        watch_mock.return_value.stream.return_value = [
+            {"type": "ADDED", "object": make_job("hydra-job-1", "101", {"name": "a"})},
+            {"type": "MODIFIED", "object": make_job("hydra-job-1", "102", {"name": "b"})},
+            {"type": "ADDED", "object": make_job("hydra-job-2", "103", {"name": "b"})},
+            {"type": "DELETED", "object": make_job("hydra-job-2", "104", {"name": "b"})},
+        ]
+        self.informer.stream()
+        self.assertEqual(self.informer.get("hydra-job-1").metadata.resource_version, "102")
+        self.assertIsNone(self.informer.get("hydra-job-2"))
+        self.assertEqual(self.informer.get_by_label("name", "a"), [])
+        self.assertEqual([job.metadata.name for job in self.informer.get_by_label("name", "b")], ["hydra-job-1"])
+
+    def test_failing_handler_does_not_stop_stream(self, watch_mock):
+        watch_mock.return_value.stream.return_value = [
+            {"type": "ADDED", "object": make_job("hydra-job-1", "101")},
+            {"type": "ADDED", "object": make_job("hydra-job-2", "102")},
+        ]
+        self.handler.side_effect = [Exception("db is gone"), None]
+        self.informer.stream()
+        self.assertEqual(self.handler.call_count, 2)
+        self.assertEqual(self.informer.resource_version, "102")
+
+    @override_settings(WATCH_K8S_LIST_PAGE_SIZE=1)
+    def test_relist_pages_through_objects(self, watch_mock):
+        self.informer.stream = MagicMock()
+        self.list_func.side_effect = [
+            V1JobList(items=[make_job("hydra-job-1", "90")], metadata=V1ListMeta(_continue="next", resource_version="120")),
+            V1JobList(items=[make_job("hydra-job-2", "95")], metadata=V1ListMeta(resource_version="120")),
+        ]
+        self.assertFalse(self.informer.has_synced())
+        self.assertEqual(self.informer.relist(), "120")
+        self.assertTrue(self.informer.has_synced())
+        self.assertEqual([c.args[0]["type"] for c in self.handler.call_args_list], ["ADDED", "ADDED"])
+        self.assertEqual(self.list_func.call_args.kwargs["_continue"], "next")
+        self.assertEqual(len(self.informer.list()), 2)
+
+    def test_relist_drops_deleted_objects(self, watch_mock):
+        self.informer._put(make_job("hydra-job-1", "90"))
+        self.list_func.return_value = V1JobList(items=[], metadata=V1ListMeta(resource_version="120"))
+        self.informer.relist()
+        self.assertIsNone(self.informer.get("hydra-job-1"))
+        self.assertEqual(self.handler.call_args.args[0]["type"], "DELETED")
+
+    @patch('hydra.jobscheduler.informer.time.sleep', side_effect=[None, StopWatching])
+    def test_gone_relists_once(self, sleep_mock, watch_mock):
+        self.informer.resource_version = None
+        with patch.object(Informer, 'relist', return_value="200") as relist_mock, \
+                patch.object(Informer, 'stream', side_effect=[ApiException(status=410), None]):
+            with self.assertRaises(StopWatching):
+                self.informer.run()
+        # once at startup and once after the 410
+        self.assertEqual(relist_mock.call_count, 2)
+        # the 410 is not a failure, so the watch is resumed without backing off
+        self.assertEqual([c.args[0] for c in sleep_mock.call_args_list], [0, 0])
+
+    @override_settings(WATCH_K8S_BACKOFF_BASE=1, WATCH_K8S_BACKOFF_MAX=8)
+    def test_backoff(self, watch_mock):
+        self.assertEqual(self.informer.get_backoff(0), 0)
+        self.assertTrue(2 <= self.informer.get_backoff(3) <= 4)
+        self.assertTrue(4 <= self.informer.get_backoff(10) <= 8)
@@ -0,0 +1,191 @@
+import socket
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from kubernetes.client import V1Job, V1JobList, V1JobStatus, V1ListMeta, V1ObjectMeta
+from kubernetes.client.api_client import ApiClient as RealApiClient
+from kubernetes.client.rest import ApiException
+
+from hydra.jobscheduler.jobscheduler import JobCreationError, JobScheduler
+from hydra.jobscheduler.ratelimit import TokenBucket
+
+
+def make_job(name, succeeded=None):
+    return V1Job(metadata=V1ObjectMeta(name=name), status=V1JobStatus(succeeded=succeeded))
+
+
+@override_settings(WATCH_K8S=False, WATCH_K8S_NAMESPACE="processing")
+class JobSchedulerTestCase(TestCase):
+    """
+    Creates a fresh `JobScheduler` singleton per test, with the k8s API classes mocked out as `self.batch_api_mock`,
+    `self.core_api_mock` and `self.api_client_mock`. Subclasses override the settings they need on top.
+    """
+
+    def setUp(self):
+        JobScheduler._instance = None
+        self.batch_api_mock = self.start_patch('hydra.jobscheduler.jobscheduler.kubernetes.client.BatchV1Api')
+        self.core_api_mock = self.start_patch('hydra.jobscheduler.jobscheduler.kubernetes.client.CoreV1Api')
+        self.api_client_mock = self.start_patch('hydra.jobscheduler.jobscheduler.kubernetes.client.ApiClient')
+
+    def tearDown(self):
+        JobScheduler._instance = None
+
+    def start_patch(self, target):
+        patcher = patch(target)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+
+@override_settings(K8S_DELETE_WORKERS=8)
+class TestJobSchedulerDeletion(JobSchedulerTestCase):
+
+    def test_delete_does_not_block(self):
+        release = threading.Event()
+        self.batch_api_mock.return_value.delete_namespaced_job.side_effect = lambda *args, **kwargs: release.wait(5)
+        jobscheduler = JobScheduler()
+        deletion = jobscheduler.kube_delete_job("hydra-job-1", "processing")
+        # the delete call is still held up on k8s, but the job counts as gone right away
+        self.assertFalse(deletion.done())
+        self.assertFalse(jobscheduler.kube_does_job_exist("hydra-job-1", "processing"))
+        release.set()
+        deletion.result(timeout=5)
+        self.batch_api_mock.return_value.delete_namespaced_job.assert_called_once()
+
+    def test_cleanup_deletes_concurrently(self):
+        # every delete waits until all 8 are in flight, which only happens if they run concurrently
+        all_deleting = threading.Barrier(8)
+        self.batch_api_mock.return_value.delete_namespaced_job.side_effect = lambda *args, **kwargs: all_deleting.wait(5)
+        self.batch_api_mock.return_value.list_namespaced_job.return_value = V1JobList(
+            items=[make_job("hydra-job-{0}".format(i), succeeded=1) for i in range(8)] + [make_job("hydra-job-active")],
+            metadata=V1ListMeta())
+        jobscheduler = JobScheduler()
+        deleted = jobscheduler.kube_cleanup_jobs_with_state(namespace="processing")
+        self.assertFalse(all_deleting.broken)
+        self.assertEqual(len(deleted), 8)
+        self.assertEqual(self.batch_api_mock.return_value.delete_namespaced_job.call_count, 8)
+
+    def test_deletion_is_confirmed_by_watch(self):
+        jobscheduler = JobScheduler()
+        jobscheduler.job_informer._synced.set()
+        jobscheduler.kube_delete_job("hydra-job-1", "processing").result(timeout=1)
+        self.assertFalse(jobscheduler.kube_wait_for_job_deletion("hydra-job-1", "processing", timeout=0))
+        jobscheduler.job_informer._dispatch({"type": "DELETED", "object": make_job("hydra-job-1")})
+        self.assertTrue(jobscheduler.kube_wait_for_job_deletion("hydra-job-1", "processing", timeout=0))
+
+
+@override_settings(K8S_JOB_TEMPLATE_CACHE_SIZE=2)
+class TestJobSchedulerTemplates(JobSchedulerTestCase):
+
+    def setUp(self):
+        super(TestJobSchedulerTemplates, self).setUp()
+        self.image = "registry.mobilizedconstruction.com/mc/hydra/process-batch-test:latest"
+
+    def make_jobscheduler(self):
+        jobscheduler = JobScheduler()
+        jobscheduler.api_instance.api_client = RealApiClient()
+        return jobscheduler
+
+    def test_job_body_matches_job_object(self):
+        jobscheduler = self.make_jobscheduler()
+        labels = {"created-for-test": "true"}
+        for name, batch_ids in [("hydra-job-1", "a,b"), ("hydra-job-2", "c")]:
+            env_vars = {"STAGE": "test", "BATCH_IDS": batch_ids}
+            body = jobscheduler.kube_job_body(name, self.image, "processing", "jobcontainer", True, labels, env_vars=env_vars)
+            expected = jobscheduler.api_instance.api_client.sanitize_for_serialization(jobscheduler.kube_create_job_object(
+                name, self.image, "processing", "jobcontainer", True, labels, env_vars=env_vars))
+            self.assertEqual(body, expected)
+
+    def test_job_body_reuses_template(self):
+        jobscheduler = self.make_jobscheduler()
+        with patch.object(jobscheduler, 'kube_create_job_object', wraps=jobscheduler.kube_create_job_object) as create_mock:
+            for i in range(3):
+                jobscheduler.kube_job_body("hydra-job-{0}".format(i), self.image, env_vars={"BATCH_IDS": str(i)})
+            self.assertEqual(create_mock.call_count, 1)
+            # a changed job spec gets a new template
+            jobscheduler.kube_job_body("hydra-job-3", self.image + "-v2", env_vars={"BATCH_IDS": "3"})
+            jobscheduler.kube_job_body("hydra-job-4", self.image, env_vars={"STAGE": "test", "BATCH_IDS": "4"})
+            self.assertEqual(create_mock.call_count, 3)
+        self.assertEqual(len(jobscheduler._job_templates), 2)
+
+
+@override_settings(K8S_SUBMIT_MAX_RETRIES=2, K8S_API_QPS=0)
+class TestJobSchedulerSubmission(JobSchedulerTestCase):
+
+    def setUp(self):
+        super(TestJobSchedulerSubmission, self).setUp()
+        self.sleep_mock = self.start_patch('hydra.jobscheduler.jobscheduler.time.sleep')
+
+    def create_job(self, jobscheduler):
+        with patch.object(jobscheduler, 'kube_job_body', return_value={}):
+            return jobscheduler.kube_submit_job("hydra-job-1", "processing", {"BATCH_IDS": "a"}, "image").result(timeout=1)
+
+    def test_create_retries_when_throttled(self):
+        create_mock = self.batch_api_mock.return_value.create_namespaced_job
+        throttled = ApiException(status=429, reason="Too Many Requests")
+        throttled.headers = {"Retry-After": "3"}
+        create_mock.side_effect = [throttled, ApiException(status=503), "created"]
+        self.assertEqual(self.create_job(JobScheduler()), "created")
+        self.assertEqual(create_mock.call_count, 3)
+        self.assertGreaterEqual(self.sleep_mock.call_args_list[0].args[0], 3)
+
+    def test_create_gives_up_after_max_retries(self):
+        create_mock = self.batch_api_mock.return_value.create_namespaced_job
+        create_mock.side_effect = ApiException(status=500, reason="Internal Server Error")
+        with self.assertRaises(JobCreationError) as raised:
+            self.create_job(JobScheduler())
+        self.assertEqual(raised.exception.reason, "Internal Server Error")
+        self.assertTrue(raised.exception.retryable)
+        self.assertEqual(create_mock.call_count, 3)
+
+    def test_create_refused_is_not_retried(self):
+        create_mock = self.batch_api_mock.return_value.create_namespaced_job
+        create_mock.side_effect = ApiException(status=403, reason="Forbidden")
+        with self.assertRaises(JobCreationError) as raised:
+            self.create_job(JobScheduler())
+        self.assertFalse(raised.exception.retryable)
+        create_mock.assert_called_once()
+
+    def test_create_already_exists_is_not_retried(self):
+        create_mock = self.batch_api_mock.return_value.create_namespaced_job
+        already_exists = ApiException(status=409, reason="Conflict")
+        already_exists.body = '{"reason": "AlreadyExists", "message": "jobs.batch \\"hydra-job-1\\" already exists"}'
+        create_mock.side_effect = already_exists
+        self.assertEqual(self.create_job(JobScheduler()), "AlreadyExists")
+        create_mock.assert_called_once()
+        self.sleep_mock.assert_not_called()
+
+
+@override_settings(K8S_CONNECTION_POOL_SIZE=16, K8S_API_COMPRESSION=True)
+class TestJobSchedulerClient(JobSchedulerTestCase):
+
+    def test_apis_share_one_client(self):
+        jobscheduler = JobScheduler()
+        self.api_client_mock.assert_called_once()
+        self.batch_api_mock.assert_called_once_with(jobscheduler.api_client)
+        self.core_api_mock.assert_called_once_with(jobscheduler.api_client)
+        configuration = self.api_client_mock.call_args.args[0]
+        self.assertEqual(configuration.connection_pool_maxsize, 16)
+        self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1), configuration.socket_options)
+
+    def test_lists_ask_for_compression(self):
+        list_mock = self.batch_api_mock.return_value.list_namespaced_job
+        list_mock.return_value = V1JobList(items=[make_job("hydra-job-1")], metadata=V1ListMeta())
+        jobscheduler = JobScheduler()
+        self.assertEqual(list(jobscheduler.kube_list_jobs("processing")), ["hydra-job-1"])
+        self.assertEqual(list_mock.call_args.kwargs["_headers"], {"Accept-Encoding": "gzip"})
+        self.assertEqual(jobscheduler.job_informer.list_headers, {"Accept-Encoding": "gzip"})
+        self.assertEqual(jobscheduler.job_informer.namespace, "processing")
+
+
+class TestTokenBucket(TestCase):
+
+    def test_waits_for_tokens_after_burst(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        bucket.acquire()
+        bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.04)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
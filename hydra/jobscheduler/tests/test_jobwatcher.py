@@ -0,0 +1,108 @@
+import datetime as dt
+import threading
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase, override_settings
+from kubernetes.client import V1Job, V1JobCondition, V1JobStatus, V1ObjectMeta, V1Pod, V1PodStatus
+
+from api.models import Batch_Job, Job_Definition, Job_Spec
+
+from hydra.jobscheduler.informer import Informer
+from hydra.jobscheduler.jobwatcher import JobWatcher
+
+
+def make_pod(name, job_name, created, phase):
+    return V1Pod(metadata=V1ObjectMeta(name=name, labels={"job-name": job_name}, creation_timestamp=created),
+                 status=V1PodStatus(phase=phase))
+
+
+@override_settings(WATCH_K8S=False, WATCH_K8S_NAMESPACE="processing")
+class TestJobWatcher(TestCase):
+
+    def setUp(self):
+        self.jobscheduler = MagicMock()
+        self.jobscheduler.pod_informer = Informer(MagicMock(), "processing", "pods", index_labels=("job-name",))
+        self.core_api_instance = MagicMock()
+        self.watcher = JobWatcher(self.jobscheduler, MagicMock(), self.core_api_instance)
+        self.watcher.jobmanager = MagicMock()
+
+    def test_pod_lookups_use_informer(self):
+        now = dt.datetime.now().replace(tzinfo=dt.timezone.utc)
+        self.jobscheduler.pod_informer._put(make_pod("hydra-job-1-abc", "hydra-job-1", now - dt.timedelta(minutes=5), "Failed"))
+        self.jobscheduler.pod_informer._put(make_pod("hydra-job-1-def", "hydra-job-1", now, "Pending"))
+        self.jobscheduler.pod_informer._synced.set()
+        pod_name = self.watcher.get_namespaced_pod_name("processing", "job-name=hydra-job-1")
+        self.assertEqual(pod_name, "hydra-job-1-def")
+        self.assertEqual(self.watcher.get_pod_status(pod_name, "processing"), "Pending")
+        self.core_api_instance.list_namespaced_pod.assert_not_called()
+        self.core_api_instance.read_namespaced_pod_status.assert_not_called()
+
+    def test_pod_lookups_fall_back_to_api_before_sync(self):
+        self.core_api_instance.list_namespaced_pod.return_value.items = [make_pod("hydra-job-1-abc", "hydra-job-1", None, "Running")]
+        self.assertEqual(self.watcher.get_namespaced_pod_name("processing", "job-name=hydra-job-1"), "hydra-job-1-abc")
+        self.core_api_instance.list_namespaced_pod.assert_called_once()
+
+    def test_ignores_jobs_not_created_by_hydra(self):
+        event = {"type": "ADDED", "object": MagicMock(metadata=V1ObjectMeta(name="some-other-job"))}
+        self.watcher.handle_event(event)
+        self.watcher.jobmanager.on_job_created.assert_not_called()
+
+    def test_job_k8s_gave_up_on_fails(self):
+        job_definition = Job_Definition.objects.create(name="test-watcher", description="test")
+        job_spec = Job_Spec.objects.create(job_definition=job_definition, run_environment='k8s', container_image="image",
+                                           time_limit=dt.timedelta(hours=1), data_threshold=3, namespace='processing')
+        batch_job = Batch_Job.objects.create(job_spec=job_spec, state=Batch_Job.RUNNING)
+        job_name = "test-watcher-{0}".format(batch_job.id)
+        status = V1JobStatus(active=None, failed=2, conditions=[
+            V1JobCondition(type="Failed", status="True", reason="BackoffLimitExceeded")])
+        self.watcher.handle_event({"type": "MODIFIED", "object": V1Job(metadata=V1ObjectMeta(name=job_name), status=status)})
+        self.watcher.jobmanager.on_job_failure.assert_called_once_with(batch_job, 2, terminal=True)
+
+    def test_events_of_a_waiting_job_are_coalesced(self):
+        self.watcher.enqueue_event({"type": "ADDED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))})
+        modified = MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))
+        self.watcher.enqueue_event({"type": "MODIFIED", "object": modified})
+        added_again = MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))
+        self.watcher.enqueue_event({"type": "ADDED", "object": added_again})
+        self.watcher.enqueue_event({"type": "DELETED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-2"))})
+        event = self.watcher.take_event(block=False)
+        self.assertEqual(event, {"type": "MODIFIED", "object": added_again})
+        self.assertIsNone(self.watcher.take_event(block=False))
+
+    def test_job_is_not_handled_by_two_workers(self):
+        for name in ["hydra-job-1", "hydra-job-2"]:
+            self.watcher.enqueue_event({"type": "MODIFIED", "object": MagicMock(metadata=V1ObjectMeta(name=name))})
+        first = self.watcher.take_event(block=False)
+        self.watcher.enqueue_event({"type": "MODIFIED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))})
+        # hydra-job-1 is in progress, so its new event waits until the first one is finished
+        self.assertEqual(self.watcher.take_event(block=False)['object'].metadata.name, "hydra-job-2")
+        self.assertIsNone(self.watcher.take_event(block=False))
+        self.watcher.finish_event(first)
+        self.assertEqual(self.watcher.take_event(block=False)['object'].metadata.name, "hydra-job-1")
+
+    def test_full_queue_blocks_new_jobs(self):
+        self.watcher.queue_size = 1
+        self.watcher.enqueue_event({"type": "MODIFIED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))})
+        # events of a job that is already waiting never block
+        self.watcher.enqueue_event({"type": "MODIFIED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-1"))})
+        thread = threading.Thread(target=self.watcher.enqueue_event,
+                                  args=({"type": "MODIFIED", "object": MagicMock(metadata=V1ObjectMeta(name="hydra-job-2"))},))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+        self.watcher.take_event(block=False)
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.watcher.take_event(block=False)['object'].metadata.name, "hydra-job-2")
+
+    @patch('hydra.jobscheduler.jobwatcher.threading.Thread')
+    def test_start_only_watches_when_enabled(self, thread_mock):
+        with patch.object(self.jobscheduler.pod_informer, 'start') as pod_informer_start_mock:
+            self.watcher.start()
+            self.jobscheduler.job_informer.start.assert_not_called()
+            with self.settings(WATCH_K8S=True, WATCH_K8S_WORKERS=2):
+                self.watcher.start()
+                self.watcher.start()
+        self.jobscheduler.job_informer.start.assert_called_once()
+        pod_informer_start_mock.assert_called_once()
+        self.assertEqual(thread_mock.call_count, 2)
@@ -184,6 +184,13 @@ K8S_TOKEN = os.environ.get(
     "eyJhbGciOiJSUzI1NiIsImtpZCI6IkIxQjZhOUlMWEtTWkZPVGp1UGlaWHBnRXpxdGEwUEgyR0YzUVFVcjNaRkEifQ.eyJpc3MiOiJrdWJlcm5ldGVzL3NlcnZpY2VhY2NvdW50Iiwia3ViZXJuZXRlcy5pby9zZXJ2aWNlYWNjb3VudC9uYW1lc3BhY2UiOiJwcm9jZXNzaW5nIiwia3ViZXJuZXRlcy5pby9zZXJ2aWNlYWNjb3VudC9zZWNyZXQubmFtZSI6Imh5ZHJhLXByb2Nlc3Npbmctc2EtdG9rZW4tenc4OXQiLCJrdWJlcm5ldGVzLmlvL3NlcnZpY2VhY2NvdW50L3NlcnZpY2UtYWNjb3VudC5uYW1lIjoiaHlkcmEtcHJvY2Vzc2luZy1zYSIsImt1YmVybmV0ZXMuaW8vc2VydmljZWFjY291bnQvc2VydmljZS1hY2NvdW50LnVpZCI6IjY3ZGZlZWIxLTEwNzAtNDk5Mi04Y2M3LWMyZWVmMTExYzNiZSIsInN1YiI6InN5c3RlbTpzZXJ2aWNlYWNjb3VudDpwcm9jZXNzaW5nOmh5ZHJhLXByb2Nlc3Npbmctc2EifQ.ikPsJCPp2WSQeeIziLgrkw2KpBl6ddFCTz3udW97azDWJjdMqYy02FoLL_bFBuuk3pTDeJj-vnl-6AFdjLN6OOLC6uMQFPbo6oHgJK4hNGiwimgcsaIhJp_jNiFk6A_LERYrZ2LKNLDgFdUsh1PpWz6P5Yy_PhTl0ofKhYQetZK7a-ko005tBK2xg_riZjIkkZ7YR-rX7_3OAkzkDJMpwUUnKhUd28t4GErgM-D98SbLN4GNjkW6UmvcjvCOimmHdKjywK6fX6-hWr61apJFcb7pldZxs5r4eCZpAPpdOuujNmLLkmDsPod9KD1khNTU_4I-WprGcDwN19xkrwyP7w",
 )
 
+# The k8s client is set up when it is first used, its credential check runs in the background and gives up after
+# K8S_STARTUP_TIMEOUT seconds
+K8S_STARTUP_TIMEOUT = os.environ.get("K8S_STARTUP_TIMEOUT", 5)
+# The k8s client of the job scheduler: "sync" (kubernetes, a thread per call in flight) or "async" (kubernetes_asyncio,
+# all calls on one event loop)
+K8S_JOB_SCHEDULER_BACKEND = os.environ.get("K8S_JOB_SCHEDULER_BACKEND", "sync")
+
 WATCH_K8S = os.environ.get("WATCH_K8S", False)
 WATCH_K8S_NAMESPACE = os.environ.get("WATCH_K8S_NAMESPACE", "processing")
 """
@@ -197,8 +204,55 @@ You can keep this number low, maybe 60 seconds.
 """
 WATCH_K8S_TIMEOUT = os.environ.get("WATCH_K8S_TIMEOUT", 0)
 WATCH_K8S_REQUEST_TIMEOUT = os.environ.get("WATCH_K8S_REQUEST_TIMEOUT", 0)
-
+# Reconnects after a failed watch back off exponentially (with jitter) from WATCH_K8S_BACKOFF_BASE up to
+# WATCH_K8S_BACKOFF_MAX seconds. Relisting the namespace (at startup and after 410 Gone) is done in pages.
+WATCH_K8S_BACKOFF_BASE = os.environ.get("WATCH_K8S_BACKOFF_BASE", 1)
+WATCH_K8S_BACKOFF_MAX = os.environ.get("WATCH_K8S_BACKOFF_MAX", 60)
+WATCH_K8S_LIST_PAGE_SIZE = os.environ.get("WATCH_K8S_LIST_PAGE_SIZE", 500)
+# Job events are handled by WATCH_K8S_WORKERS threads, at most WATCH_K8S_QUEUE_SIZE jobs can have an event waiting
+WATCH_K8S_WORKERS = os.environ.get("WATCH_K8S_WORKERS", 4)
+WATCH_K8S_QUEUE_SIZE = os.environ.get("WATCH_K8S_QUEUE_SIZE", 10000)
+
+# At most MAX_ACTIVE_K8S_JOBS jobs are scheduled, created or running at the same time, counted in the database.
+# At startup and every K8S_RECONCILE_INTERVAL seconds the in-flight jobs are reconciled with k8s, jobs that have no
+# k8s job and did not change state for K8S_SCHEDULED_GRACE_SECONDS give their slot back.
 MAX_ACTIVE_K8S_JOBS = os.environ.get("MAX_ACTIVE_K8S_JOBS", 50)
+K8S_SCHEDULED_GRACE_SECONDS = os.environ.get("K8S_SCHEDULED_GRACE_SECONDS", 300)
+K8S_RECONCILE_INTERVAL = os.environ.get("K8S_RECONCILE_INTERVAL", 60)
+# The k8s watcher and the scheduling loop run in the run_hydra_controller process, replicas that do not hold the
+# controller lock try to take it every CONTROLLER_LEADER_RETRY_INTERVAL seconds
+CONTROLLER_LEADER_RETRY_INTERVAL = os.environ.get("CONTROLLER_LEADER_RETRY_INTERVAL", 5)
+# The replica that holds the controller lock serves the metrics of the job lifecycle and the totals stored in the
+# database, refreshed with every reconciliation, on CONTROLLER_METRICS_PORT, 0 turns it off
+CONTROLLER_METRICS_PORT = os.environ.get("CONTROLLER_METRICS_PORT", 8001)
+# Full jobs that are waiting for a slot are started when a job finishes, and every JOB_SCHEDULE_POLL_INTERVAL
+# seconds by the schedule_pending_jobs command, which also starts the jobs that waited longer than Job_Spec.max_wait
+JOB_SCHEDULE_POLL_INTERVAL = os.environ.get("JOB_SCHEDULE_POLL_INTERVAL", 5)
+# The policy that picks which waiting jobs get the free slots: strict_priority, weighted_fair or the dotted path of a
+# hydra.jobmanager.policies.SchedulingPolicy subclass. It chooses among the oldest waiting jobs of every job spec and
+# region, as many per job spec and region as there are free slots.
+JOB_SCHEDULING_POLICY = os.environ.get("JOB_SCHEDULING_POLICY", "strict_priority")
+# Finished jobs are removed by k8s K8S_JOB_TTL_SECONDS after they finished. Hydra also deletes succeeded jobs
+# right away (K8S_DELETE_SUCCEEDED_JOBS), with at most K8S_DELETE_WORKERS deletes running at the same time.
+K8S_JOB_TTL_SECONDS = os.environ.get("K8S_JOB_TTL_SECONDS", 600)
+K8S_DELETE_SUCCEEDED_JOBS = os.environ.get("K8S_DELETE_SUCCEEDED_JOBS", True)
+K8S_DELETE_WORKERS = os.environ.get("K8S_DELETE_WORKERS", 8)
+K8S_DELETE_POLL_INTERVAL = os.environ.get("K8S_DELETE_POLL_INTERVAL", 0.5)
+# Jobs are created by K8S_SUBMIT_WORKERS threads. Creates and deletes share a token bucket of K8S_API_QPS requests
+# per second (bursts of K8S_API_BURST, 0 turns it off). Creates rejected with 429 or 5xx are retried up to
+# K8S_SUBMIT_MAX_RETRIES times, backing off from K8S_SUBMIT_BACKOFF_BASE up to K8S_SUBMIT_BACKOFF_MAX seconds.
+K8S_SUBMIT_WORKERS = os.environ.get("K8S_SUBMIT_WORKERS", 8)
+# All k8s calls share one client with a pool of K8S_CONNECTION_POOL_SIZE keep-alive connections, enough for the submit
+# and delete workers, the informers and the watcher. K8S_API_COMPRESSION asks the API server for gzipped lists.
+K8S_CONNECTION_POOL_SIZE = os.environ.get("K8S_CONNECTION_POOL_SIZE", 32)
+K8S_API_COMPRESSION = os.environ.get("K8S_API_COMPRESSION", False)
+K8S_API_QPS = os.environ.get("K8S_API_QPS", 20)
+K8S_API_BURST = os.environ.get("K8S_API_BURST", 40)
+K8S_SUBMIT_MAX_RETRIES = os.environ.get("K8S_SUBMIT_MAX_RETRIES", 5)
+K8S_SUBMIT_BACKOFF_BASE = os.environ.get("K8S_SUBMIT_BACKOFF_BASE", 0.5)
+K8S_SUBMIT_BACKOFF_MAX = os.environ.get("K8S_SUBMIT_BACKOFF_MAX", 30)
+# The serialized job bodies of up to K8S_JOB_TEMPLATE_CACHE_SIZE job specs are kept, new jobs only patch them
+K8S_JOB_TEMPLATE_CACHE_SIZE = os.environ.get("K8S_JOB_TEMPLATE_CACHE_SIZE", 256)
 
 HYDRA_REGISTRY = "registry.mobilizedconstruction.com/mc/hydra/"
 PROCESS_BATCH_TEST_IMAGE = HYDRA_REGISTRY + "process-batch-test:latest"
@@ -206,3 +260,26 @@ PROCESS_BATCH_TEST_IMAGE = HYDRA_REGISTRY + "process-batch-test:latest"
 HOUSTON_URL = "https://houston.mobilizedconstruction.com/"
 HOUSTON_TOKEN = os.environ.get("HOUSTON_TOKEN")
 ROOT_CERT = "/secrets/root-cert"
+# Houston notifications are sent from background threads with a pooled session
+HOUSTON_WORKERS = os.environ.get("HOUSTON_WORKERS", 2)
+HOUSTON_QUEUE_SIZE = os.environ.get("HOUSTON_QUEUE_SIZE", 10000)
+HOUSTON_MAX_RETRIES = os.environ.get("HOUSTON_MAX_RETRIES", 5)
+HOUSTON_CONNECT_TIMEOUT = os.environ.get("HOUSTON_CONNECT_TIMEOUT", 3.05)
+HOUSTON_READ_TIMEOUT = os.environ.get("HOUSTON_READ_TIMEOUT", 10)
+# Send all queued statuses for an endpoint in one request, only if Houston accepts a list of statuses
+HOUSTON_BULK_STATUSES = os.environ.get("HOUSTON_BULK_STATUSES", False)
+HOUSTON_MAX_BULK_SIZE = os.environ.get("HOUSTON_MAX_BULK_SIZE", 100)
+
+# Saved batches are written to the Batch_Event outbox and fanned out to jobs by the
+# `process_batch_events` management command. Set to False to fan out inside the request instead.
+BATCH_EVENT_QUEUE = os.environ.get("BATCH_EVENT_QUEUE", True)
+BATCH_EVENT_BATCH_SIZE = os.environ.get("BATCH_EVENT_BATCH_SIZE", 500)
+BATCH_EVENT_POLL_INTERVAL = os.environ.get("BATCH_EVENT_POLL_INTERVAL", 1)
+BATCH_EVENT_MAX_TRIES = os.environ.get("BATCH_EVENT_MAX_TRIES", 5)
+# The process_batch_events worker serves its metrics on BATCH_EVENTS_METRICS_PORT, 0 turns it off
+BATCH_EVENTS_METRICS_PORT = os.environ.get("BATCH_EVENTS_METRICS_PORT", 8002)
+# Page size of the list endpoints, clients can ask for up to API_MAX_PAGE_SIZE items with `page_size`
+API_PAGE_SIZE = os.environ.get("API_PAGE_SIZE", 100)
+API_MAX_PAGE_SIZE = os.environ.get("API_MAX_PAGE_SIZE", 1000)
+# Maximum number of batches accepted by a single /api/batches/bulk/ request
+BATCH_BULK_MAX_SIZE = os.environ.get("BATCH_BULK_MAX_SIZE", 5000)
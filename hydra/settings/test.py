@@ -8,4 +8,6 @@ DATABASES['default'] = {
         'NAME': "testdb.sqlite",
     }
 }
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+# the tests expect batches to be fanned out to their jobs as soon as they are saved
+BATCH_EVENT_QUEUE = False
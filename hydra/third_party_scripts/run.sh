@@ -11,8 +11,11 @@ if [ "$RUN_ENVIRONMENT" == "production" ]
 then
   # Run Prod
   echo "Running with Gunicorn"
+  # The gunicorn workers share their in-process Prometheus metrics through this directory
+  export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/hydra-prometheus}
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
   python manage.py collectstatic \
-  && gunicorn hydra.wsgi -b $HOST
+  && gunicorn hydra.wsgi -b $HOST -c hydra/gunicorn.conf.py
 else
   # Run Dev
   python manage.py runserver $HOST